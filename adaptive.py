@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+import json
+import math
+import os
+import time
+
+from expfw import Experiment
+from noise import is_tainted
+
+
+###
+# Adaptive sweeps over the number of workers.
+# Instead of running every worker count of the grid, we measure a few
+# anchor points per (group, method), fit a speedup model and only run
+# the worker counts where the curve is uncertain or has a knee.
+# Points that are not run are inferred from the measured ones.
+###
+
+
+def fit_amdahl(points):
+    """Least-squares fit of T(w) = a + b/w to a list of (workers, time).
+    Here a is the sequential part and b the parallel part of the 1-worker time.
+    Returns the pair (a, b) with a, b >= 0.
+    """
+    if len(points) == 1:
+        w, t = points[0]
+        return 0.0, t * w
+    xs = [1.0 / w for w, t in points]
+    ys = [t for w, t in points]
+    n = len(points)
+    mx = sum(xs) / n
+    my = sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    b = sxy / sxx if sxx > 0 else 0.0
+    a = my - b * mx
+    if b < 0:
+        return my, 0.0
+    if a < 0:
+        return 0.0, sum(x * y for x, y in zip(xs, ys)) / sum(x * x for x in xs)
+    return a, b
+
+
+def interpolate(points, w):
+    """Piecewise linear interpolation in log(workers)/log(time) between the
+    measured (workers, time) points; constant beyond the measured range.
+    """
+    points = sorted(points)
+    if w <= points[0][0]:
+        return points[0][1]
+    if w >= points[-1][0]:
+        return points[-1][1]
+    for (w1, t1), (w2, t2) in zip(points, points[1:]):
+        if w1 <= w <= w2:
+            f = (math.log(w) - math.log(w1)) / (math.log(w2) - math.log(w1))
+            return math.exp(math.log(t1) + f * (math.log(t2) - math.log(t1)))
+
+
+class SweepSeries(object):
+    """The experiments of one (group, method) over the worker counts of the grid.
+    """
+    def __init__(self, group, method):
+        self.group = group
+        self.method = method
+        self.experiments = {}
+        self.measured = {}  # workers -> time, or None for a timeout/error
+        self.verify = None  # workers, predicted time of the verification point
+        self.verified = False
+
+    def add(self, experiment):
+        self.experiments[experiment.workers] = experiment
+
+    @property
+    def workers(self):
+        return sorted(self.experiments)
+
+    def done(self):
+        return sorted((w, t) for w, t in self.measured.items() if t is not None and t > 0)
+
+    def unmeasured(self):
+        return [w for w in self.workers if w not in self.measured]
+
+    def predict(self, tolerance):
+        """Predict the time of every worker count of the grid.
+        Returns a dict workers -> (time, source) where source is one of
+        "measured", "timeout", "fit" (Amdahl) or "interpolated" (at a knee).
+        """
+        res = {}
+        done = self.done()
+        if len(done) > 0:
+            a, b = fit_amdahl(done)
+            knee = any(abs(a + b / w - t) / t > tolerance for w, t in done)
+        for w in self.workers:
+            if w in self.measured:
+                t = self.measured[w]
+                res[w] = (t, "measured") if t is not None else (None, "timeout")
+            elif len(done) == 0:
+                res[w] = (None, "unknown")
+            elif knee:
+                res[w] = (interpolate(done, w), "interpolated")
+            else:
+                res[w] = (a + b / w, "fit")
+        return res
+
+    def uncertainty(self, w):
+        """Relative disagreement between the Amdahl fit and the interpolation
+        at worker count <w>. This is large around knees of the curve.
+        """
+        done = self.done()
+        a, b = fit_amdahl(done)
+        fit = a + b / w
+        interp = interpolate(done, w)
+        return abs(fit - interp) / min(fit, interp)
+
+    def to_dict(self, tolerance):
+        pred = self.predict(tolerance)
+        base = pred[self.workers[0]][0]
+        points = {}
+        for w, (t, source) in pred.items():
+            points[str(w)] = {'time': t, 'source': source,
+                              'speedup': base / t if base is not None and t else None}
+        return {'points': points, 'verified': self.verified,
+                'verify': self.verify}
+
+
+class AdaptiveSweep(object):
+    def __init__(self, engine, anchors=3, tolerance=0.1, iterations=1, statefile="sweep.json"):
+        """Adaptive sweep over the experiments of <engine>.
+        - anchors: number of worker counts always measured (spread over the grid)
+        - tolerance: relative error allowed between predicted and measured times
+        - iterations: iterations to run for every measured point
+        - statefile: JSON file recording measured and inferred points
+        """
+        self.engine = engine
+        self.anchors = anchors
+        self.tolerance = tolerance
+        self.iterations = iterations
+        self.statefile = statefile
+        self.state = {}
+        if os.path.isfile(statefile):
+            with open(statefile) as f:
+                self.state = json.load(f)
+
+    def series(self, group=None):
+        """Group the experiments into series of (group, method).
+        """
+        res = {}
+        for e in self.engine:
+            if group is not None and e.group != group:
+                continue
+            key = (e.group, e.method)
+            if key not in res:
+                res[key] = SweepSeries(e.group, e.method)
+                saved = self.state.get(e.group, {}).get(e.method, {})
+                res[key].verified = saved.get('verified', False)
+                res[key].verify = saved.get('verify', None)
+            res[key].add(e)
+        return res
+
+    def update(self, s):
+        """Read the results of all iterations of the series from the engine.
+        A point is measured when all iterations have a result; its time is the median.
+        Tainted results (see noise.py) are not used.
+        """
+        for w, e in s.experiments.items():
+            times = []
+            for i in range(self.iterations):
+                self.engine.extend_for_iteration(i)
+                status, value = self.engine.get_status(e, i)
+                if status == Experiment.NOTDONE:
+                    break
+                if status == Experiment.TIMEOUT and value < self.engine.timeout:
+                    break
+                if status == Experiment.DONE and not is_tainted(value):
+                    times.append(value['time'])
+            else:
+                if len(times) > 0:
+                    times.sort()
+                    s.measured[w] = times[len(times)//2]
+                else:
+                    s.measured[w] = None
+
+    def anchor_points(self, s):
+        n = len(s.workers)
+        k = min(self.anchors, n)
+        if k <= 1:
+            return s.workers[:1]
+        return [s.workers[round(i * (n - 1) / (k - 1))] for i in range(k)]
+
+    def next_point(self, s):
+        """Return the worker count to measure next, or None if the series is finished.
+        """
+        todo = s.unmeasured()
+        if len(todo) == 0:
+            return None
+        # first measure the anchors
+        for w in self.anchor_points(s):
+            if w not in s.measured:
+                return w
+        # too few times to fit anything (timeouts/errors): measure the rest
+        if len(s.done()) < 2:
+            return todo[0]
+        # check the verification point, if we have one
+        if s.verify is not None:
+            w, predicted = s.verify
+            if w in s.measured:
+                s.verify = None
+                t = s.measured[w]
+                if t is not None and abs(t - predicted) / predicted <= self.tolerance:
+                    s.verified = True
+                    return None
+                # prediction not reproduced: refine further
+                s.verified = False
+        if s.verified:
+            return None
+        # measure where the curve is most uncertain
+        w = max(todo, key=s.uncertainty)
+        if s.uncertainty(w) > self.tolerance:
+            return w
+        # before giving up, check one inferred point against a real run
+        s.verify = w, s.predict(self.tolerance)[w][0]
+        return w
+
+    def run(self, group=None):
+        """Run the adaptive sweep until all series are finished.
+        """
+        series = self.series(group)
+        for s in series.values():
+            self.update(s)
+        active = list(series.values())
+        while len(active) > 0:
+            s = active.pop(0)
+            w = self.next_point(s)
+            if w is None:
+                continue
+            print("Adaptive sweep: {} {} with {} workers.".format(s.group, s.method, w))
+            for i in range(self.iterations):
+                if self.engine.run_one(s.experiments[w], i):
+                    time.sleep(1)
+            self.update(s)
+            if w not in s.measured and any(self.engine.count_tainted(s.experiments[w], i) > 0 for i in range(self.iterations)):
+                # a tainted run was moved aside, try again later
+                active.append(s)
+                continue
+            if w not in s.measured:
+                # the experiment could not be run (e.g. a missing model)
+                print("Adaptive sweep: giving up on {} {}.".format(s.group, s.method))
+                continue
+            active.append(s)
+            self.save(series)
+        self.save(series)
+        return series
+
+    def save(self, series):
+        for s in series.values():
+            if len(s.done()) == 0:
+                continue
+            self.state.setdefault(s.group, {})[s.method] = s.to_dict(self.tolerance)
+        with open(self.statefile, 'w') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+
+    def report(self, group=None):
+        """Print the measured and inferred times of every series.
+        """
+        series = self.series(group)
+        for key in sorted(series):
+            s = series[key]
+            self.update(s)
+            if len(s.done()) == 0:
+                continue
+            items = []
+            for w, (t, source) in sorted(s.predict(self.tolerance).items()):
+                if t is None:
+                    items.append("{}: {}".format(w, source))
+                elif source == "measured":
+                    items.append("{}: {:.2f}".format(w, t))
+                else:
+                    items.append("{}: ~{:.2f}".format(w, t))
+            if s.verified:
+                status = "verified"
+            elif len(s.unmeasured()) == 0:
+                status = "complete"
+            else:
+                status = "open"
+            print("{} {} ({}): {}".format(s.group, s.method, status, ", ".join(items)))
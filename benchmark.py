@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from expfw import ExperimentEngine, Experiment
+from exp import LDDExperiments, BDDExperiments, MDDExperiments, PNMLExperiments
+import simtool
+
+
+###
+# Benchmark of the harness itself.
+# We create thousands of simulated experiments (models for simtool.py),
+# write their log files without running them, and time the operations
+# of ExperimentEngine. A few experiments are really run with simtool.py
+# to measure the overhead of running one experiment.
+###
+
+WORKERS = [1, 2, 4, 8, 16]
+TIMEOUT = 1200
+# every <n>th model is invalid (an error) or hangs (a timeout)
+INVALID_EVERY = 20
+HANG_EVERY = 20
+
+
+def model_name(i):
+    if i % INVALID_EVERY == 1:
+        return "Sim-t0-invalid-{:06d}".format(i)
+    if i % HANG_EVERY == 2:
+        return "Sim-hang-{:06d}".format(i)
+    return "Sim-t0-s{}-{:06d}".format(1000 + i, i)
+
+
+def make_models(directory, count):
+    """Create <count> (empty) model files for all collections of exp.py.
+    """
+    os.makedirs(directory)
+    for i in range(count):
+        name = model_name(i)
+        for ext in ["pnml", "rf.ldd", "rbs.ldd", "rf.bdd", "rbs.bdd", "rf.mdd", "rbs.mdd"]:
+            sep = "." if ext == "pnml" else "-"
+            open(os.path.join(directory, name + sep + ext), 'w').close()
+
+
+def make_engine(root, tools):
+    engine = ExperimentEngine(logdir=os.path.join(root, "logs"), cachefile=os.path.join(root, "cache.json"), timeout=TIMEOUT)
+    models = os.path.join(root, "models")
+    engine += LDDExperiments(models, WORKERS)
+    engine += BDDExperiments(models, WORKERS)
+    engine += MDDExperiments(models)
+    engine += PNMLExperiments(models, WORKERS)
+    # call the simulated tools instead of the real ones
+    for e in engine:
+        e.call = [tools[os.path.basename(e.call[0])]] + e.call[1:]
+    return engine
+
+
+def write_logs(engine, iteration):
+    """Write the log files of all experiments as if they were run.
+    """
+    for e in engine:
+        logfile = engine.get_logfile(e, iteration)
+        if "hang" in simtool.parse_spec(e.call[-1]):
+            with open(logfile + ".timeout", 'w') as f:
+                f.write(str(TIMEOUT))
+            continue
+        out = io.StringIO()
+        tool = os.path.basename(e.call[0])
+        exitcode = simtool.simulate(tool, e.call[1:], out)
+        with open(logfile, 'w') as f:
+            f.write(out.getvalue())
+            f.write("[harness] exitcode={} wall=0.01 utime=0.01 stime=0.0 maxrss=10000\n".format(exitcode))
+
+
+class Timer(object):
+    def __init__(self):
+        self.rows = []
+
+    @contextlib.contextmanager
+    def time(self, operation, count):
+        t1 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        t2 = time.perf_counter()
+        self.rows.append((operation, t2 - t1, count))
+
+    def report(self):
+        width = max(len(op) for op, _, _ in self.rows)
+        print("{}; {:>10}; {:>8}; {:>12}".format("Operation".ljust(width), "Total (s)", "Count", "Per item (us)"))
+        for op, t, count in self.rows:
+            print("{}; {:10.3f}; {:8}; {:12.1f}".format(op.ljust(width), t, count, 1e6 * t / max(count, 1)))
+
+
+def benchmark(root, models=1000, runs=20):
+    timer = Timer()
+    tools = simtool.make_tools(os.path.join(root, "tools"))
+    make_models(os.path.join(root, "models"), models)
+    os.makedirs(os.path.join(root, "logs"))
+
+    engine = make_engine(root, tools)
+    n = len(engine)
+    print("{} models, {} experiments.".format(models, n))
+
+    with timer.time("expand collections", n):
+        engine = make_engine(root, tools)
+    with timer.time("sanity_check", n):
+        engine.sanity_check()
+    with timer.time("fill_results (no logs)", n):
+        engine.fill_results(iterations=1, verbose=False)
+    with timer.time("todo (nothing done)", n):
+        engine.todo(iterations=1)
+
+    write_logs(engine, 0)
+
+    engine = make_engine(root, tools)
+    with timer.time("fill_results (logs)", n):
+        engine.fill_results(iterations=1, verbose=False)
+    with timer.time("save_cache", n):
+        engine.save_cache(False)
+
+    engine = make_engine(root, tools)
+    with timer.time("fill_results (cache)", n):
+        engine.fill_results(iterations=1, verbose=False)
+    with timer.time("todo (all done)", n):
+        engine.todo(iterations=1)
+    with timer.time("get_groups", n):
+        engine.get_groups()
+    with timer.time("report", n):
+        engine.report(iterations=1)
+
+    # really run a few experiments (in iteration 1) with simtool.py, of the models that finish at once
+    def instant(e):
+        spec = simtool.parse_spec(e.call[-1])
+        return spec['t'] == 0 and not any(spec.get(flag) for flag in simtool.FLAGS)
+    selected = [e for e in engine if e.method == "ldd-sat" and instant(e)]
+    selected = selected[:runs]
+    with timer.time("spawn simtool.py directly", len(selected)):
+        for e in selected:
+            subprocess.call(e.call, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with timer.time("run_one (spawn, parse, store)", len(selected)):
+        for e in selected:
+            engine.run_one(e, 1)
+    statuses = [engine.get_status(e, 1)[0] for e in selected]
+    if any(s != Experiment.DONE for s in statuses):
+        print("Not all simulated runs are done!")
+
+    timer.report()
+
+
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def usage():
+    eprint("Valid calls:")
+    eprint("benchmark.py                  Benchmark the harness with 1000 simulated models and 20 runs")
+    eprint("benchmark.py <MODELS> [RUNS]  Benchmark the harness with <MODELS> simulated models")
+    eprint("Every model has {} experiments (LDD, BDD, MDD and PNML with workers {}).".format(
+        6*len(WORKERS) + 2*len(WORKERS) + 2 + 2*len(WORKERS), WORKERS))
+
+
+def main():
+    if len(sys.argv) > 3 or (len(sys.argv) > 1 and not sys.argv[1].isdigit()):
+        usage()
+        sys.exit(2)
+    models = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    root = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        benchmark(root, models, runs)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import heapq
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from expfw import Drain, Experiment
+from planner import Planner
+
+
+###
+# Bundles of experiments for Slurm.
+# exp-cluster-slurm.sh starts one exclusive job per group, so thousands of
+# short experiments each wait for the scheduler and reserve a whole node.
+# Instead, the pending runs are packed into bundles of about the same predicted
+# duration (predictions as in planner.py), which run one after the other on
+# one node. Runs that need more cores than a node has are left out.
+# The bundles are saved in <logdir>/bundles/plan.json and run as a Slurm job
+# array (one task per bundle), with "experiments.py <PROFILE> bundle <INDEX>".
+# The results are the log files in <logdir>, so "bundles collect" reads them
+# back into the cache. Backends:
+# - dry-run: only report the bundles and the job script
+# - slurm: write the job script and submit it with sbatch
+# - local: run the bundles here, one after the other
+###
+
+BUNDLE_TIME = 3600
+# the time limit of a task is the largest bundle times SLACK plus MARGIN seconds
+SLACK = 1.5
+MARGIN = 600
+SBATCH = "sbatch"
+
+
+def pack(runs, target):
+    """Pack <runs> (run, predicted seconds) into bundles of about <target> seconds:
+    the longest run first into the bundle with the least predicted time.
+    Returns a list of (predicted seconds, runs), the longest bundle first.
+    """
+    total = sum(t for r, t in runs)
+    count = max(1, int(-(-total // target)))
+    heap = [(0.0, k, []) for k in range(count)]
+    for r, t in sorted(runs, key=lambda x: -x[1]):
+        duration, k, members = heapq.heappop(heap)
+        members.append(r)
+        heapq.heappush(heap, (duration + t, k, members))
+    bundles = [(duration, members) for duration, k, members in heap if len(members) > 0]
+    bundles.sort(key=lambda b: -b[0])
+    return bundles
+
+
+def slurm_time(seconds):
+    seconds = int(seconds)
+    return "{}-{:02d}:{:02d}:{:02d}".format(seconds // 86400, seconds % 86400 // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+class Bundles(object):
+    def __init__(self, engine, profile, iterations=1, cores=None, target=BUNDLE_TIME, options=()):
+        """Bundles of the pending runs of <engine> for nodes with <cores> cores (default: the most workers).
+        <options> are extra sbatch options, e.g. ["--partition=normal"].
+        """
+        self.engine = engine
+        self.profile = profile
+        self.iterations = iterations
+        self.cores = cores if cores is not None else max(e.workers for e in engine)
+        self.target = target
+        self.options = list(options)
+        self.directory = os.path.join(engine.logdir, "bundles")
+        self.planfile = os.path.join(self.directory, "plan.json")
+
+    def pending(self):
+        """Return ([(name, iteration), predicted seconds], runs that do not fit on a node).
+        """
+        runs = []
+        skipped = []
+        for row in Planner(self.engine, self.iterations).rows().values():
+            for e, i, t, source in row.pending:
+                if e.workers > self.cores:
+                    skipped.append((e.name, i))
+                else:
+                    runs.append(((e.name, i), t))
+        return runs, skipped
+
+    def plan(self):
+        runs, skipped = self.pending()
+        bundles = pack(runs, self.target)
+        predicted = {r: t for r, t in runs}
+        plan = {'cores': self.cores, 'target': self.target, 'created': time.time(),
+                'bundles': [{'predicted': round(d, 1), 'runs': [list(r) for r in members]} for d, members in bundles],
+                'predictions': {"{}/{}".format(n, i): t for (n, i), t in predicted.items()},
+                'skipped': [list(r) for r in skipped]}
+        return plan
+
+    def save(self, plan):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        with open(self.planfile + ".tmp", 'w') as f:
+            json.dump(plan, f, indent=1)
+        os.replace(self.planfile + ".tmp", self.planfile)
+
+    def load(self):
+        with open(self.planfile) as f:
+            return json.load(f)
+
+    def script(self, plan):
+        """The job array script that runs every bundle of <plan> as one task.
+        """
+        longest = max(b['predicted'] for b in plan['bundles'])
+        me = os.path.abspath(os.path.join(os.path.dirname(__file__), "experiments.py"))
+        lines = ["#!/bin/bash",
+                 "#SBATCH --array=0-{}".format(len(plan['bundles']) - 1),
+                 "#SBATCH -N1 -n1 -c{} --exclusive".format(plan['cores']),
+                 "#SBATCH --time={}".format(slurm_time(longest * SLACK + MARGIN)),
+                 "#SBATCH -o {}/bundle-%a.out".format(os.path.abspath(self.directory)),
+                 # stop after the current run before the time limit, see expfw.Drain
+                 "#SBATCH --signal=B:TERM@300"]
+        lines += ["#SBATCH {}".format(o) for o in self.options]
+        lines += ["", "cd {}".format(os.getcwd()),
+                  "exec {} {} {} bundle $SLURM_ARRAY_TASK_ID".format(sys.executable, me, self.profile.name), ""]
+        return "\n".join(lines)
+
+    def report(self, plan):
+        total = sum(b['predicted'] for b in plan['bundles'])
+        runs = sum(len(b['runs']) for b in plan['bundles'])
+        print("{} runs in {} bundles of about {} seconds on {}-core nodes ({:.2f} node-hours predicted).".format(
+            runs, len(plan['bundles']), plan['target'], plan['cores'], total / 3600))
+        for k, b in enumerate(plan['bundles']):
+            print("Bundle {}: {} runs, {:.1f} seconds.".format(k, len(b['runs']), b['predicted']))
+        if len(plan['skipped']) > 0:
+            print("{} runs need more than {} cores and are not bundled.".format(len(plan['skipped']), plan['cores']))
+
+    def submit(self, backend="dry-run"):
+        """Plan the bundles and submit them with <backend> (dry-run, slurm or local).
+        """
+        plan = self.plan()
+        if len(plan['bundles']) == 0:
+            print("Nothing to do.")
+            return
+        self.report(plan)
+        script = self.script(plan)
+        if backend == "dry-run":
+            print(script)
+            return
+        self.save(plan)
+        if backend == "local":
+            for k in range(len(plan['bundles'])):
+                if not self.run(k):
+                    break
+            self.collect()
+            return
+        scriptfile = os.path.join(self.directory, "array.sh")
+        with open(scriptfile, 'w') as f:
+            f.write(script)
+        if shutil.which(SBATCH) is None:
+            print("{} not found; submit {} on the cluster.".format(SBATCH, scriptfile))
+            return
+        subprocess.call([SBATCH, scriptfile])
+
+    def run(self, index):
+        """Run bundle <index> of the saved plan, until it is done or the runner is stopped.
+        Returns False if the runner was stopped.
+        """
+        plan = self.load()
+        runs = plan['bundles'][index]['runs']
+        experiments = {e.name: e for e in self.engine}
+        print("Bundle {}: {} runs.".format(index, len(runs)))
+        drain = Drain(self.engine.grace)
+        drain.install()
+        self.engine.drain = drain
+        try:
+            for name, i in runs:
+                if drain.draining():
+                    print("Stopped; the remaining runs are pending for the next plan.")
+                    return False
+                e = experiments.get(name)
+                if e is None:
+                    continue
+                if self.engine.run_one(e, i):
+                    time.sleep(1)
+        finally:
+            drain.uninstall()
+            self.engine.drain = None
+        return True
+
+    def collect(self):
+        """Read the results of the bundles of the saved plan and update the cache.
+        Call this when the job array is finished: the logs of runs that were killed
+        (e.g. at the time limit) are moved aside, so the next plan has them again.
+        """
+        plan = self.load()
+        self.engine.results = []
+        self.engine.fill_results(iterations=self.iterations, verbose=False)
+        for b in plan['bundles']:
+            for name, i in b['runs']:
+                # read the log files again, not the cache
+                self.engine.extend_for_iteration(i)
+                self.engine.results[i].pop(name, None)
+                self.engine.recover(name, i)
+        experiments = {e.name: e for e in self.engine}
+        counts = {}
+        for k, b in enumerate(plan['bundles']):
+            kinds = {}
+            measured = 0.0
+            for name, i in b['runs']:
+                e = experiments.get(name)
+                if e is None:
+                    continue
+                status, value = self.engine.get_status(e, i)
+                if status == Experiment.DONE:
+                    kind = "done"
+                    measured += value.get('wall', value.get('time', 0))
+                elif status == Experiment.TIMEOUT and value >= self.engine.timeout:
+                    kind = "timeout"
+                    measured += value
+                elif status == Experiment.ERROR:
+                    kind = "error"
+                    measured += value.get('wall', 0)
+                else:
+                    kind = "pending"
+                kinds[kind] = kinds.get(kind, 0) + 1
+                counts[kind] = counts.get(kind, 0) + 1
+            print("Bundle {}: {}; {:.1f} seconds (predicted {:.1f}).".format(
+                k, ", ".join("{} {}".format(n, kind) for kind, n in sorted(kinds.items())), measured, b['predicted']))
+        print("Total: {}.".format(", ".join("{} {}".format(n, kind) for kind, n in sorted(counts.items()))))
+        self.engine.save_cache(True)
@@ -26,6 +26,22 @@ make
 echo a | sudo -S make install
 popd
 
+# compile Sylvan examples with statistics (Sylvan counters and Lace work-stealing counters)
+mkdir -p sylvan/build-stats
+pushd sylvan/build-stats
+printf '#define LACE_PIE_TIMES 0\n#define LACE_COUNT_STEALS 1\n#define LACE_COUNT_SPLITS 1\n#define LACE_USE_HWLOC 0\n' > lace_config.h
+cmake .. -DBUILD_SHARED_LIBS=OFF -DBUILD_TESTING=OFF -DSYLVAN_BUILD_EXAMPLES=ON -DSYLVAN_STATS=ON -DCMAKE_C_FLAGS="-I$PWD"
+make lddmc bddmc
+popd
+
+# compile the shared library liblddmcpy.so of lddmcpy.py (position independent, in its own
+# build directory, so the measured tools are not affected)
+mkdir -p sylvan/build-pic
+pushd sylvan/build-pic
+cmake .. -DBUILD_SHARED_LIBS=OFF -DBUILD_TESTING=OFF -DSYLVAN_BUILD_EXAMPLES=ON -DCMAKE_POSITION_INDEPENDENT_CODE=ON
+make lddmcpy
+popd
+
 # compile LTSmin
 tar xf ltsmin-3.1.0.tar.gz
 pushd ltsmin-3.1.0
@@ -39,6 +55,9 @@ popd
 pushd sylvan/examples
 cp bddmc ldd2bdd ldd2meddly lddmc medmc ../../tools
 popd
+cp sylvan/build-stats/examples/lddmc tools/lddmc-stats
+cp sylvan/build-stats/examples/bddmc tools/bddmc-stats
+cp sylvan/build-pic/examples/liblddmcpy.so tools
 
 ## copy LTSmin's binaries
 cp /usr/local/bin/* tools
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+###
+# Compiled models (DVE models compiled by DiVinE to .dve2C, Promela models
+# compiled by SpinS to .spins) are shared objects loaded by dve2lts-sym and
+# prom2lts-sym. We compile every model once, outside the timed runs, and keep
+# the result in a cache directory indexed by the hash of the source, so all
+# worker counts and iterations use the same compiled model.
+###
+
+DIVINE = "tools/divine"
+SPINS = "tools/spins"
+CACHEDIR = "compiled"
+COMPILE_TIMEOUT = 3600
+
+
+def digest(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+class ModelCompiler(object):
+    def __init__(self, command, output, cachedir=CACHEDIR, timeout=COMPILE_TIMEOUT):
+        """Compile models with <command> (a list, the source file is appended),
+        which writes the file <output>(basename of the source) in the working directory.
+        """
+        self.command = command
+        self.output = output
+        self.cachedir = cachedir
+        self.timeout = timeout
+        self.digests = {}
+
+    def digest(self, source):
+        if source not in self.digests:
+            self.digests[source] = digest(source)
+        return self.digests[source]
+
+    def target(self, source):
+        """Return the path of the compiled model of <source> (which may not exist yet).
+        """
+        return os.path.join(self.cachedir, self.digest(source), self.output(os.path.basename(source)))
+
+    def failed(self, source):
+        return os.path.join(self.cachedir, "{}-{}.failed".format(self.digest(source), self.output(os.path.basename(source))))
+
+    def ensure(self, source):
+        """Compile <source> unless it is in the cache.
+        Returns the path of the compiled model, or None if compiling failed.
+        """
+        target = self.target(source)
+        if os.path.isfile(target):
+            return target
+        if os.path.isfile(self.failed(source)):
+            return None
+        # compile in a temporary directory, then move it into place
+        final = os.path.dirname(target)
+        tmp = "{}.tmp-{}-{}".format(final, os.getpid(), threading.get_ident())
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        shutil.copy2(source, tmp)
+        print("Compiling {}...".format(source))
+        sys.stdout.flush()
+        with open(os.path.join(tmp, "compile.log"), 'w') as log:
+            try:
+                subprocess.call(self.command + [os.path.basename(source)], cwd=tmp,
+                                stdout=log, stderr=log, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                log.write("timeout ({} seconds)\n".format(self.timeout))
+            except OSError:
+                log.write("OS Error, typically caused by a missing executable.\n")
+        if not os.path.isfile(os.path.join(tmp, os.path.basename(target))):
+            shutil.move(os.path.join(tmp, "compile.log"), self.failed(source))
+            shutil.rmtree(tmp)
+            print("\033[1;31mCompiling {} failed, see {}.\033[m".format(source, self.failed(source)))
+            return None
+        try:
+            os.rename(tmp, final)
+        except OSError:
+            # the directory exists: compiled concurrently, or another model with the same source
+            if not os.path.isfile(target):
+                os.rename(os.path.join(tmp, os.path.basename(target)), target)
+            shutil.rmtree(tmp)
+        return target
+
+    def compile_all(self, sources, jobs=None):
+        """Compile all <sources> that are not in the cache, with <jobs> parallel compilations.
+        Returns the number of models that are available.
+        """
+        if not os.path.exists(self.cachedir):
+            os.makedirs(self.cachedir)
+        # the same source (by hash) is compiled only once
+        unique = {}
+        for source in sources:
+            unique.setdefault((self.digest(source), os.path.basename(source)), source)
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            results = list(pool.map(self.ensure, unique.values()))
+        return sum(1 for r in results if r is not None)
+
+
+def dve_compiler(cachedir=CACHEDIR):
+    """DiVinE compiles name.dve to name.dve2C.
+    """
+    return ModelCompiler([os.path.abspath(DIVINE), "compile", "-l"], lambda f: f[:-4] + ".dve2C", cachedir)
+
+
+def promela_compiler(cachedir=CACHEDIR):
+    """SpinS compiles name.prm to name.prm.spins.
+    """
+    return ModelCompiler([os.path.abspath(SPINS), "-o3"], lambda f: f + ".spins", cachedir)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import subprocess
+
+
+###
+# Hardware performance counters.
+# Scaling loss at 24-48 workers is usually memory-bound: cache misses on the
+# shared unique table, remote NUMA accesses and stalls. A PerfStat collector
+# runs the tool under "perf stat" and adds the counters to the results
+# (perf_* fields). Events that the machine (or the virtual machine, or the
+# perf_event_paranoid setting) does not support are left out, and without
+# perf or without any supported event the tools run as usual.
+#
+# A collector has two methods, used by Experiment.run_experiment:
+# - wrap(call, filename): the call to run instead of <call>, for the log file <filename>
+# - collect(filename): a dict with the values to add to the log file after the run
+###
+
+PERF = "perf"
+
+# perf event -> field
+EVENTS = [
+    ("cycles", "perf_cycles"),
+    ("instructions", "perf_instructions"),
+    ("LLC-load-misses", "perf_llc_misses"),
+    ("node-load-misses", "perf_node_misses"),
+    ("stalled-cycles-frontend", "perf_stalled_frontend"),
+    ("stalled-cycles-backend", "perf_stalled_backend"),
+]
+
+COUNTER_FIELDS = [field for _, field in EVENTS] + ["perf_ipc"]
+
+
+def parse_perf_stat(contents):
+    """Parse the output of "perf stat -x," into {event: count}.
+    Events that are not supported or not counted are left out.
+    """
+    res = {}
+    for line in contents.splitlines():
+        if line.startswith("#") or line.count(",") < 2:
+            continue
+        value, unit, event = line.split(",")[:3]
+        # the event may have a modifier, e.g. "cycles:u"
+        event = event.split(":")[0]
+        try:
+            res[event] = int(float(value))
+        except ValueError:
+            # <not supported> or <not counted>
+            pass
+    return res
+
+
+class PerfStat(object):
+    def __init__(self, events=None, perf=PERF):
+        """Collect the counters in <events> (default: all of EVENTS) with perf stat.
+        """
+        self.perf = perf
+        self.events = [(e, f) for e, f in EVENTS if events is None or e in events]
+        self.supported = None
+
+    def probe(self):
+        """Determine once which events are supported, by counting a trivial command.
+        """
+        if self.supported is not None:
+            return self.supported
+        self.supported = []
+        exe = shutil.which(self.perf)
+        if exe is None:
+            print("Hardware counters unavailable: {} not found.".format(self.perf))
+            return self.supported
+        names = ",".join(e for e, f in self.events)
+        try:
+            p = subprocess.run([exe, "stat", "-x,", "-e", names, "--", "true"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+        except (OSError, subprocess.TimeoutExpired):
+            print("Hardware counters unavailable: {} failed.".format(self.perf))
+            return self.supported
+        counted = parse_perf_stat(p.stderr.decode(errors='replace'))
+        self.supported = [(e, f) for e, f in self.events if e in counted]
+        missing = [e for e, f in self.events if e not in counted]
+        if len(self.supported) == 0:
+            print("Hardware counters unavailable (see /proc/sys/kernel/perf_event_paranoid).")
+        elif len(missing) > 0:
+            print("Hardware counters not supported: {}.".format(", ".join(missing)))
+        return self.supported
+
+    def output(self, filename):
+        return "{}.perf".format(filename)
+
+    def wrap(self, call, filename):
+        # without the tool, the call fails as usual (OSError) and not as an error of perf
+        if len(self.probe()) == 0 or shutil.which(call[0]) is None:
+            return call
+        if os.path.isfile(self.output(filename)):
+            os.unlink(self.output(filename))
+        return [self.perf, "stat", "-x,", "-o", self.output(filename),
+                "-e", ",".join(e for e, f in self.supported), "--"] + list(call)
+
+    def collect(self, filename):
+        if len(self.probe()) == 0 or not os.path.isfile(self.output(filename)):
+            return {}
+        with open(self.output(filename)) as f:
+            counted = parse_perf_stat(f.read())
+        res = {f: counted[e] for e, f in self.supported if e in counted}
+        if res.get('perf_cycles', 0) > 0 and 'perf_instructions' in res:
+            res['perf_ipc'] = round(res['perf_instructions'] / res['perf_cycles'], 4)
+        return res
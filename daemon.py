@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+import collections
+import json
+import os
+import random
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+from expfw import Experiment
+from summary import Summary
+
+
+###
+# A resident harness daemon.
+# Every call of a subcommand expands all collections, loads the cache and checks
+# the log files again. The daemon does this once, keeps the experiments and the
+# results in memory and answers requests on a Unix socket, so the subcommands
+# only have to send a request. Experiments that are submitted are run one at a
+# time by the daemon, and clients can follow the completed runs as events.
+#
+# The protocol is one JSON object per line. A request has a "cmd" and arguments:
+# - ping: the number of experiments and queued runs
+# - todo (by_group): the groups (or experiments) that are not done
+# - report (group): the lines of the report
+# - summary (fields): the lines of the summary grouped by <fields> (see summary.py)
+# - best: the lines with the best method per model
+# - status (name, iteration): the status and result of one run, and whether it is running
+# - results: the results of all iterations (as in the cache file)
+# - submit (group, names, iterations): queue the runs that are not done
+# - events (since, submission): stream the events after <since>, until the
+#   submission (if given) is finished
+# - refresh: read the cache and the log files again
+# - shutdown: stop the daemon after the current run
+# The response is one JSON object per line; it has "error" if the request failed.
+###
+
+# Number of events kept in memory
+EVENTS = 10000
+
+
+class HarnessDaemon(object):
+    def __init__(self, engine, iterations, path):
+        """Serve the experiments of <engine> (initialized) on the Unix socket <path>.
+        """
+        self.engine = engine
+        self.iterations = iterations
+        self.path = path
+        self.experiments = {e.name: e for e in engine}
+        self.summary = Summary(engine, iterations)
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.queue = collections.deque()  # (submission, experiment, iteration)
+        self.queued = set()  # (name, iteration)
+        self.remaining = {}  # submission -> number of queued runs
+        self.submissions = 0
+        self.events = collections.deque(maxlen=EVENTS)
+        self.seq = 0
+        self.stopping = False
+
+    ###
+    # Requests
+    ###
+
+    def handle(self, request):
+        """Handle a request, return an iterator over the responses.
+        """
+        cmd = request.get('cmd')
+        if cmd == "events":
+            return self.stream(request.get('since'), request.get('submission'))
+        fun = getattr(self, "cmd_" + str(cmd), None)
+        if fun is None:
+            return iter([{'error': "unknown command {}".format(cmd)}])
+        with self.lock:
+            return iter([fun(request)])
+
+    def cmd_ping(self, request):
+        return {'experiments': len(self.experiments), 'queued': len(self.queue), 'seq': self.seq}
+
+    def cmd_todo(self, request):
+        iterations = request.get('iterations', self.iterations)
+        by_group = request.get('by_group', True)
+        if by_group and iterations == self.iterations:
+            return {'todo': self.summary.todo_groups()}
+        return {'todo': sorted(self.engine.todo(by_group, iterations=iterations))}
+
+    def cmd_summary(self, request):
+        return {'lines': list(self.summary.report_lines(request.get('fields', ["model", "method"])))}
+
+    def cmd_best(self, request):
+        return {'lines': list(self.summary.best_lines())}
+
+    def cmd_report(self, request):
+        iterations = request.get('iterations', self.iterations)
+        return {'lines': list(self.engine.report_lines(group=request.get('group'), iterations=iterations))}
+
+    def cmd_status(self, request):
+        e = self.experiments.get(request.get('name'))
+        iteration = int(request.get('iteration', 0))
+        if e is None:
+            return {'error': "unknown experiment {}".format(request.get('name'))}
+        self.engine.extend_for_iteration(iteration)
+        status, value = self.engine.get_status(e, iteration)
+        return {'status': status, 'value': value, 'text': self.engine.status_text(e, iteration)[0],
+                'running': (e.name, iteration) in self.engine.running}
+
+    def cmd_results(self, request):
+        return {'results': self.engine.results}
+
+    def cmd_submit(self, request):
+        group = request.get('group')
+        names = request.get('names')
+        iterations = request.get('iterations', self.iterations)
+        self.submissions += 1
+        submission = self.submissions
+        count = 0
+        for i in range(iterations):
+            self.engine.extend_for_iteration(i)
+            # like ExperimentEngine.run: the groups and the experiments in a group in random order
+            exps = [e for e in self.engine if (group is None or e.group == group) and (names is None or e.name in names)]
+            groups = sorted({e.group for e in exps})
+            for g in random.sample(groups, k=len(groups)):
+                members = [e for e in exps if e.group == g]
+                for e in random.sample(members, k=len(members)):
+                    status, value = self.engine.get_status(e, i)
+                    if status == Experiment.NOTDONE or (status == Experiment.TIMEOUT and value < self.engine.timeout):
+                        if (e.name, i) not in self.queued:
+                            self.queue.append((submission, e, i))
+                            self.queued.add((e.name, i))
+                            count += 1
+        seq = self.seq
+        if count > 0:
+            self.remaining[submission] = count
+        else:
+            self.emit({'type': 'finished', 'submission': submission})
+        self.changed.notify_all()
+        return {'submission': submission, 'runs': count, 'queued': len(self.queue), 'seq': seq}
+
+    def cmd_refresh(self, request):
+        self.engine.results = []
+        self.engine.fill_results(iterations=self.iterations, verbose=False)
+        self.summary.rebuild()
+        return {'ok': True}
+
+    def cmd_shutdown(self, request):
+        self.stopping = True
+        self.changed.notify_all()
+        threading.Thread(target=self.server.shutdown).start()
+        return {'ok': True}
+
+    def stream(self, since, submission):
+        """Yield the events after sequence number <since> (default: now),
+        until the <submission> (if given) is finished or the daemon stops.
+        """
+        with self.lock:
+            if since is None:
+                since = self.seq
+        while True:
+            with self.lock:
+                while self.seq <= since and not self.stopping:
+                    self.changed.wait()
+                events = [ev for ev in self.events if ev['seq'] > since]
+                stopping = self.stopping
+            for ev in events:
+                since = ev['seq']
+                yield ev
+                if ev['type'] == 'finished' and ev['submission'] == submission:
+                    return
+            if stopping:
+                return
+
+    def emit(self, event):
+        """Add an event (with the lock held).
+        """
+        self.seq += 1
+        event['seq'] = self.seq
+        event['time'] = time.time()
+        self.events.append(event)
+        self.changed.notify_all()
+
+    ###
+    # Running the queue
+    ###
+
+    def next_run(self):
+        """Wait for the next queued run that still has to be done, with the lock held.
+        Returns (submission, experiment, iteration), or None if stopping.
+        """
+        while True:
+            while len(self.queue) == 0 and not self.stopping:
+                self.changed.wait()
+            if self.stopping:
+                return None
+            submission, e, i = self.queue.popleft()
+            self.queued.discard((e.name, i))
+            # like run_one, do not use the cache
+            status, value = e.get_status(self.engine.get_logfile(e, i))
+            if (status == Experiment.DONE or status == Experiment.ERROR or
+                    (status == Experiment.TIMEOUT and value >= self.engine.timeout)):
+                self.engine.record(e, i, status, value)
+                self.complete(submission, e, i)
+                continue
+            return submission, e, i
+
+    def complete(self, submission, e, i):
+        """Report a finished run of <submission> (with the lock held).
+        """
+        status, value = self.engine.get_status(e, i)
+        self.emit({'type': 'completed', 'submission': submission, 'name': e.name, 'group': e.group,
+                   'iteration': i, 'status': status, 'value': value, 'text': self.engine.status_text(e, i)[0]})
+        self.finish(submission)
+
+    def finish(self, submission):
+        """Count down the runs of <submission> (with the lock held).
+        """
+        self.remaining[submission] -= 1
+        if self.remaining[submission] == 0:
+            del self.remaining[submission]
+            self.emit({'type': 'finished', 'submission': submission})
+
+    def runner(self):
+        while True:
+            with self.lock:
+                run = self.next_run()
+            if run is None:
+                return
+            submission, e, i = run
+            engine = self.engine
+            with self.lock:
+                # the status and report requests do not read the log file of this run
+                engine.running.add((e.name, i))
+                self.emit({'type': 'started', 'submission': submission, 'name': e.name, 'iteration': i})
+            try:
+                status, value = e.run_experiment(engine.timeout, engine.get_logfile(e, i),
+                                                 monitor=engine.monitor, stager=engine.stager,
+                                                 collectors=engine.collectors)
+            except SystemExit:
+                # run_experiment exits on a missing executable
+                with self.lock:
+                    engine.running.discard((e.name, i))
+                    self.emit({'type': 'stopped', 'name': e.name, 'iteration': i})
+                    self.stopping = True
+                    self.changed.notify_all()
+                return
+            except Exception as ex:
+                # e.g. in the monitor or a collector; the run is not recorded, the queue goes on
+                traceback.print_exc()
+                sys.stdout.flush()
+                with self.lock:
+                    engine.running.discard((e.name, i))
+                    self.emit({'type': 'failed', 'submission': submission, 'name': e.name, 'iteration': i,
+                               'error': "{}: {}".format(type(ex).__name__, ex)})
+                    self.finish(submission)
+                continue
+            with self.lock:
+                engine.running.discard((e.name, i))
+                if status == Experiment.DONE and value.get('tainted', 0) == 1 and engine.requeue(e, i):
+                    # run it again at the end, like ExperimentEngine.run
+                    self.queue.append((submission, e, i))
+                    self.queued.add((e.name, i))
+                    self.emit({'type': 'requeued', 'submission': submission, 'name': e.name, 'iteration': i})
+                else:
+                    if status != Experiment.NOTDONE:
+                        engine.record(e, i, status, value)
+                    engine.save_cache(False)
+                    self.complete(submission, e, i)
+            time.sleep(1)
+
+    ###
+    # The server
+    ###
+
+    def serve(self):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line.decode())
+                    except ValueError:
+                        request = {}
+                    try:
+                        for response in daemon.handle(request):
+                            self.wfile.write((json.dumps(response) + "\n").encode())
+                            self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+
+        if os.path.exists(self.path):
+            if connect(self.path) is not None:
+                print("A daemon is already running on {}.".format(self.path))
+                return
+            os.unlink(self.path)
+        self.server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self.server.daemon_threads = True
+        runner = threading.Thread(target=self.runner, daemon=True)
+        runner.start()
+        print("Serving {} experiments on {}.".format(len(self.experiments), self.path))
+        sys.stdout.flush()
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            os.unlink(self.path)
+            with self.lock:
+                self.stopping = True
+                self.changed.notify_all()
+            # finish the current run
+            runner.join()
+        print("Daemon stopped.")
+
+
+###
+# Clients
+###
+
+class Client(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+
+    def send(self, cmd, **args):
+        args['cmd'] = cmd
+        self.sock.sendall((json.dumps(args) + "\n").encode())
+
+    def receive(self):
+        line = self.rfile.readline()
+        if len(line) == 0:
+            raise ConnectionError("daemon closed the connection")
+        res = json.loads(line.decode())
+        if 'error' in res:
+            raise RuntimeError(res['error'])
+        return res
+
+    def request(self, cmd, **args):
+        """Send a request and return the response.
+        """
+        self.send(cmd, **args)
+        return self.receive()
+
+    def stream(self, cmd, **args):
+        """Send a request and iterate over the responses, until the daemon stops sending.
+        """
+        self.send(cmd, **args)
+        while True:
+            try:
+                yield self.receive()
+            except ConnectionError:
+                return
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def connect(path):
+    """Connect to the daemon on <path>, or return None if it is not running.
+    """
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return Client(sock)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import time
+
+
+###
+# Energy of every run, from the RAPL counters of the Linux powercap interface.
+# Whether 16 or 48 workers is better also depends on the energy: a run with 48
+# workers may be faster but cost more joules. The RAPL collector reads the
+# energy counters (in microjoules) of the package and DRAM domains of every
+# socket while the tool runs, and adds the joules per domain, the total and the
+# average power to the results (ENERGY_FIELDS). The counters wrap around at
+# max_energy_range_uj, so they are read every INTERVAL seconds (far less than
+# the time to wrap around) and the differences are added up.
+#
+# The counters are in /sys/class/powercap/intel-rapl:<socket>[:<subzone>]/
+# (files name, energy_uj, max_energy_range_uj); energy_uj is usually only
+# readable by root. A stand-in with the same files (see make_standin and
+# "energy.py standin <DIR>") can be used as the root on machines without RAPL.
+###
+
+POWERCAP = "/sys/class/powercap"
+INTERVAL = 1.0
+
+# domain of a zone (by the prefix of its name) -> field
+DOMAINS = [("package", "energy_pkg"), ("dram", "energy_dram")]
+ENERGY_FIELDS = ["energy_pkg", "energy_dram", "energy", "power"]
+
+
+class Zone(object):
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "name")) as f:
+            self.name = f.read().strip()
+        with open(os.path.join(path, "max_energy_range_uj")) as f:
+            self.range = int(f.read())
+        self.field = next((field for prefix, field in DOMAINS if self.name.startswith(prefix)), None)
+
+    def read(self):
+        with open(os.path.join(self.path, "energy_uj")) as f:
+            return int(f.read())
+
+
+def find_zones(root=POWERCAP):
+    """The package and DRAM zones of all sockets under <root>.
+    """
+    res = []
+    if not os.path.isdir(root):
+        return res
+    for d in sorted(os.listdir(root)):
+        # intel-rapl:0, intel-rapl:0:1, ...; not the duplicate intel-rapl-mmio zones
+        if not d.startswith("intel-rapl:"):
+            continue
+        try:
+            zone = Zone(os.path.join(root, d))
+        except (OSError, ValueError):
+            continue
+        if zone.field is not None:
+            res.append(zone)
+    return res
+
+
+class Sampler(object):
+    """Add up the energy of the <zones> in a thread, until stop() is called.
+    """
+    def __init__(self, zones, interval=INTERVAL):
+        self.zones = zones
+        self.interval = interval
+        self.total = [0] * len(zones)
+        self.stopped = threading.Event()
+        self.last = [z.read() for z in zones]
+        self.start = time.monotonic()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        for i, z in enumerate(self.zones):
+            value = z.read()
+            delta = value - self.last[i]
+            if delta < 0:
+                # wrapped around
+                delta += z.range
+            self.total[i] += delta
+            self.last[i] = value
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        """Stop and return ({field: joules}, seconds).
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+        elapsed = time.monotonic() - self.start
+        res = {}
+        for z, uj in zip(self.zones, self.total):
+            res[z.field] = res.get(z.field, 0.0) + uj / 1e6
+        return res, elapsed
+
+
+class RAPL(object):
+    def __init__(self, root=POWERCAP, interval=INTERVAL):
+        """Measure the energy of the runs with the RAPL counters in <root> (or a stand-in).
+        """
+        self.root = root
+        self.interval = interval
+        self.zones = None
+        self.sampler = None
+
+    def probe(self):
+        if self.zones is None:
+            self.zones = find_zones(self.root)
+            if len(self.zones) == 0:
+                print("Energy unavailable: no RAPL zones in {}.".format(self.root))
+            else:
+                try:
+                    for z in self.zones:
+                        z.read()
+                except OSError:
+                    print("Energy unavailable: cannot read {} (only root can read energy_uj).".format(self.zones[0].path))
+                    self.zones = []
+        return len(self.zones) > 0
+
+    def wrap(self, call, filename):
+        if self.sampler is not None:
+            # the previous run timed out or failed before collect
+            self.sampler.stop()
+            self.sampler = None
+        if self.probe():
+            self.sampler = Sampler(self.zones, self.interval)
+        return call
+
+    def collect(self, filename):
+        if self.sampler is None:
+            return {}
+        joules, elapsed = self.sampler.stop()
+        self.sampler = None
+        res = {f: round(j, 3) for f, j in joules.items()}
+        res['energy'] = round(sum(joules.values()), 3)
+        if elapsed > 0:
+            res['power'] = round(res['energy'] / elapsed, 3)
+        return res
+
+
+###
+# Energy to solution and energy-delay product
+###
+
+def energy_rows(engine, iterations=1):
+    """Rows (group, method, workers, time, package J, DRAM J, energy J, power W, EDP J*s) with the
+    medians of the done runs with energy per (group, method, workers). The energy is the energy
+    to solution; the energy-delay product is the median energy times the median time.
+    """
+    from expfw import Experiment
+    from noise import is_tainted
+    values = {}
+    for e in engine:
+        for i in range(min(iterations, len(engine.results))):
+            status, value = engine.get_status(e, i)
+            if status == Experiment.DONE and 'energy' in value and not is_tainted(value):
+                v = values.setdefault((e.group, e.method, e.workers), {})
+                for f in ['time'] + ENERGY_FIELDS:
+                    if f in value:
+                        v.setdefault(f, []).append(value[f])
+    med = lambda xs: sorted(xs)[len(xs)//2] if xs else None
+    rows = []
+    for (group, method, workers), v in sorted(values.items()):
+        m = {f: med(v.get(f)) for f in ['time'] + ENERGY_FIELDS}
+        rows.append((group, method, workers, m['time'], m['energy_pkg'], m['energy_dram'], m['energy'],
+                     m['power'], round(m['energy'] * m['time'], 3)))
+    return rows
+
+
+###
+# Stand-in for machines without RAPL
+###
+
+def make_standin(root, sockets=1, range_uj=2**32):
+    """Create a powercap tree with a package and a DRAM zone per socket in <root>, with all counters at 0.
+    """
+    for s in range(sockets):
+        for path, name in (("intel-rapl:{}".format(s), "package-{}".format(s)),
+                           ("intel-rapl:{}:0".format(s), "dram")):
+            d = os.path.join(root, path)
+            if not os.path.exists(d):
+                os.makedirs(d)
+            for f, v in (("name", name), ("max_energy_range_uj", range_uj), ("energy_uj", 0)):
+                with open(os.path.join(d, f), 'w') as out:
+                    out.write("{}\n".format(v))
+
+
+def run_standin(root, package=50.0, dram=5.0, interval=0.1):
+    """Advance the counters of the stand-in in <root> as if the packages use <package> watts
+    and the DRAM <dram> watts, forever.
+    """
+    zones = find_zones(root)
+    last = time.monotonic()
+    while True:
+        time.sleep(interval)
+        now = time.monotonic()
+        for z in zones:
+            watts = dram if z.field == "energy_dram" else package
+            value = (z.read() + int(watts * (now - last) * 1e6)) % z.range
+            tmp = os.path.join(z.path, "energy_uj.tmp")
+            with open(tmp, 'w') as out:
+                out.write("{}\n".format(value))
+            os.replace(tmp, os.path.join(z.path, "energy_uj"))
+        last = now
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) >= 2 and args[0] == "standin":
+        if not os.path.exists(os.path.join(args[1], "intel-rapl:0")):
+            make_standin(args[1], range_uj=int(float(args[4]) * 1e6) if len(args) > 4 else 2**32)
+        run_standin(args[1], *[float(x) for x in args[2:4]])
+    elif len(args) <= 1:
+        zones = find_zones(args[0] if len(args) > 0 else POWERCAP)
+        for z in zones:
+            print("{}: {} ({}), {} uJ".format(z.path, z.name, z.field, z.read()))
+        if len(zones) == 0:
+            print("No RAPL zones.")
+    else:
+        print("Valid calls:", file=sys.stderr)
+        print("energy.py [ROOT]                                   List the RAPL zones and counters", file=sys.stderr)
+        print("energy.py standin <DIR> [PACKAGE-W [DRAM-W [RANGE-J]]]  Create and run a stand-in with these watts", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
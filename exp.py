@@ -9,9 +9,39 @@ from expfw import Experiment
 DIVINE = "tools/divine"
 PNML2LTSSYM = "tools/pnml2lts-sym"
 DVE2LTSSYM = "tools/dve2lts-sym"
+PROM2LTSSYM = "tools/prom2lts-sym"
 LDDMC = "tools/lddmc"
 BDDMC = "tools/bddmc"
 MEDMC = "tools/medmc"
+LDDMC_STATS = "tools/lddmc-stats"
+BDDMC_STATS = "tools/bddmc-stats"
+
+# Variable orders: FORCE ("rf") and Sloan ("rbs") for every model, and the other
+# candidates of the order exploration (see orders.py), which are extra variants
+# of a model when they were kept, i.e. <model>-<order>.ldd exists
+ORDERS = ["rf", "rbs", "rbk", "rbcm", "rtgbs", "rgsa", "pdfs", "prcm", "pforce"]
+
+# Fields reported by parse_sylvan_stats and parse_lace_stats, in CSV order
+STATS_FIELDS = ["cache_hit_rate", "cache_hits", "cache_calls", "cache_puts",
+                "table_fill", "table_filled", "table_size", "cache_filled", "cache_size",
+                "nodes_created", "nodes_reused", "gc_count", "gc_time",
+                "steals", "steal_busy", "steal_tries",
+                "leaps", "leap_busy", "leap_tries", "split_shrinks", "split_grows", "split_requests"]
+
+
+def split_order(group, method):
+    """Return (model, order, method), with the variable order (one of ORDERS, by default "rbs")
+    derived from the group or the method like analyse.r does.
+    """
+    order = "rbs"
+    for o in ORDERS:
+        if group.endswith("-" + o):
+            group = group[:-len(o)-1]
+            order = o
+        if method.startswith(o + "-"):
+            method = method[len(o)+1:]
+            order = o
+    return group, order, method
 
 
 ###
@@ -47,6 +77,7 @@ class ExpLTSmin(Experiment):
         s = re.compile(r'group_next: ([\d\.,]+) nodes total').findall(contents)
         if len(s) == 1:
             res['nextnodes'] = int(s[0])
+        res.update(parse_ltsmin_phases(contents))
         return res
 
     def get_text(self, res):
@@ -109,6 +140,7 @@ class ExpLDD(Experiment):
         s = re.compile(r'Final states: ([\d\.,]+) states').findall(contents)
         if len(s) == 1:
             res['states'] = int("".join(s[0].split(",")))
+        res.update(parse_sylvan_phases(contents, "SAT"))
         return res
 
     def get_text(self, res):
@@ -119,7 +151,8 @@ class ExpLDD(Experiment):
 
     def run_experiment(self, *args, **kwargs):
         if os.path.isfile(self.model):
-            super(ExpLDD, self).run_experiments(*args, **kwargs)
+            return super(ExpLDD, self).run_experiment(*args, **kwargs)
+        return Experiment.NOTDONE, None
 
 
 class ExpLDDPar(Experiment):
@@ -140,6 +173,7 @@ class ExpLDDPar(Experiment):
         s = re.compile(r'Final states: ([\d\.,]+) states').findall(contents)
         if len(s) == 1:
             res['states'] = int("".join(s[0].split(",")))
+        res.update(parse_sylvan_phases(contents, "PAR"))
         return res
 
     def get_text(self, res):
@@ -150,7 +184,8 @@ class ExpLDDPar(Experiment):
 
     def run_experiment(self, *args, **kwargs):
         if os.path.isfile(self.model):
-            super(ExpLDDPar, self).run_experiments(*args, **kwargs)
+            return super(ExpLDDPar, self).run_experiment(*args, **kwargs)
+        return Experiment.NOTDONE, None
 
 
 class ExpLDDChaining(Experiment):
@@ -171,6 +206,7 @@ class ExpLDDChaining(Experiment):
         s = re.compile(r'Final states: ([\d\.,]+) states').findall(contents)
         if len(s) == 1:
             res['states'] = int("".join(s[0].split(",")))
+        res.update(parse_sylvan_phases(contents, "CHAINING"))
         return res
 
     def get_text(self, res):
@@ -181,7 +217,8 @@ class ExpLDDChaining(Experiment):
 
     def run_experiment(self, *args, **kwargs):
         if os.path.isfile(self.model):
-            super(ExpLDDChaining, self).run_experiments(*args, **kwargs)
+            return super(ExpLDDChaining, self).run_experiment(*args, **kwargs)
+        return Experiment.NOTDONE, None
 
 
 class ExpBDD(Experiment):
@@ -202,6 +239,7 @@ class ExpBDD(Experiment):
         s = re.compile(r'Final states: ([\d\.,]+) states').findall(contents)
         if len(s) == 1:
             res['states'] = int("".join(s[0].split(",")))
+        res.update(parse_sylvan_phases(contents, "SAT"))
         return res
 
     def get_text(self, res):
@@ -212,7 +250,8 @@ class ExpBDD(Experiment):
 
     def run_experiment(self, *args, **kwargs):
         if os.path.isfile(self.model):
-            super(ExpBDD, self).run_experiments(*args, **kwargs)
+            return super(ExpBDD, self).run_experiment(*args, **kwargs)
+        return Experiment.NOTDONE, None
 
 class ExpMDD(Experiment):
     def __init__(self, name, model):
@@ -244,29 +283,247 @@ class ExpMDD(Experiment):
 
     def run_experiment(self, *args, **kwargs):
         if os.path.isfile(self.model):
-            super(ExpMDD, self).run_experiments(*args, **kwargs)
+            return super(ExpMDD, self).run_experiment(*args, **kwargs)
+        return Experiment.NOTDONE, None
+
+
+###
+# Sylvan and Lace report internal counters when built with statistics
+# (see compile_sources.sh, which builds lddmc-stats and bddmc-stats)
+###
+
+def _int(s):
+    return int("".join(s.split(",")))
+
+
+def parse_sylvan_stats(contents):
+    """Parse the output of sylvan_stats_report into a dict.
+    Per-operation counters go into 'ops' as [count, cache hits, cache puts].
+    Returns an empty dict if Sylvan was not built with statistics.
+    """
+    res = {}
+    ops = {}
+    for op, count, hits, puts in re.compile(r'^((?:BDD|MTBDD|LDD) [\w ]+?) +([\d,]+) +([\d,]+) +([\d,]+) *$', re.M).findall(contents):
+        ops[op] = [_int(count), _int(hits), _int(puts)]
+    if len(ops) > 0:
+        res['ops'] = ops
+        res['cache_calls'] = sum(x[0] for x in ops.values())
+        res['cache_hits'] = sum(x[1] for x in ops.values())
+        res['cache_puts'] = sum(x[2] for x in ops.values())
+        if res['cache_calls'] > 0:
+            res['cache_hit_rate'] = res['cache_hits'] / res['cache_calls']
+    s = re.compile(r'^Unique nodes table +([\d,]+) of ([\d,]+) buckets filled', re.M).findall(contents)
+    if len(s) == 1:
+        res['table_filled'] = _int(s[0][0])
+        res['table_size'] = _int(s[0][1])
+        if res['table_size'] > 0:
+            res['table_fill'] = res['table_filled'] / res['table_size']
+    s = re.compile(r'^Operation cache +([\d,]+) of ([\d,]+) buckets filled', re.M).findall(contents)
+    if len(s) == 1:
+        res['cache_filled'] = _int(s[0][0])
+        res['cache_size'] = _int(s[0][1])
+    s = re.compile(r'^(?:LDD|MTBDD) nodes created +([\d,]+)', re.M).findall(contents)
+    if len(s) > 0:
+        res['nodes_created'] = sum(_int(x) for x in s)
+    s = re.compile(r'^(?:LDD|MTBDD) nodes reused +([\d,]+)', re.M).findall(contents)
+    if len(s) > 0:
+        res['nodes_reused'] = sum(_int(x) for x in s)
+    s = re.compile(r'^GC executions +([\d,]+)', re.M).findall(contents)
+    if len(s) == 1:
+        res['gc_count'] = _int(s[0])
+        res['gc_time'] = 0.0
+    s = re.compile(r'^Total time spent +([\d\.,]+) sec', re.M).findall(contents)
+    if len(s) == 1:
+        res['gc_time'] = float("".join(s[0].split(",")))
+    return res
+
+
+def parse_lace_stats(contents):
+    """Parse the output of lace_count_report_file (sums over all workers) into a dict.
+    Returns an empty dict if Lace was not built with counters.
+    """
+    res = {}
+    s = re.compile(r'^Steals \(sum\): (\d+) good/(\d+) busy of (\d+) tries; leaps: (\d+) good/(\d+) busy of (\d+) tries', re.M).findall(contents)
+    if len(s) == 1:
+        keys = ['steals', 'steal_busy', 'steal_tries', 'leaps', 'leap_busy', 'leap_tries']
+        res.update(zip(keys, map(int, s[0])))
+    s = re.compile(r'^Splits \(sum\): (\d+) shrinks, (\d+) grows, (\d+) outgoing requests', re.M).findall(contents)
+    if len(s) == 1:
+        keys = ['split_shrinks', 'split_grows', 'split_requests']
+        res.update(zip(keys, map(int, s[0])))
+    return res
+
+
+###
+# Phases of a run. The tools print timestamps (seconds since the start of the tool)
+# and the time of some phases, from which we derive:
+# - phase_load: reading the model, including allocating the Sylvan tables
+# - phase_setup: from loading to the start of the reachability (e.g. regrouping)
+# - phase_reach: the reachability (saturation, chaining, ...) itself
+# - phase_count: counting the states afterwards
+# - phase_total: the last timestamp of the tool
+# The harness records the end-to-end time ('wall'); the difference with phase_total
+# is the start and the exit of the process.
+###
+
+PHASE_FIELDS = ["phase_load", "phase_setup", "phase_reach", "phase_count", "phase_total"]
+
+
+def parse_sylvan_phases(contents, label):
+    """Phases of lddmc/bddmc from the "[    t] ..." lines, with <label> the
+    name of the reachability time, e.g. "SAT".
+    """
+    res = {}
+    stamps = re.compile(r'^\[ *([\d\.]+)\] (.*)$', re.M).findall(contents)
+    if len(stamps) == 0:
+        return res
+    res['phase_total'] = max(float(t) for t, line in stamps)
+    read = [float(t) for t, line in stamps if line.startswith("Read file")]
+    reach = [(float(t), line) for t, line in stamps if line.startswith(label + " Time: ")]
+    count = [float(t) for t, line in stamps if line.startswith("Final states")]
+    if len(read) == 1:
+        res['phase_load'] = read[0]
+    if len(reach) == 1:
+        t, line = reach[0]
+        res['phase_reach'] = float(line.split(": ")[1])
+        if len(read) == 1:
+            res['phase_setup'] = round(max(0.0, t - res['phase_reach'] - read[0]), 6)
+        if len(count) > 0:
+            res['phase_count'] = round(count[0] - t, 6)
+    return res
+
+
+def parse_ltsmin_phases(contents):
+    """Phases of the LTSmin tools from the "pnml2lts-sym, t: ..." lines
+    and the "... took <real> real" lines.
+    """
+    res = {}
+    stamps = re.compile(r'^[\w-]+, ([\d\.]+): (.*)$', re.M).findall(contents)
+    if len(stamps) == 0:
+        return res
+    res['phase_total'] = max(float(t) for t, line in stamps)
+    took = {}
+    for t, line in stamps:
+        m = re.match(r'(.*) took ([\d\.]+) real', line)
+        if m:
+            took[m.group(1)] = (float(t), float(m.group(2)))
+    load = [v for k, v in took.items() if k.startswith("Loading")]
+    if len(load) == 1:
+        res['phase_load'] = load[0][0]
+    if "reachability" in took:
+        t, real = took["reachability"]
+        res['phase_reach'] = real
+        res['phase_setup'] = round(max(0.0, t - real - res.get('phase_load', 0.0)), 6)
+    if "counting" in took:
+        res['phase_count'] = took["counting"][1]
+    return res
+
+
+class SylvanStats(object):
+    """Mixin for experiments with a Sylvan tool that is built with statistics.
+    The method gets the suffix "-stats" and the Sylvan/Lace counters are added to the results.
+    """
+    def parse_log(self, contents):
+        res = super(SylvanStats, self).parse_log(contents)
+        if res is not None and 'error' not in res:
+            res.update(parse_sylvan_stats(contents))
+            res.update(parse_lace_stats(contents))
+        return res
+
+    def use_stats_tool(self, exe):
+        self.method = self.method + "-stats"
+        self.name = "{}-{}-{}".format(self.group, self.method, self.workers)
+        self.call = [exe] + self.call[1:]
+
+
+class ExpLDDStats(SylvanStats, ExpLDD):
+    def __init__(self, name, workers, model):
+        super(ExpLDDStats, self).__init__(name, workers, model)
+        self.use_stats_tool(LDDMC_STATS)
+
+
+class ExpLDDParStats(SylvanStats, ExpLDDPar):
+    def __init__(self, name, workers, model):
+        super(ExpLDDParStats, self).__init__(name, workers, model)
+        self.use_stats_tool(LDDMC_STATS)
+
+
+class ExpLDDChainingStats(SylvanStats, ExpLDDChaining):
+    def __init__(self, name, workers, model):
+        super(ExpLDDChainingStats, self).__init__(name, workers, model)
+        self.use_stats_tool(LDDMC_STATS)
+
+
+class ExpBDDStats(SylvanStats, ExpBDD):
+    def __init__(self, name, workers, model):
+        super(ExpBDDStats, self).__init__(name, workers, model)
+        self.use_stats_tool(BDDMC_STATS)
+
+
+###
+# DVE and Promela models are compiled before they are run (see compiled.py).
+# The experiments refer to the compiled model in the cache; it is compiled
+# when it is missing, before (not in) the timed run.
+###
+
+class Compiled(object):
+    def __init__(self, exe, name, workers, source, compiler):
+        super(Compiled, self).__init__(exe, name, workers, compiler.target(source))
+        self.source = source
+        self.compiler = compiler
+
+    def run_experiment(self, *args, **kwargs):
+        if os.path.isfile(self.source) and self.compiler.ensure(self.source) is not None:
+            return super(Compiled, self).run_experiment(*args, **kwargs)
+        return Experiment.NOTDONE, None
+
+
+class ExpCompiledSatF(Compiled, ExpLDDSatF):
+    pass
+
+
+class ExpCompiledSatBS(Compiled, ExpLDDSatBS):
+    pass
 
 
 class FileFinder(object):
-    def __init__(self, directory, extensions):
+    def __init__(self, directory, extensions, names=None):
+        """Find files in <directory> with one of the <extensions>.
+        If <names> is given, only look for files with these names (without listing the directory).
+        """
         self.directory = directory
         self.extensions = extensions
+        self.names = names
 
     def __iter__(self):
         if not hasattr(self, 'files'):
             self.files = []
             for ext in self.extensions:
                 dotext = "." + ext
+                if self.names is not None:
+                    files = [x for x in self.names if os.path.isfile(self.directory+"/"+x+dotext)]
+                    self.files.extend([(x, "{}/{}{}".format(self.directory, x, dotext)) for x in files])
+                    continue
                 # get all files in directory ending with the extension
                 files = [f[:-len(dotext)] for f in filter(lambda f: f.endswith(dotext) and os.path.isfile(self.directory+"/"+f), os.listdir(self.directory))]
                 self.files.extend([(x, "{}/{}{}".format(self.directory, x, dotext)) for x in files])
         return self.files.__iter__()
 
 
+def model_orders(filename):
+    """The variable orders of the model <filename> (a .pnml file): rf, rbs and the kept extra orders.
+    """
+    return ORDERS[:2] + [o for o in ORDERS[2:] if os.path.isfile("{}-{}.ldd".format(filename[:-5], o))]
+
+
 class LDDExperiments(object):
-    def __init__(self, directory, workers):
-        self.files = FileFinder(directory, ["pnml"])
+    def __init__(self, directory, workers, stats=False, names=None):
+        self.files = FileFinder(directory, ["pnml"], names)
         self.workers = workers
+        if stats:
+            self.classes = ExpLDDStats, ExpLDDChainingStats, ExpLDDParStats
+        else:
+            self.classes = ExpLDD, ExpLDDChaining, ExpLDDPar
 
     def dicts(self):
         dicts = []
@@ -280,19 +537,17 @@ class LDDExperiments(object):
         for d in self.dicts():
             setattr(self, d, {})
         self.grouped = {}
+        ExpS, ExpC, ExpP = self.classes
         for name, filename in self.files:
-            # with -rf
-            for w in self.workers:
-                getattr(self, "s_"+str(w))[name+"-rf"] = ExpLDD(name+"-rf", w, filename[:-5]+"-rf")
-                getattr(self, "c_"+str(w))[name+"-rf"] = ExpLDDChaining(name+"-rf", w, filename[:-5]+"-rf")
-                getattr(self, "p_"+str(w))[name+"-rf"] = ExpLDDPar(name+"-rf", w, filename[:-5]+"-rf")
-            self.grouped[name+"-rf"] = [getattr(self, d)[name+"-rf"] for d in self.dicts()]
-            # with -rbs
-            for w in self.workers:
-                getattr(self, "s_"+str(w))[name+"-rbs"] = ExpLDD(name+"-rbs", w, filename[:-5]+"-rbs")
-                getattr(self, "c_"+str(w))[name+"-rbs"] = ExpLDDChaining(name+"-rbs", w, filename[:-5]+"-rbs")
-                getattr(self, "p_"+str(w))[name+"-rbs"] = ExpLDDPar(name+"-rbs", w, filename[:-5]+"-rbs")
-            self.grouped[name+"-rbs"] = [getattr(self, d)[name+"-rbs"] for d in self.dicts()]
+            # with -rf, -rbs and the kept extra orders
+            for o in model_orders(filename):
+                group = "{}-{}".format(name, o)
+                ldd = "{}-{}.ldd".format(filename[:-5], o)
+                for w in self.workers:
+                    getattr(self, "s_"+str(w))[group] = ExpS(group, w, ldd)
+                    getattr(self, "c_"+str(w))[group] = ExpC(group, w, ldd)
+                    getattr(self, "p_"+str(w))[group] = ExpP(group, w, ldd)
+                self.grouped[group] = [getattr(self, d)[group] for d in self.dicts()]
 
     def __iter__(self):
         if not hasattr(self, 'grouped'):
@@ -301,9 +556,10 @@ class LDDExperiments(object):
 
 
 class BDDExperiments(object):
-    def __init__(self, directory, workers):
-        self.files = FileFinder(directory, ["pnml"])
+    def __init__(self, directory, workers, stats=False, names=None):
+        self.files = FileFinder(directory, ["pnml"], names)
         self.workers = workers
+        self.exp_class = ExpBDDStats if stats else ExpBDD
 
     def dicts(self):
         dicts = []
@@ -316,14 +572,12 @@ class BDDExperiments(object):
             setattr(self, d, {})
         self.grouped = {}
         for name, filename in self.files:
-            # with -rf
-            for w in self.workers:
-                getattr(self, "s_"+str(w))[name+"-rf"] = ExpBDD(name+"-rf", w, filename[:-5]+"-rf.bdd")
-            self.grouped[name+"-rf"] = [getattr(self, d)[name+"-rf"] for d in self.dicts()]
-            # with -rbs
-            for w in self.workers:
-                getattr(self, "s_"+str(w))[name+"-rbs"] = ExpBDD(name+"-rbs", w, filename[:-5]+"-rbs.bdd")
-            self.grouped[name+"-rbs"] = [getattr(self, d)[name+"-rbs"] for d in self.dicts()]
+            # with -rf, -rbs and the kept extra orders
+            for o in model_orders(filename):
+                group = "{}-{}".format(name, o)
+                for w in self.workers:
+                    getattr(self, "s_"+str(w))[group] = self.exp_class(group, w, "{}-{}.bdd".format(filename[:-5], o))
+                self.grouped[group] = [getattr(self, d)[group] for d in self.dicts()]
 
     def __iter__(self):
         if not hasattr(self, 'grouped'):
@@ -332,8 +586,8 @@ class BDDExperiments(object):
 
 
 class MDDExperiments(object):
-    def __init__(self, directory):
-        self.files = FileFinder(directory, ["pnml"])
+    def __init__(self, directory, names=None):
+        self.files = FileFinder(directory, ["pnml"], names)
 
     def dicts(self):
         return ["s"]
@@ -342,11 +596,11 @@ class MDDExperiments(object):
         self.s = {}
         self.grouped = {}
         for name, filename in self.files:
-            # one with -rf, one with -rbs
-            self.s[name+"-rf"] = ExpMDD(name+"-rf", filename[:-5]+"-rf.mdd")
-            self.grouped[name+"-rf"] = [getattr(self, d)[name+"-rf"] for d in self.dicts()]
-            self.s[name+"-rbs"] = ExpMDD(name+"-rbs", filename[:-5]+"-rbs.mdd")
-            self.grouped[name+"-rbs"] = [getattr(self, d)[name+"-rbs"] for d in self.dicts()]
+            # one with -rf, one with -rbs, one per kept extra order
+            for o in model_orders(filename):
+                group = "{}-{}".format(name, o)
+                self.s[group] = ExpMDD(group, "{}-{}.mdd".format(filename[:-5], o))
+                self.grouped[group] = [getattr(self, d)[group] for d in self.dicts()]
 
     def __iter__(self):
         if not hasattr(self, 'grouped'):
@@ -355,8 +609,8 @@ class MDDExperiments(object):
 
 
 class PNMLExperiments(object):
-    def __init__(self, directory, workers):
-        self.files = FileFinder(directory, ["pnml"])
+    def __init__(self, directory, workers, names=None):
+        self.files = FileFinder(directory, ["pnml"], names)
         self.workers = workers
 
     def dicts(self):
@@ -380,3 +634,50 @@ class PNMLExperiments(object):
         if not hasattr(self, 'grouped'):
             self.prepare()
         return self.grouped.values().__iter__()
+
+
+class CompiledExperiments(object):
+    def __init__(self, exe, directory, extension, workers, compiler, names=None):
+        self.exe = exe
+        self.files = FileFinder(directory, [extension], names)
+        self.workers = workers
+        self.compiler = compiler
+
+    def dicts(self):
+        dicts = []
+        for w in self.workers:
+            dicts.append("lf_" + str(w))
+            dicts.append("ls_" + str(w))
+        return dicts
+
+    def sources(self):
+        return [filename for name, filename in self.files]
+
+    def prepare(self):
+        for d in self.dicts():
+            setattr(self, d, {})
+        self.grouped = {}
+        for name, filename in self.files:
+            for w in self.workers:
+                getattr(self, "lf_"+str(w))[name] = ExpCompiledSatF(self.exe, name, w, filename, self.compiler)
+                getattr(self, "ls_"+str(w))[name] = ExpCompiledSatBS(self.exe, name, w, filename, self.compiler)
+            self.grouped[name] = [getattr(self, d)[name] for d in self.dicts()]
+
+    def __iter__(self):
+        if not hasattr(self, 'grouped'):
+            self.prepare()
+        return self.grouped.values().__iter__()
+
+
+class DVEExperiments(CompiledExperiments):
+    def __init__(self, directory, workers, names=None, compiler=None):
+        from compiled import dve_compiler
+        super(DVEExperiments, self).__init__(DVE2LTSSYM, directory, "dve", workers,
+                                             compiler or dve_compiler(), names)
+
+
+class PromelaExperiments(CompiledExperiments):
+    def __init__(self, directory, workers, names=None, compiler=None):
+        from compiled import promela_compiler
+        super(PromelaExperiments, self).__init__(PROM2LTSSYM, directory, "prm", workers,
+                                                 compiler or promela_compiler(), names)
@@ -1,3 +1,6 @@
 #!/bin/bash
+# On preemption or at the time limit, Slurm sends SIGTERM 300 seconds before SIGKILL;
+# the runner then stops after the current run and resumes from its queue when resubmitted.
+#SBATCH --signal=B:TERM@300
 
-./exp48.py run
+exec ./exp48.py run
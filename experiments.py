@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+
+# Experiment profiles, by default profiles.json next to this script
+PROFILES = os.environ.get("EXP_PROFILES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles.json"))
+# Benchmark suites built by the suite command, next to the profiles
+SUITES = os.path.join(os.path.dirname(PROFILES), "suites.json")
+
+
+###
+# A profile describes one set of experiments:
+# - logdir, cachefile, sweepfile, timeout, iterations
+# - directory (with the models) and workers
+# - collections: ldd, ldd-stats, bdd, bdd-stats, mdd, pnml, dve, promela (see make_collection)
+# - dve_directory, promela_directory (optional): the models of the dve and promela collections
+# - methods, models (optional): only keep these methods / models (prefix)
+# - suite (optional): only keep the models of this suite in suites.json, e.g. "48-quick" (see suites.py)
+# - noise (optional): detect interference and repeat tainted runs (see noise.py)
+# - staging (optional): {"directory", "size", "link", "cache"} to stage inputs locally (see staging.py)
+# - counters (optional): true or a list of perf events, to record hardware counters (see counters.py)
+# - energy (optional): true or the root of a powercap stand-in, to record the energy of every run (see energy.py)
+# - profiler (optional): "perf" (default) or "gperf", the sampling profiler of the profile command (see profiler.py)
+# - socket (optional): the Unix socket of the harness daemon, default <logdir>/harness.sock (see daemon.py)
+# - grace (optional): seconds the current run may take after SIGTERM/SIGINT, default 60 (see expfw.Drain)
+# - cores, bundle, slurm (optional): the cores of a node (default: the most workers), the seconds per bundle
+#   (default 3600) and extra sbatch options of the bundles command (see bundles.py)
+# Modules are only imported and collections only expanded when a command needs them.
+###
+
+
+def make_collection(name, profile, names):
+    import exp
+    if name == "ldd":
+        return exp.LDDExperiments(profile.directory, profile.workers, names=names)
+    elif name == "ldd-stats":
+        return exp.LDDExperiments(profile.directory, profile.workers, stats=True, names=names)
+    elif name == "bdd":
+        return exp.BDDExperiments(profile.directory, profile.workers, names=names)
+    elif name == "bdd-stats":
+        return exp.BDDExperiments(profile.directory, profile.workers, stats=True, names=names)
+    elif name == "mdd":
+        return exp.MDDExperiments(profile.directory, names=names)
+    elif name == "pnml":
+        return exp.PNMLExperiments(profile.directory, profile.workers, names=names)
+    elif name == "dve":
+        return exp.DVEExperiments(profile.config.get('dve_directory', 'dve'), profile.workers, names=names)
+    elif name == "promela":
+        return exp.PromelaExperiments(profile.config.get('promela_directory', 'Promela'), profile.workers, names=names)
+    raise ValueError("unknown collection {}".format(name))
+
+
+class Profile(object):
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.logdir = config.get('logdir', 'logs-' + name)
+        self.cachefile = config.get('cachefile', 'cache-' + name + '.json')
+        self.sweepfile = config.get('sweepfile', 'sweep-' + name + '.json')
+        self.timeout = int(config.get('timeout', 1200))
+        self.iterations = int(config.get('iterations', 1))
+        self.directory = config.get('directory', 'mcc')
+        self.workers = config.get('workers', [1])
+        self.collections = config.get('collections', [])
+        self.methods = config.get('methods', None)
+        self.models = config.get('models', None)
+        self.suite = config.get('suite', None)
+        if self.suite is not None:
+            from suites import load_suites
+            suites = load_suites(SUITES)
+            if self.suite not in suites:
+                raise ValueError("unknown suite {} (see the suite command)".format(self.suite))
+            self.models = suites[self.suite]['models']
+        self.noise = config.get('noise', False)
+        self.staging = config.get('staging', None)
+        self.counters = config.get('counters', False)
+        self.energy = config.get('energy', False)
+        self.profiler = config.get('profiler', 'perf')
+        self.socket = config.get('socket', os.path.join(self.logdir, 'harness.sock'))
+        self.grace = int(config.get('grace', 60))
+        self.cores = config.get('cores', None)
+        self.bundle = int(config.get('bundle', 3600))
+        self.slurm = config.get('slurm', [])
+
+    def accept(self, e):
+        if self.methods is not None and e.method not in self.methods:
+            return False
+        if self.models is not None and not any(e.name.startswith(m) for m in self.models):
+            return False
+        return True
+
+    def engine(self, group=None):
+        """Create the engine with the experiments of this profile.
+        With a <group>, only the experiments of that group are created.
+        """
+        from expfw import ExperimentEngine
+        from exp import split_order
+        monitor = None
+        if self.noise:
+            from noise import NoiseMonitor
+            monitor = NoiseMonitor()
+        stager = None
+        if self.staging is not None:
+            from staging import LocalStore
+            stager = LocalStore(**self.staging)
+        collectors = []
+        if self.counters:
+            from counters import PerfStat
+            collectors.append(PerfStat(self.counters if isinstance(self.counters, list) else None))
+        if self.energy:
+            from energy import RAPL, POWERCAP
+            collectors.append(RAPL(self.energy if isinstance(self.energy, str) else POWERCAP))
+        engine = ExperimentEngine(logdir=self.logdir, cachefile=self.cachefile, timeout=self.timeout,
+                                  monitor=monitor, stager=stager, collectors=collectors, grace=self.grace)
+        names = None
+        if group is not None:
+            # groups are named after the model, possibly with the order appended
+            names = {group, split_order(group, "")[0]}
+        for c in self.collections:
+            engine += make_collection(c, self, names)
+        if group is None:
+            engine.setfilter(self.accept)
+        else:
+            engine.setfilter(lambda e: e.group == group and self.accept(e))
+        return engine
+
+    def client(self):
+        """Return a client of the harness daemon of this profile, or None if it is not running.
+        """
+        if not os.path.exists(self.socket):
+            return None
+        from daemon import connect
+        return connect(self.socket)
+
+
+def load_profile(name, filename=PROFILES):
+    with open(filename) as f:
+        profiles = json.load(f)
+    if name not in profiles:
+        return None
+    return Profile(name, profiles[name])
+
+
+###
+# The commands, each called with the profile and the remaining arguments.
+###
+
+def follow(client, since, submission=None):
+    """Print the completed runs reported by the daemon, until the submission is finished.
+    """
+    try:
+        for ev in client.stream("events", since=since, submission=submission):
+            if ev['type'] == 'completed':
+                print(ev['text'])
+            elif ev['type'] == 'failed':
+                print("{}: failed in the daemon: {}.".format(ev['name'], ev['error']))
+            elif ev['type'] == 'stopped':
+                print("Daemon stopped at {}.".format(ev['name']))
+            elif ev['type'] == 'finished' and ev['submission'] == submission:
+                break
+    except KeyboardInterrupt:
+        print("Stopped following, the daemon continues.")
+
+
+def cmd_todo(profile, args):
+    client = profile.client()
+    if client is not None:
+        for x in client.request("todo", iterations=profile.iterations)['todo']:
+            print(x)
+        return
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    for x in engine.todo(iterations=profile.iterations):
+        print(x)
+
+
+def cmd_report(profile, args):
+    group = args[0] if len(args) > 0 else None
+    client = profile.client()
+    if client is not None:
+        for line in client.request("report", group=group, iterations=profile.iterations)['lines']:
+            print(line)
+        return
+    engine = profile.engine(group)
+    engine.initialize(profile.iterations, False)
+    engine.report(group=group, iterations=profile.iterations)
+
+
+def cmd_run(profile, args):
+    group = args[0] if len(args) > 0 else None
+    client = profile.client()
+    if client is not None:
+        res = client.request("submit", group=group, iterations=profile.iterations)
+        print("Submitted {} runs to the daemon ({} queued).".format(res['runs'], res['queued']))
+        follow(client, res['seq'], res['submission'])
+        return
+    engine = profile.engine(group)
+    engine.initialize(profile.iterations, False)
+    engine.run(group=group, iterations=profile.iterations)
+
+
+def cmd_cache(profile, args):
+    from expfw import Experiment
+    engine = profile.engine()
+    engine.initialize(profile.iterations, True)
+    engine.save_cache(True)
+    count_done = sum([len(x) for i, x in enumerate(engine.results) if i < profile.iterations])
+    count_to = sum([1 for i, x in enumerate(engine.results) for a, b in x.items() if b[0] == Experiment.TIMEOUT and b[1] < profile.timeout])
+    print("Remaining: {} experiments not done + {} experiments rerun for higher timeout.".format(profile.iterations*len(engine)-count_done, count_to))
+
+
+def cmd_csv(profile, args):
+    import export
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    export.write_legacy_csv(engine, sys.stdout, profile.iterations)
+
+
+def cmd_export(profile, args):
+    import export
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    export.export(engine, args[0], args[1] if len(args) > 1 else "parquet", profile.iterations)
+
+
+def cmd_summary(profile, args):
+    from summary import FIELDS
+    fields = args[0].split(",") if len(args) > 0 else ["model", "method"]
+    if any(f not in FIELDS for f in fields):
+        eprint("Fields must be in {}.".format(", ".join(FIELDS)))
+        sys.exit(1)
+    client = profile.client()
+    if client is not None:
+        lines = client.request("summary", fields=fields)['lines']
+    else:
+        from summary import Summary
+        engine = profile.engine()
+        engine.initialize(profile.iterations, False)
+        lines = Summary(engine, profile.iterations).report_lines(fields)
+    for line in lines:
+        print(line)
+
+
+def cmd_best(profile, args):
+    client = profile.client()
+    if client is not None:
+        lines = client.request("best")['lines']
+    else:
+        from summary import Summary
+        engine = profile.engine()
+        engine.initialize(profile.iterations, False)
+        lines = Summary(engine, profile.iterations).best_lines()
+    for line in lines:
+        print(line)
+
+
+def cmd_stats(profile, args):
+    from expfw import Experiment
+    from exp import STATS_FIELDS
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    expmap = {e.name: e for e in engine}
+    print("; ".join(["Model", "Method", "Workers", "Time"] + STATS_FIELDS))
+    for i, it in enumerate(engine.results):
+        if i >= profile.iterations:
+            break
+        for ename, (status, value) in it.items():
+            e = expmap.get(ename)
+            if e is not None and status == Experiment.DONE and 'gc_count' in value:
+                fields = [str(value.get(f, "")) for f in STATS_FIELDS]
+                print("; ".join([e.group, e.method, str(e.workers), str(value['time'])] + fields))
+
+
+def cmd_counters(profile, args):
+    from expfw import Experiment
+    from counters import COUNTER_FIELDS
+    group = args[0] if len(args) > 0 else None
+    engine = profile.engine(group)
+    engine.initialize(profile.iterations, False)
+    print("; ".join(["Model", "Method", "Workers", "Time", "States", "IPC", "LLC-misses/state", "Node-misses/state"] + COUNTER_FIELDS))
+    for e in sorted(engine, key=lambda e: (e.group, e.method, e.workers)):
+        for i in range(min(profile.iterations, len(engine.results))):
+            status, value = engine.get_status(e, i)
+            if status != Experiment.DONE or 'perf_cycles' not in value:
+                continue
+            states = value.get('states')
+            per_state = [value[f] / states if states and f in value else "" for f in ('perf_llc_misses', 'perf_node_misses')]
+            fields = [value.get(f, "") for f in COUNTER_FIELDS]
+            print("; ".join(str(x) for x in [e.group, e.method, e.workers, value['time'], states or "", value.get('perf_ipc', "")] + per_state + fields))
+
+
+def cmd_energy(profile, args):
+    from energy import energy_rows
+    group = args[0] if len(args) > 0 else None
+    engine = profile.engine(group)
+    engine.initialize(profile.iterations, False)
+    print("; ".join(["Model", "Method", "Workers", "Time", "Package", "DRAM", "Energy", "Power", "EDP"]))
+    for row in energy_rows(engine, profile.iterations):
+        print("; ".join("" if x is None else str(x) for x in row))
+
+
+def cmd_profile(profile, args):
+    import profiler
+    group = args[0]
+    engine = profile.engine(group)
+    engine.initialize(profile.iterations, False)
+    experiments = [e for e in engine]
+    if len(args) > 3 and args[1] == "diff":
+        profiler.report_diff(engine, experiments, int(args[2]), int(args[3]))
+        return
+    workers = [int(w) for w in args[1:]]
+    if len(workers) > 0:
+        experiments = [e for e in experiments if e.workers in workers]
+    if profile.profiler == "gperf":
+        p = profiler.GperfProfile()
+    else:
+        p = profiler.PerfRecord()
+    profiler.run_profiles(engine, experiments, p)
+
+
+def cmd_phases(profile, args):
+    from expfw import Experiment
+    from exp import PHASE_FIELDS
+    from noise import is_tainted
+    group = args[0] if len(args) > 0 else None
+    engine = profile.engine(group)
+    engine.initialize(profile.iterations, False)
+    # median of every phase and of the end-to-end time per (group, method, workers)
+    values = {}
+    for e in engine:
+        for i in range(min(profile.iterations, len(engine.results))):
+            status, value = engine.get_status(e, i)
+            if status == Experiment.DONE and 'phase_reach' in value and 'wall' in value and not is_tainted(value):
+                for f in PHASE_FIELDS + ['wall']:
+                    values.setdefault((e.group, e.method, e.workers), {}).setdefault(f, []).append(value.get(f, 0.0))
+    medians = {k: {f: sorted(xs)[len(xs)//2] for f, xs in v.items()} for k, v in values.items()}
+    # speedups of the reachability phase alone and end-to-end, relative to the fewest workers
+    # measured for the model and method (the Base column, not necessarily 1 worker)
+    print("; ".join(["Model", "Method", "Workers", "Wall"] + PHASE_FIELDS +
+                    ["Overhead", "Base", "Speedup-reach-vs-base", "Speedup-wall-vs-base"]))
+    for (g, method, workers), m in sorted(medians.items()):
+        base = min(w for gg, mm, w in medians if gg == g and mm == method)
+        b = medians[(g, method, base)]
+        fields = [m['wall']] + [m[f] for f in PHASE_FIELDS] + [m['wall'] - m['phase_total'], base]
+        speedups = [b['phase_reach'] / m['phase_reach'] if m['phase_reach'] > 0 else "",
+                    b['wall'] / m['wall'] if m['wall'] > 0 else ""]
+        print("; ".join([g, method, str(workers)] + [str(x) for x in fields + speedups]))
+
+
+def cmd_scaling(profile, args):
+    from families import scaling
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    workers = [int(w) for w in args] if len(args) > 0 else None
+    print("; ".join(["Family", "Model", "Scale", "Order", "Method", "Workers", "States", "Time", "Memory"]))
+    for row in scaling(engine, profile.iterations, workers):
+        print("; ".join("" if x is None else str(x) for x in row))
+
+
+def cmd_adaptive(profile, args):
+    from adaptive import AdaptiveSweep
+    group = args[0] if len(args) > 0 else None
+    engine = profile.engine(group)
+    engine.initialize(profile.iterations, False)
+    AdaptiveSweep(engine, iterations=profile.iterations, statefile=profile.sweepfile).run(group=group)
+
+
+def cmd_sweep(profile, args):
+    from adaptive import AdaptiveSweep
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    AdaptiveSweep(engine, iterations=profile.iterations, statefile=profile.sweepfile).report()
+
+
+def cmd_plan(profile, args):
+    from planner import Planner
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    planner = Planner(engine, iterations=profile.iterations)
+    if len(args) > 1 and args[1] == "run":
+        planner.run(float(args[0]))
+    else:
+        planner.report(float(args[0]))
+
+
+def cmd_probe(profile, args):
+    from planner import Planner, PROBE_TIMEOUT
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    Planner(engine, iterations=profile.iterations).probe(int(args[0]) if len(args) > 0 else PROBE_TIMEOUT)
+
+
+def cmd_suite(profile, args):
+    import suites
+    if len(args) == 0:
+        suites.report(suites.load_suites(SUITES))
+        return
+    if args[0] not in ("quick", "scaling"):
+        eprint("Unknown suite {}!".format(args[0]))
+        sys.exit(2)
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    suite = suites.curate(engine, profile, args[0], args[1:], SUITES)
+    suites.report({"{}-{}".format(profile.name, args[0]): suite})
+
+
+def bundles(profile, target=None):
+    from bundles import Bundles
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    return Bundles(engine, profile, iterations=profile.iterations, cores=profile.cores,
+                   target=target or profile.bundle, options=profile.slurm)
+
+
+def cmd_bundles(profile, args):
+    backend = args[0] if len(args) > 0 else "dry-run"
+    if backend == "collect":
+        bundles(profile).collect()
+    elif backend in ("dry-run", "slurm", "local"):
+        bundles(profile, int(args[1]) if len(args) > 1 else None).submit(backend)
+    else:
+        eprint("Unknown backend {}!".format(backend))
+        sys.exit(2)
+
+
+def cmd_bundle(profile, args):
+    bundles(profile).run(int(args[0]))
+
+
+def cmd_compile(profile, args):
+    jobs = int(args[0]) if len(args) > 0 else None
+    for c in profile.collections:
+        collection = make_collection(c, profile, None)
+        if hasattr(collection, 'compiler'):
+            sources = collection.sources()
+            count = collection.compiler.compile_all(sources, jobs)
+            print("Compiled {}: {} of {} models available.".format(c, count, len(sources)))
+
+
+def cmd_race(profile, args):
+    from portfolio import Portfolio
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    cores = int(args[1]) if len(args) > 1 else os.cpu_count()
+    Portfolio(engine, profile.directory, profile.workers, profile.iterations).race(args[0], cores)
+
+
+def cmd_portfolio(profile, args):
+    from portfolio import Portfolio
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    cores = int(args[0]) if len(args) > 0 else os.cpu_count()
+    Portfolio(engine, profile.directory, profile.workers, profile.iterations).learn(cores)
+
+
+def cmd_daemon(profile, args):
+    if len(args) > 0:
+        client = profile.client()
+        if client is None:
+            print("No daemon is running on {}.".format(profile.socket))
+        elif args[0] == "stop":
+            client.request("shutdown")
+        elif args[0] == "refresh":
+            client.request("refresh")
+        elif args[0] == "events":
+            follow(client, None)
+        return
+    from daemon import HarnessDaemon
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    HarnessDaemon(engine, profile.iterations, profile.socket).serve()
+
+
+def cmd_clean(profile, args):
+    engine = profile.engine()
+    engine.initialize(profile.iterations, False)
+    engine.clean(iterations=profile.iterations)
+
+
+# (command, minimal number of arguments, function, usage lines)
+COMMANDS = [
+    ("todo", 0, cmd_todo, [("todo", "List all groups to do")]),
+    ("report", 0, cmd_report, [("report", "Report all experiments"),
+                               ("report <GROUP>", "Report all experiments in a group")]),
+    ("run", 0, cmd_run, [("run", "Run all experiments"),
+                         ("run <GROUP>", "Run all experiments in a group")]),
+    ("summary", 0, cmd_summary, [("summary", "Report the number of runs done, timeouts, errors and to do and the median times per model and method"),
+                                 ("summary <FIELDS>", "Idem, grouped by <FIELDS>, e.g. method,workers (of model, order, method, workers)")]),
+    ("best", 0, cmd_best, [("best", "Report the best method per model")]),
+    ("cache", 0, cmd_cache, [("cache", "Update the cache")]),
+    ("csv", 0, cmd_csv, [("csv", "Write the CSV of the results to stdout")]),
+    ("export", 1, cmd_export, [("export <DIR>", "Export all results as Parquet, partitioned by method"),
+                               ("export <DIR|FILE> <parquet|arrow|csv>", "Export all results in the given format")]),
+    ("stats", 0, cmd_stats, [("stats", "Write the CSV of the Sylvan/Lace statistics to stdout")]),
+    ("counters", 0, cmd_counters, [("counters", "Write the CSV of the hardware counters, IPC and misses per state"),
+                                   ("counters <GROUP>", "Idem, for the experiments in a group")]),
+    ("energy", 0, cmd_energy, [("energy", "Write the CSV of the energy to solution (J), power (W) and energy-delay product per worker count"),
+                               ("energy <GROUP>", "Idem, for the experiments in a group")]),
+    ("profile", 1, cmd_profile, [("profile <GROUP>", "Run the experiments of a group with the sampling profiler (folded stacks in <logdir>/profile)"),
+                                 ("profile <GROUP> <WORKERS>...", "Idem, only with the given worker counts"),
+                                 ("profile <GROUP> diff <W1> <W2>", "Compare the profiles with <W1> and <W2> workers")]),
+    ("phases", 0, cmd_phases, [("phases", "Write the CSV of the time per phase and the speedup of the reachability and end-to-end"),
+                               ("phases <GROUP>", "Idem, for the experiments in a group")]),
+    ("scaling", 0, cmd_scaling, [("scaling", "Write the CSV of the time and memory against the number of states (see families.py)"),
+                                 ("scaling <WORKERS>...", "Idem, only with the given worker counts")]),
+    ("adaptive", 0, cmd_adaptive, [("adaptive", "Run all experiments with an adaptive sweep over the workers"),
+                                   ("adaptive <GROUP>", "Run a group with an adaptive sweep over the workers")]),
+    ("sweep", 0, cmd_sweep, [("sweep", "Report measured and inferred times of the adaptive sweep")]),
+    ("plan", 1, cmd_plan, [("plan <CORE-HOURS>", "Report the cost of all pending runs and the rows to complete within the budget"),
+                           ("plan <CORE-HOURS> run", "Run the planned rows, cheapest first, within the budget")]),
+    ("probe", 0, cmd_probe, [("probe", "Run experiments without a cost prediction with a short timeout"),
+                             ("probe <SECONDS>", "Idem, with the given timeout")]),
+    ("suite", 0, cmd_suite, [("suite", "List the benchmark suites in suites.json"),
+                             ("suite quick [SECONDS [ERROR]]", "Save the models that run within 600 seconds and predict the speedups within 10% as <PROFILE>-quick"),
+                             ("suite scaling [MIN MAX [COUNT]]", "Save 12 diverse models that take 10 to 600 seconds at the fewest workers as <PROFILE>-scaling")]),
+    ("bundles", 0, cmd_bundles, [("bundles", "Report the bundles of the pending runs for Slurm and the job array script"),
+                                 ("bundles <slurm|local|dry-run>", "Idem, and submit the job array, run the bundles here, or only report"),
+                                 ("bundles <slurm|local|dry-run> <SECONDS>", "Idem, with bundles of about <SECONDS> seconds"),
+                                 ("bundles collect", "Read back the results of the bundles and update the cache")]),
+    ("bundle", 1, cmd_bundle, [("bundle <INDEX>", "Run bundle <INDEX> of the saved plan (a task of the job array)")]),
+    ("compile", 0, cmd_compile, [("compile", "Compile the DVE and Promela models in parallel"),
+                                 ("compile <JOBS>", "Idem, with <JOBS> parallel compilations")]),
+    ("portfolio", 0, cmd_portfolio, [("portfolio", "Learn the best split of all cores over the strategies per model class"),
+                                     ("portfolio <CORES>", "Idem, for <CORES> cores")]),
+    ("race", 1, cmd_race, [("race <MODEL>", "Race the strategies for a model on all cores, the first answer wins"),
+                           ("race <MODEL> <CORES>", "Idem, on <CORES> cores")]),
+    ("daemon", 0, cmd_daemon, [("daemon", "Start the harness daemon; todo, report and run then use the daemon"),
+                               ("daemon events", "Follow the runs completed by the daemon"),
+                               ("daemon refresh", "Let the daemon read the cache and the log files again"),
+                               ("daemon stop", "Stop the daemon after the current run")]),
+    ("clean", 0, cmd_clean, [("clean", "Delete cache and delete error experiments")]),
+]
+
+
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def usage(prog):
+    eprint("Valid calls:")
+    lines = [(u, d) for _, _, _, us in COMMANDS for u, d in us]
+    width = max(len(u) for u, _ in lines)
+    for u, d in lines:
+        eprint("{} {} {}".format(prog, u.ljust(width), d))
+
+
+def main(profile_name=None, args=None, prog=None):
+    """Run a command of a profile.
+    Called as "experiments.py <PROFILE> <COMMAND> ..." or from a script
+    like exp48.py that fixes the profile.
+    """
+    if args is None:
+        args = sys.argv[1:]
+    if prog is None:
+        prog = os.path.basename(sys.argv[0])
+    if profile_name is None:
+        if len(args) == 0:
+            usage(prog + " <PROFILE>")
+            return
+        profile_name = args[0]
+        args = args[1:]
+        prog = prog + " " + profile_name
+    for name, nargs, fun, _ in COMMANDS:
+        if len(args) > nargs and args[0] == name:
+            profile = load_profile(profile_name)
+            if profile is None:
+                eprint("Unknown profile {}!".format(profile_name))
+                sys.exit(1)
+            fun(profile, args[1:])
+            return
+    usage(prog)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 import json
 import os
+import signal
 import sys
 from subprocess import Popen, TimeoutExpired
+import threading
 import time
 import random
 import itertools
@@ -19,11 +21,133 @@ def call(*popenargs, timeout=None, **kwargs):
             raise
 
 
+class Preempted(Exception):
+    pass
+
+
+class Drain(object):
+    """Graceful stop of the runner on SIGTERM (e.g. Slurm preemption) or SIGINT (CTRL-C).
+    The current run may finish within <grace> seconds, then it is stopped and
+    recorded as preempted. A second SIGINT stops the current run at once.
+    """
+    def __init__(self, grace=60):
+        self.grace = grace
+        self.requested = None
+        self.saved = {}
+
+    def install(self):
+        # signal handlers can only be set in the main thread
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self.saved[sig] = signal.signal(sig, self.request)
+
+    def uninstall(self):
+        for sig, handler in self.saved.items():
+            signal.signal(sig, handler)
+        self.saved = {}
+
+    def request(self, signum, frame):
+        if self.requested is not None and signum == signal.SIGINT:
+            print("Stopping now.")
+            self.requested = float('-inf')
+        elif self.requested is None:
+            print("Received {}, stopping after the current run (at most {} seconds)."
+                  .format(signal.Signals(signum).name, self.grace))
+            self.requested = time.monotonic()
+        sys.stdout.flush()
+
+    def draining(self):
+        return self.requested is not None
+
+    def expired(self):
+        return self.requested is not None and time.monotonic() - self.requested >= self.grace
+
+
+def wait_rusage(p, timeout=None, drain=None):
+    """Wait for the Popen object <p> like p.wait, but using wait4.
+    Returns a pair (returncode, resource usage of the process).
+    Raises Preempted if the grace window of the <drain> expires.
+    """
+    end = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    while True:
+        pid, status, rusage = os.wait4(p.pid, os.WNOHANG)
+        if pid == p.pid:
+            p.returncode = os.waitstatus_to_exitcode(status)
+            return p.returncode, rusage
+        if end is not None and time.monotonic() >= end:
+            raise TimeoutExpired(p.args, timeout)
+        if drain is not None and drain.expired():
+            raise Preempted()
+        time.sleep(delay)
+        delay = min(2 * delay, 0.05)
+
+
+def call_rusage(*popenargs, timeout=None, drain=None, **kwargs):
+    """Like call, but returns a dict with the exit code and resource usage of the call,
+    the time it started ('started', seconds since the epoch) and how long the spawn took ('spawn').
+    With a <drain>, the call runs in its own session, so it does not get the signals
+    of the terminal, and it is stopped when the grace window expires.
+    A call in its own session (also with start_new_session=True) is stopped with all
+    its processes, e.g. the tool that runs under perf stat.
+    """
+    if drain is not None:
+        kwargs['start_new_session'] = True
+    t_start = time.time()
+    with Popen(*popenargs, **kwargs) as p:
+        t_spawned = time.time()
+        try:
+            returncode, rusage = wait_rusage(p, timeout=timeout, drain=drain)
+        except (TimeoutExpired, Preempted, KeyboardInterrupt):
+            if kwargs.get('start_new_session', False):
+                try:
+                    os.killpg(p.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            else:
+                p.terminate()
+            p.wait()
+            raise
+    return {'exitcode': returncode, 'wall': time.time() - t_start,
+            'utime': rusage.ru_utime, 'stime': rusage.ru_stime, 'maxrss': rusage.ru_maxrss,
+            'started': t_start, 'spawn': t_spawned - t_start}
+
+
+###
+# The harness appends lines "[harness] key=value ..." to the log file
+# with information about the run, e.g. the resource usage.
+# These are added to the parsed results of every experiment.
+###
+
+def harness_line(values):
+    return "[harness] {}\n".format(" ".join("{}={}".format(k, v) for k, v in values.items()))
+
+
+def parse_harness(contents):
+    res = {}
+    for line in contents.splitlines():
+        if not line.startswith("[harness] "):
+            continue
+        for item in line[10:].split():
+            k, _, v = item.partition("=")
+            for conv in (int, float):
+                try:
+                    v = conv(v)
+                    break
+                except ValueError:
+                    pass
+            res[k] = v
+    return res
+
+
 class Experiment(object):
     NOTDONE = 0
     DONE = 1
     TIMEOUT = 2
     ERROR = 3
+    # returned by run_experiment only, never stored
+    PREEMPTED = 4
 
     def __init__(self, name, call, group=None):
         self.name = name
@@ -44,6 +168,12 @@ class Experiment(object):
         """
         raise NotImplementedError
 
+    def get_inputs(self):
+        """Return the input files of the experiment (arguments of the call).
+        By default the last argument.
+        """
+        return self.call[-1:]
+
     def get_status(self, filename):
         """Obtain the status of the experiment.
         Return a pair:
@@ -55,8 +185,10 @@ class Experiment(object):
         if os.path.isfile(filename):
             try:
                 with open(filename, 'r') as handle:
-                    res = self.parse_log(handle.read())
+                    contents = handle.read()
+                    res = self.parse_log(contents)
                     if res is not None:
+                        res.update(parse_harness(contents))
                         if 'error' in res:
                             return Experiment.ERROR, res
                         else:
@@ -78,7 +210,17 @@ class Experiment(object):
             else:
                 return Experiment.NOTDONE, None
 
-    def run_experiment(self, timeout, filename):
+    def run_experiment(self, timeout, filename, monitor=None, stager=None, collectors=(), drain=None):
+        """Run the experiment, writing the output to <filename>.
+        If a <monitor> is given (see noise.py), its start and stop are called
+        around the run and the recorded values are added to the log file.
+        If a <stager> is given (see staging.py), the input files are staged
+        before the run and the call uses the staged files.
+        The <collectors> (see counters.py) wrap the call, e.g. to run it under
+        perf, and the values they collect are added to the log file.
+        With a <drain>, a run that is stopped or fails while the runner is stopping
+        is moved to <filename>.preempted and Experiment.PREEMPTED is returned.
+        """
         # remove output and timeout files
         if os.path.isfile(filename):
             os.unlink(filename)
@@ -90,14 +232,40 @@ class Experiment(object):
         print("Performing {}... ".format(self.name), end='')
         sys.stdout.flush()
 
+        # stage the inputs, this is not part of the timed run
+        call = self.call
+        if stager is not None:
+            call = stager.stage_call(call, self.get_inputs())
+        tool = call
+        for collector in collectors:
+            call = collector.wrap(call, filename)
+
         try:
             with open(filename, 'w+') as out:
-                call(self.call, stdout=out, stderr=out, timeout=timeout)
+                if monitor is not None:
+                    monitor.start(self)
+                try:
+                    # a wrapped call runs in its own session, so the tool is stopped with the wrapper
+                    usage = call_rusage(call, stdout=out, stderr=out, timeout=timeout, drain=drain,
+                                        start_new_session=call is not tool)
+                finally:
+                    if monitor is not None:
+                        noise = monitor.stop()
+                if monitor is not None:
+                    usage.update(noise)
+                for collector in collectors:
+                    usage.update(collector.collect(filename))
+                out.seek(0, os.SEEK_END)
+                out.write(harness_line(usage))
         except KeyboardInterrupt:
             # if CTRL-C was hit, move the file
             os.rename(filename, "{}.interrupted".format(filename))
             print("Experiment interrupted.")
             sys.exit()
+        except Preempted:
+            os.rename(filename, "{}.preempted".format(filename))
+            print("preempted.")
+            return Experiment.PREEMPTED, None
         except OSError:
             print("OS Error, typically caused by a missing executable.")
             sys.exit()
@@ -110,7 +278,14 @@ class Experiment(object):
         else:
             # experiment finished, either report done or not done...
             status, value = self.get_status(filename)
-            if status == Experiment.DONE:
+            if drain is not None and drain.draining() and status != Experiment.DONE:
+                # probably killed by the same signal, e.g. SIGTERM to the whole Slurm job
+                os.rename(filename, "{}.preempted".format(filename))
+                print("preempted.")
+                return Experiment.PREEMPTED, None
+            if status == Experiment.DONE and value.get('tainted', 0) == 1:
+                print("done; {} (tainted: {}).".format(self.get_text(value), value.get('taint', '')))
+            elif status == Experiment.DONE:
                 print("done; {}.".format(self.get_text(value)))
             elif status == Experiment.ERROR:
                 print("\033[1;31merror: {}\033[m.".format(value['error']))
@@ -178,12 +353,27 @@ class ExperimentEngine(object):
         - logdir (default "logs")
         - cachefile (default "cache.json")
         - timeout (default 1200 seconds)
+        - monitor (default None), e.g. a noise.NoiseMonitor to detect interference
+        - retries (default 3), how often a tainted run is repeated
+        - stager (default None), e.g. a staging.LocalStore to copy inputs to local storage
+        - collectors (default none), e.g. a counters.PerfStat to record hardware counters
+        - grace (default 60 seconds), how long the current run may take after SIGTERM/SIGINT
+        Listeners (e.g. a summary.Summary) in <listeners> are updated with every recorded result.
         """
         self.experiments = ExperimentCollection()
         self.logdir = kwargs.get('logdir', 'logs')
         self.timeout = int(kwargs.get('timeout', 1200))
         self.cachefile = kwargs.get('cachefile', 'cache.json')
+        self.monitor = kwargs.get('monitor', None)
+        self.retries = int(kwargs.get('retries', 3))
+        self.stager = kwargs.get('stager', None)
+        self.collectors = kwargs.get('collectors', [])
+        self.grace = int(kwargs.get('grace', 60))
+        self.drain = None
         self.results = []
+        self.listeners = []
+        # (name, iteration) of the runs in progress (e.g. in the thread of daemon.py), whose log file is incomplete
+        self.running = set()
 
     def __iadd__(self, other):
         self.experiments += other
@@ -241,32 +431,48 @@ class ExperimentEngine(object):
             # return cache result IF the timeout is not lower than configured
             if status != Experiment.TIMEOUT or value >= self.timeout:
                 return status, value
+        # a run in progress is not done, and its log file is not read yet
+        if (experiment.name, iteration) in self.running:
+            return Experiment.NOTDONE, None
         # check the log file
         logfile = "{}/{}-{}".format(self.logdir, experiment.name, iteration)
         status, value = experiment.get_status(logfile)
         # update cache
         if status != Experiment.NOTDONE:
-            self.results[iteration][experiment.name] = status, value
+            self.record(experiment, iteration, status, value)
         # return result
         return status, value
 
-    def print_status(self, experiment, iteration):
-        """Get experiment status and print to stdout.
-        Returns True if the status was DONE / TIMEOUT / ERROR, otherwise False.
+    def record(self, experiment, iteration, status, value):
+        """Store a result in the cache and update the listeners.
+        """
+        self.results[iteration][experiment.name] = status, value
+        for listener in self.listeners:
+            listener.update(experiment, iteration, status, value)
+
+    def status_text(self, experiment, iteration):
+        """Get experiment status as a line of text.
+        Returns a pair (text, True if the status was DONE / TIMEOUT / ERROR).
         """
         status, value = self.get_status(experiment, iteration)
         if status == Experiment.DONE:
-            print("{}: {}.".format(experiment.name, experiment.get_text(value)))
-            return True
+            return "{}: {}.".format(experiment.name, experiment.get_text(value)), True
         elif status == Experiment.TIMEOUT:
-            print("{}: timeout ({}).".format(experiment.name, value))
-            return True
+            return "{}: timeout ({}).".format(experiment.name, value), True
         elif status == Experiment.ERROR:
-            print("{}: \033[1;31merror: {}\033[m.".format(experiment.name, value['error']))
-            return True
+            return "{}: \033[1;31merror: {}\033[m.".format(experiment.name, value['error']), True
+        elif (experiment.name, iteration) in self.running:
+            return "{}: running.".format(experiment.name), False
         else:
-            print("{}: not done.".format(experiment.name))
-            return False
+            return "{}: not done.".format(experiment.name), False
+
+    def print_status(self, experiment, iteration):
+        """Get experiment status and print to stdout.
+        Returns True if the status was DONE / TIMEOUT / ERROR, otherwise False.
+        """
+        text, res = self.status_text(experiment, iteration)
+        print(text)
+        return res
 
     def load_cache(self, verbose=True):
         """Load results from the cache file.
@@ -348,6 +554,12 @@ class ExperimentEngine(object):
     def report(self, group=None, by_group=True, iterations=None):
         """Report the current status of the experiments.
         """
+        for line in self.report_lines(group, by_group, iterations):
+            print(line)
+
+    def report_lines(self, group=None, by_group=True, iterations=None):
+        """Generate the lines of the report.
+        """
         # if group is set, limit to experiments in the group
         if group is not None:
             experiments = [e for e in self if e.group == group]
@@ -363,7 +575,7 @@ class ExperimentEngine(object):
             if len(self.results) <= i or len(self.results[i]) == 0:
                 return
             for e in experiments:
-                self.print_status(e, i)
+                yield self.status_text(e, i)[0]
 
     def clean(self, iterations=None):
         """Erase all logfiles of errors and clear the cache.
@@ -388,29 +600,152 @@ class ExperimentEngine(object):
             os.unlink(self.cachefile)
             self.results = []
 
+    def get_queuefile(self, group=None):
+        return "{}/queue-{}.json".format(self.logdir, "all" if group is None else group)
+
+    def save_queue(self, queuefile, state):
+        tmp = "{}.tmp".format(queuefile)
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, queuefile)
+
+    def load_queue(self, queuefile):
+        if not os.path.isfile(queuefile):
+            return None
+        try:
+            with open(queuefile) as f:
+                return json.load(f)
+        except ValueError:
+            print("Ignoring invalid queue file {}.".format(queuefile))
+            return None
+
+    def recover(self, name, iteration):
+        """The runner stopped (e.g. the node crashed) while <name> was running:
+        move a log file without the harness line to <logfile>.preempted.
+        """
+        for e in self:
+            if e.name != name:
+                continue
+            logfile = self.get_logfile(e, iteration)
+            if os.path.isfile(logfile):
+                with open(logfile) as f:
+                    if 'exitcode' in parse_harness(f.read()):
+                        return
+                os.rename(logfile, "{}.preempted".format(logfile))
+                self.results[iteration].pop(name, None)
+                print("Recovered preempted run of {}.".format(name))
+
     def run(self, group=None, iterations=None):
         """Run experiments (possibly forever).
+        The queue is saved in <logdir>/queue-<group>.json before every run. On SIGTERM or
+        SIGINT, the current run may finish within the grace window, otherwise it is
+        recorded as preempted (see Drain), and the next call continues with the saved queue.
         """
-        for iteration in itertools.count():
-            if iterations is not None and iteration >= iterations:
-                return
-            self.extend_for_iteration(iteration)
-            todo = self.get_groups() if group is None else [group]
-            for group in random.sample(todo, k=len(todo)):
-                # report that we are going to run a group
-                print("Running experiments in group {}.".format(group))
-                # run experiments in group <group> for iteration <iteration>
-                exps = [e for e in self if e.group == group]
-                for experiment in random.sample(exps, k=len(exps)):
-                    # do not use the cache in this particular case
-                    logfile = "{}/{}-{}".format(self.logdir, experiment.name, iteration)
-                    status, value = experiment.get_status(logfile)
-                    if (status == Experiment.DONE or status == Experiment.ERROR or
-                            (status == Experiment.TIMEOUT and value >= self.timeout)):
-                        continue
-                    # ok, really run the experiment and then sleep for 1 second
-                    status, value = experiment.run_experiment(self.timeout, logfile)
-                    self.results[iteration][experiment.name] = status, value
-                    time.sleep(1)
-            # report that we finished this iteration
-            print("Iteration {} done.".format(iteration))
+        queuefile = self.get_queuefile(group)
+        state = self.load_queue(queuefile)
+        start = 0
+        if state is not None:
+            start = state['iteration']
+            self.extend_for_iteration(start)
+            print("Resuming iteration {} with {} groups.".format(start, len(state['groups'])))
+            if state.get('inflight') is not None:
+                self.recover(state['inflight'], start)
+        self.drain = Drain(self.grace)
+        self.drain.install()
+        try:
+            for iteration in itertools.count(start):
+                if iterations is not None and iteration >= iterations:
+                    break
+                self.extend_for_iteration(iteration)
+                if state is not None:
+                    groups, queue = state['groups'], state['queue']
+                    state = None
+                else:
+                    todo = sorted(self.get_groups()) if group is None else [group]
+                    groups, queue = random.sample(todo, k=len(todo)), None
+                while len(groups) > 0:
+                    # report that we are going to run a group
+                    print("Running experiments in group {}.".format(groups[0]))
+                    # run experiments in group <group> for iteration <iteration>
+                    exps = {e.name: e for e in self if e.group == groups[0]}
+                    if queue is None:
+                        queue = random.sample(sorted(exps), k=len(exps))
+                    while len(queue) > 0:
+                        experiment = exps.get(queue[0])
+                        if experiment is None:
+                            queue.pop(0)
+                            continue
+                        if self.drain.draining():
+                            self.save_queue(queuefile, {'iteration': iteration, 'groups': groups, 'queue': queue})
+                            print("Stopped, the queue is saved in {}.".format(queuefile))
+                            return
+                        self.save_queue(queuefile, {'iteration': iteration, 'groups': groups, 'queue': queue,
+                                                    'inflight': experiment.name})
+                        # run the experiment and then sleep for 1 second
+                        ran = self.run_one(experiment, iteration)
+                        status = self.get_status(experiment, iteration)[0]
+                        if ran and status == Experiment.NOTDONE and self.drain.draining():
+                            # preempted, run it first when resuming
+                            continue
+                        queue.pop(0)
+                        if ran:
+                            if not self.drain.draining():
+                                time.sleep(1)
+                            # a tainted run is moved aside, run it again at the end
+                            if status == Experiment.NOTDONE and self.count_tainted(experiment, iteration) > 0:
+                                queue.append(experiment.name)
+                    groups.pop(0)
+                    queue = None
+                # report that we finished this iteration
+                print("Iteration {} done.".format(iteration))
+            if os.path.isfile(queuefile):
+                os.unlink(queuefile)
+        finally:
+            self.drain.uninstall()
+            self.drain = None
+
+    def run_one(self, experiment, iteration):
+        """Run a single experiment for the given iteration, unless it is done.
+        Returns True if the experiment was run, False otherwise.
+        """
+        self.extend_for_iteration(iteration)
+        # do not use the cache in this particular case
+        logfile = self.get_logfile(experiment, iteration)
+        status, value = experiment.get_status(logfile)
+        if (status == Experiment.DONE or status == Experiment.ERROR or
+                (status == Experiment.TIMEOUT and value >= self.timeout)):
+            return False
+        # ok, really run the experiment
+        status, value = experiment.run_experiment(self.timeout, logfile, monitor=self.monitor, stager=self.stager,
+                                                  collectors=self.collectors, drain=self.drain)
+        if status == Experiment.PREEMPTED:
+            return True
+        if status == Experiment.DONE and value.get('tainted', 0) == 1:
+            if self.requeue(experiment, iteration):
+                return True
+        if status != Experiment.NOTDONE:
+            self.record(experiment, iteration, status, value)
+        return True
+
+    def count_tainted(self, experiment, iteration):
+        """Return the number of tainted runs that were moved aside.
+        """
+        logfile = self.get_logfile(experiment, iteration)
+        n = 0
+        while os.path.isfile("{}.tainted-{}".format(logfile, n)):
+            n += 1
+        return n
+
+    def requeue(self, experiment, iteration):
+        """Move the log file of a tainted run to <logfile>.tainted-<n>,
+        so the experiment is run again, unless it was already repeated <retries> times.
+        Then the tainted result is kept (and excluded from speedups).
+        Returns True if the experiment must be run again.
+        """
+        n = self.count_tainted(experiment, iteration)
+        if n >= self.retries:
+            return False
+        logfile = self.get_logfile(experiment, iteration)
+        os.rename(logfile, "{}.tainted-{}".format(logfile, n))
+        print("Requeued tainted run of {}.".format(experiment.name))
+        return True
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+import csv
+import json
+import math
+import os
+
+from expfw import Experiment
+from counters import COUNTER_FIELDS
+from energy import ENERGY_FIELDS
+from exp import STATS_FIELDS, PHASE_FIELDS, split_order
+from noise import is_tainted
+
+
+###
+# Exporting results.
+# Every result of the engine becomes one row with a fixed, typed schema.
+# Fields that are not in the schema (e.g. per-operation Sylvan counters)
+# are kept as JSON in the 'extra' column, so the export is lossless.
+###
+
+STATUS = {Experiment.DONE: "done", Experiment.TIMEOUT: "timeout",
+          Experiment.ERROR: "error", Experiment.NOTDONE: "notdone"}
+
+# (name, type) where type is one of "string", "int", "float", "bigint"
+# The number of states can have hundreds of digits, more than any integer or decimal type
+# of Arrow, so "bigint" is stored as its decimal string; states_log10 is for plotting and sorting.
+SCHEMA = [
+    ("group", "string"),
+    ("model", "string"),
+    ("order", "string"),
+    ("method", "string"),
+    ("workers", "int"),
+    ("iteration", "int"),
+    ("status", "string"),
+    ("time", "float"),
+    ("timeout", "int"),
+    ("error", "string"),
+    ("states", "bigint"),
+    ("states_log10", "float"),
+    ("nodes", "int"),
+    ("nextnodes", "int"),
+    # resource usage recorded by the harness
+    ("exitcode", "int"),
+    ("wall", "float"),
+    ("utime", "float"),
+    ("stime", "float"),
+    ("maxrss", "int"),
+    ("started", "float"),
+    ("spawn", "float"),
+    # interference detected by the noise monitor
+    ("tainted", "int"),
+    ("taint", "string"),
+] + [(f, "float") for f in PHASE_FIELDS] + [
+    (f, "float" if f == "perf_ipc" else "int") for f in COUNTER_FIELDS] + [
+    (f, "float") for f in ENERGY_FIELDS] + [
+    (f, "float" if f in ("cache_hit_rate", "table_fill", "gc_time") else "int") for f in STATS_FIELDS] + [
+    ("extra", "string"),
+]
+
+FIELDS = [name for name, _ in SCHEMA]
+
+# Rows are written in chunks of this size
+CHUNK = 65536
+
+
+def rows(engine, iterations=None):
+    """Generate a dict per result in the engine (following SCHEMA).
+    """
+    expmap = {e.name: e for e in engine}
+    for i, it in enumerate(engine.results):
+        if iterations is not None and i >= iterations:
+            break
+        for ename, (status, value) in it.items():
+            e = expmap.get(ename)
+            if e is None:
+                continue
+            model, order, method = split_order(e.group, e.method)
+            row = {'group': e.group, 'model': model, 'order': order, 'method': method,
+                   'workers': e.workers, 'iteration': i, 'status': STATUS[status]}
+            if status == Experiment.TIMEOUT:
+                row['timeout'] = value
+            elif value is not None:
+                extra = {}
+                for k, v in value.items():
+                    if k in row or k == 'extra':
+                        extra[k] = v
+                    elif k in FIELDS:
+                        row[k] = v
+                    else:
+                        extra[k] = v
+                if len(extra) > 0:
+                    row['extra'] = json.dumps(extra, sort_keys=True)
+                if row.get('states'):
+                    row['states_log10'] = math.log10(row['states'])
+            yield row
+
+
+def chunks(iterable, size=CHUNK):
+    chunk = []
+    for x in iterable:
+        chunk.append(x)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def write_legacy_csv(engine, out, iterations=None, tainted=False):
+    """Write "group; method; workers; time; states" lines for the R scripts.
+    Timeouts have states -1, results without a number of states have 0.
+    Tainted results (see noise.py) are skipped unless <tainted> is set.
+    """
+    expmap = {e.name: e for e in engine}
+    lines = []
+    for i, it in enumerate(engine.results):
+        if iterations is not None and i >= iterations:
+            break
+        for ename, (status, value) in it.items():
+            e = expmap.get(ename)
+            if e is None:
+                continue
+            if status == Experiment.DONE and (tainted or not is_tainted(value)):
+                lines.append("{}; {}; {}; {}; {}\n".format(e.group, e.method, e.workers, value['time'], value.get('states', 0)))
+            elif status == Experiment.TIMEOUT:
+                lines.append("{}; {}; {}; {}; -1\n".format(e.group, e.method, e.workers, value))
+            if len(lines) >= CHUNK:
+                out.writelines(lines)
+                lines = []
+    out.writelines(lines)
+
+
+def write_csv(engine, out, iterations=None):
+    """Write all rows with a header, following SCHEMA.
+    """
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    for chunk in chunks(rows(engine, iterations)):
+        writer.writerows(chunk)
+
+
+def arrow_schema():
+    import pyarrow as pa
+    types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64(),
+             "bigint": pa.string()}
+    return pa.schema([(name, types[t]) for name, t in SCHEMA])
+
+
+def record_batches(engine, iterations=None):
+    import pyarrow as pa
+    schema = arrow_schema()
+    for chunk in chunks(rows(engine, iterations)):
+        columns = []
+        for name, t in SCHEMA:
+            col = [row.get(name) for row in chunk]
+            if t == "bigint":
+                col = [str(x) if x is not None else None for x in col]
+            columns.append(col)
+        yield pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema)
+
+
+def write_dataset(engine, directory, fmt="parquet", iterations=None):
+    """Write the results as a Parquet or Arrow (IPC) dataset in <directory>,
+    partitioned by method (directories method=<method>).
+    Requires pyarrow.
+    """
+    import pyarrow.dataset as ds
+    ds.write_dataset(record_batches(engine, iterations), directory, schema=arrow_schema(),
+                     format="ipc" if fmt == "arrow" else "parquet",
+                     partitioning=["method"], partitioning_flavor="hive",
+                     existing_data_behavior="overwrite_or_ignore")
+
+
+def export(engine, target, fmt="parquet", iterations=None):
+    """Export to <target> in the format "parquet", "arrow" or "csv".
+    """
+    if fmt == "csv":
+        with open(target, 'w', newline='') as out:
+            write_csv(engine, out, iterations)
+    elif fmt in ("parquet", "arrow"):
+        if not os.path.exists(target):
+            os.makedirs(target)
+        write_dataset(engine, target, fmt, iterations)
+    else:
+        raise ValueError("unknown export format {}".format(fmt))
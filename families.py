@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+from xml.sax.saxutils import quoteattr
+
+from expfw import Experiment
+from exp import split_order
+from noise import is_tainted
+
+
+###
+# Parameterized model families, for scaling studies in the size of the model.
+# MCC 2016 only has a few instances of every family (e.g. Kanban-PT-0005 to
+# Kanban-PT-0050), so we write P/T nets in PNML for the families Kanban,
+# Philosophers, RwMutex and SwimmingPool at any scale parameter, named like the
+# MCC instances after generate.py's patterns (e.g. Kanban-PT-0100). The nets
+# follow the descriptions of the MCC models, but they are not the same files.
+# The "families" profile runs them at a fixed worker count, and the "scaling"
+# command reports the time and memory against the number of states.
+###
+
+PNML_NS = "http://www.pnml.org/version-2009/grammar/pnml"
+PTNET = "http://www.pnml.org/version-2009/grammar/ptnet"
+
+
+class Net(object):
+    def __init__(self, name):
+        self.name = name
+        self.places = []  # (id, initial marking)
+        self.transitions = []  # (id, {place: weight} consumed, {place: weight} produced)
+
+    def place(self, pid, marking=0):
+        self.places.append((pid, marking))
+        return pid
+
+    def transition(self, tid, pre, post):
+        """Add transition <tid>, consuming the places <pre> and producing <post> (lists of places).
+        """
+        count = lambda ps: {p: ps.count(p) for p in ps}
+        self.transitions.append((tid, count(pre), count(post)))
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+            f.write('<pnml xmlns="{}">\n'.format(PNML_NS))
+            f.write('<net id={} type="{}">\n'.format(quoteattr(self.name), PTNET))
+            f.write('<name><text>{}</text></name>\n<page id="page0">\n'.format(self.name))
+            for pid, marking in self.places:
+                f.write('<place id={0}><name><text>{1}</text></name>'.format(quoteattr(pid), pid))
+                if marking > 0:
+                    f.write('<initialMarking><text>{}</text></initialMarking>'.format(marking))
+                f.write('</place>\n')
+            for tid, pre, post in self.transitions:
+                f.write('<transition id={0}><name><text>{1}</text></name></transition>\n'.format(quoteattr(tid), tid))
+            n = 0
+            for tid, pre, post in self.transitions:
+                for source, target, weight in ([(p, tid, w) for p, w in pre.items()] +
+                                               [(tid, p, w) for p, w in post.items()]):
+                    f.write('<arc id="a{}" source={} target={}>'.format(n, quoteattr(source), quoteattr(target)))
+                    if weight > 1:
+                        f.write('<inscription><text>{}</text></inscription>'.format(weight))
+                    f.write('</arc>\n')
+                    n += 1
+            f.write('</page>\n</net>\n</pnml>\n')
+
+
+###
+# The families
+###
+
+def kanban(n):
+    """Kanban system of four cells with <n> kanbans per cell (Ciardo and Tilgner).
+    """
+    net = Net("Kanban-PT-{:04d}".format(n))
+    for i in range(1, 5):
+        for p, m in (("P", n), ("Pm", 0), ("Pback", 0), ("Pout", 0)):
+            net.place("{}{}".format(p, i), m)
+    net.transition("tin1", ["P1"], ["Pm1"])
+    for i in range(1, 5):
+        net.transition("tredo{}".format(i), ["Pm{}".format(i)], ["Pback{}".format(i)])
+        net.transition("tok{}".format(i), ["Pm{}".format(i)], ["Pout{}".format(i)])
+        net.transition("tback{}".format(i), ["Pback{}".format(i)], ["Pm{}".format(i)])
+    net.transition("tsynch1_23", ["Pout1", "P2", "P3"], ["P1", "Pm2", "Pm3"])
+    net.transition("tsynch4_23", ["Pout2", "Pout3", "P4"], ["P2", "P3", "Pm4"])
+    net.transition("tout4", ["Pout4"], ["P4"])
+    return net
+
+
+def philosophers(n):
+    """<n> dining philosophers; every philosopher takes the forks in any order.
+    """
+    net = Net("Philosophers-PT-{:06d}".format(n))
+    for i in range(n):
+        net.place("Think_{}".format(i), 1)
+        net.place("Fork_{}".format(i), 1)
+        net.place("Catch1_{}".format(i))
+        net.place("Catch2_{}".format(i))
+        net.place("Eat_{}".format(i))
+    for i in range(n):
+        left, right = "Fork_{}".format(i), "Fork_{}".format((i + 1) % n)
+        think, eat = "Think_{}".format(i), "Eat_{}".format(i)
+        net.transition("FF1a_{}".format(i), [think, left], ["Catch1_{}".format(i)])
+        net.transition("FF1b_{}".format(i), [think, right], ["Catch2_{}".format(i)])
+        net.transition("FF2a_{}".format(i), ["Catch1_{}".format(i), right], [eat])
+        net.transition("FF2b_{}".format(i), ["Catch2_{}".format(i), left], [eat])
+        net.transition("End_{}".format(i), [eat], [think, left, right])
+    return net
+
+
+def rwmutex(readers, writers):
+    """Readers/writers mutex: a reader takes its own lock, a writer takes the locks of all readers.
+    """
+    net = Net("RwMutex-PT-r{:04d}w{:04d}".format(readers, writers))
+    for i in range(readers):
+        net.place("IdleR_{}".format(i), 1)
+        net.place("CSR_{}".format(i))
+        net.place("Lock_{}".format(i), 1)
+    for j in range(writers):
+        net.place("IdleW_{}".format(j), 1)
+        net.place("CSW_{}".format(j))
+    locks = ["Lock_{}".format(i) for i in range(readers)]
+    for i in range(readers):
+        net.transition("BeginR_{}".format(i), ["IdleR_{}".format(i), locks[i]], ["CSR_{}".format(i)])
+        net.transition("EndR_{}".format(i), ["CSR_{}".format(i)], ["IdleR_{}".format(i), locks[i]])
+    for j in range(writers):
+        net.transition("BeginW_{}".format(j), ["IdleW_{}".format(j)] + locks, ["CSW_{}".format(j)])
+        net.transition("EndW_{}".format(j), ["CSW_{}".format(j)], ["IdleW_{}".format(j)] + locks)
+    return net
+
+
+def swimmingpool(n):
+    """Swimming pool with 20<n> persons, 10<n> cabins and 15<n> bags.
+    """
+    net = Net("SwimmingPool-PT-{:02d}".format(n))
+    for p, m in (("Out", 20 * n), ("Entered", 0), ("WaitBag", 0), ("Undress", 0), ("InBath", 0),
+                 ("Dress", 0), ("Dressed", 0), ("Cabins", 10 * n), ("Bags", 15 * n)):
+        net.place(p, m)
+    net.transition("GetK", ["Out", "Cabins"], ["Entered"])
+    net.transition("GetB", ["Entered", "Bags"], ["WaitBag"])
+    net.transition("RelK", ["WaitBag"], ["Undress", "Cabins"])
+    net.transition("GetK2", ["Undress", "Cabins"], ["InBath"])
+    net.transition("RKey", ["InBath"], ["Dress", "Cabins"])
+    net.transition("GetK3", ["Dress", "Cabins"], ["Dressed"])
+    net.transition("RBag", ["Dressed"], ["Out", "Cabins", "Bags"])
+    return net
+
+
+def parse_rw(param):
+    m = re.match(r'^r(\d+)w(\d+)$', param)
+    if m is None:
+        raise ValueError("expected r<READERS>w<WRITERS>, not {}".format(param))
+    return int(m.group(1)), int(m.group(2))
+
+
+# family -> (function, parser of a parameter, default parameters)
+FAMILIES = {
+    "Kanban": (kanban, lambda p: (int(p),), ["5", "10", "20", "50", "100", "200", "500", "1000"]),
+    "Philosophers": (philosophers, lambda p: (int(p),), ["10", "20", "50", "100", "200", "500", "1000", "2000"]),
+    "RwMutex": (rwmutex, parse_rw, ["r10w10", "r10w50", "r10w100", "r10w500", "r10w1000", "r10w2000", "r20w10", "r50w10"]),
+    "SwimmingPool": (swimmingpool, lambda p: (int(p),), ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"]),
+}
+
+
+def generate(directory, family, params=None):
+    """Write the instances of <family> with <params> (default: the default scales) to <directory>.
+    Returns the names of the instances; existing files are not written again.
+    """
+    fun, parse, defaults = FAMILIES[family]
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    names = []
+    for param in params or defaults:
+        net = fun(*parse(param))
+        filename = os.path.join(directory, net.name + ".pnml")
+        if not os.path.isfile(filename):
+            print("Writing {}...".format(filename))
+            net.write(filename)
+        names.append(net.name)
+    return names
+
+
+###
+# The data-size sweep
+###
+
+def scale(model):
+    """The family and the scale parameter of a model, e.g. ("Kanban", "0050") for "Kanban-PT-0050".
+    """
+    family, _, param = model.partition("-PT-")
+    return family, param
+
+
+def scaling(engine, iterations=1, workers=None):
+    """Rows (family, model, scale, order, method, workers, states, median time, median maxrss in kB)
+    of the done experiments with <workers> workers (default all), sorted by the number of states.
+    """
+    values = {}
+    for e in engine:
+        if workers is not None and e.workers not in workers:
+            continue
+        for i in range(min(iterations, len(engine.results))):
+            status, value = engine.get_status(e, i)
+            if status == Experiment.DONE and not is_tainted(value) and value.get('states') is not None:
+                v = values.setdefault((e.group, e.method, e.workers), {'states': value['states'], 'time': [], 'maxrss': []})
+                v['time'].append(value['time'])
+                if 'maxrss' in value:
+                    v['maxrss'].append(value['maxrss'])
+    rows = []
+    for (group, method, w), v in values.items():
+        model, order, method = split_order(group, method)
+        family, param = scale(model)
+        med = lambda xs: sorted(xs)[len(xs)//2] if len(xs) > 0 else None
+        rows.append((family, model, param, order, method, w, v['states'], med(v['time']), med(v['maxrss'])))
+    rows.sort(key=lambda r: (r[0], r[3], r[4], r[5], r[6], r[1]))
+    return rows
+
+
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def usage():
+    eprint("Valid calls:")
+    eprint("families.py <DIR>                     Write the default instances of all families to <DIR>")
+    eprint("families.py <DIR> <FAMILY>            Write the default instances of <FAMILY>")
+    eprint("families.py <DIR> <FAMILY> <PARAM>... Write the instances of <FAMILY> with the given parameters")
+    eprint("Families: {} (RwMutex parameters are r<READERS>w<WRITERS>)".format(", ".join(sorted(FAMILIES))))
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) == 0 or (len(args) > 1 and args[1] not in FAMILIES):
+        usage()
+        sys.exit(2)
+    if len(args) == 1:
+        for family in sorted(FAMILIES):
+            generate(args[0], family)
+    else:
+        generate(args[0], args[1], args[2:])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,29 @@
 #!/usr/bin/env python3
 from contextlib import contextmanager
+import json
 import os
-import random
 import re
-from subprocess import Popen, TimeoutExpired
+from subprocess import TimeoutExpired
 import sys
 import tarfile
 
+from expfw import call_rusage
+from lddfile import read_ldd
+import orders
+
 
 DIVINE = os.path.abspath("tools/divine")
 PNML2LTSSYM = os.path.abspath("tools/pnml2lts-sym")
 DVE2LTSSYM = os.path.abspath("tools/dve2lts-sym")
 LDD2BDD = os.path.abspath("tools/ldd2bdd")
 LDD2MEDDLY = os.path.abspath("tools/ldd2meddly")
-TIMEOUT = 3600
+# Timeout ladder: every file is first tried with the smallest timeout that is
+# not below its predicted cost, and with the next timeout after a timeout.
+TIMEOUTS = [60, 600, 3600]
+TIMEOUT = TIMEOUTS[-1]
+# Telemetry of every conversion, one JSON object per line (appended, so
+# parallel runs of generate.py can share it)
+TELEMETRY = os.path.abspath("generate-telemetry.jsonl")
 
 
 patterns = [
@@ -161,31 +171,20 @@ def cd(newdir):
         os.chdir(prevdir)
 
 
-def call(*popenargs, timeout, **kwargs):
-    """
-    Run a call with a timeout.
-    """
-    with Popen(*popenargs, **kwargs) as p:
-        try:
-            return p.wait(timeout=timeout)
-        except:
-            p.terminate()
-            p.wait()
-            raise
-
-
 def call2(*popenargs, timeout, outp):
     """
     Run a call with a timeout.
     If the call is interrupted with Ctrl-C, copy outp to outp.interrupted
     If the call times out, copy outp to outp.timeout-<TIMEOUT>
+    Returns the telemetry of the call, or None if it timed out before.
     """
     timeout_filename = "{}.timeout-{}".format(outp, timeout)
     if os.path.isfile(timeout_filename):
         print("\033[1;31mTimeout!\033[m")
-        return
+        return None
     try:
-        call(*popenargs, timeout=timeout)
+        res = call_rusage(*popenargs, timeout=timeout)
+        res['status'] = 'done' if res['exitcode'] == 0 and os.path.isfile(outp) else 'error'
     except KeyboardInterrupt:
         if os.path.isfile(outp):
             os.rename(outp, "{}.interrupted".format(outp))
@@ -196,17 +195,37 @@ def call2(*popenargs, timeout, outp):
         else:
             open(timeout_filename, 'a').close()
         print("\033[1;31mTimeout!\033[m")
+        res = {'status': 'timeout', 'wall': timeout}
+    res['timeout'] = timeout
+    res['outp_size'] = os.path.getsize(outp) if os.path.isfile(outp) else 0
+    return res
 
 
-def call3(inp, outp, the_call, cddir):
+def call3(inp, outp, the_call, cddir, timeout=TIMEOUT):
     """
-    Run the prepared call with default timeout.
+    Run the prepared call with the given timeout and record the telemetry.
+    Returns the telemetry, or None if the call was not run.
     """
     with cd(cddir):
         if not os.path.isfile(outp):
-            print("\033[1;32mGenerating {}...\033[m".format(outp))
-# try for 10 minutes
-            call2(the_call, timeout=TIMEOUT, outp=outp)
+            print("\033[1;32mGenerating {} (timeout {})...\033[m".format(outp, timeout))
+            res = call2(the_call, timeout=timeout, outp=outp)
+            if res is not None:
+                res['tool'] = os.path.basename(the_call[0])
+                res['inp_size'] = os.path.getsize(inp) if os.path.isfile(inp) else 0
+                if res['status'] == 'done' and outp.endswith(".ldd"):
+                    # check the new file and record its size
+                    ldd = read_ldd(outp)
+                    if 'error' in ldd:
+                        # move the file aside, so it is not counted as generated
+                        os.replace(outp, "{}.invalid".format(outp))
+                        print("\033[1;31m{}, moved to {}.invalid\033[m".format(ldd['error'], outp))
+                        res['status'] = 'error'
+                    else:
+                        res.update({k: ldd[k] for k in ('vector_size', 'groups', 'nodes')})
+                record(cddir, outp, res)
+            return res
+    return None
 
 
 def outp_exists(inp, outp, the_call, cddir):
@@ -217,25 +236,126 @@ def outp_exists(inp, outp, the_call, cddir):
         return os.path.isfile(outp)
 
 
-def timeout_exists(inp, outp, the_call, cddir):
+def timeout_exists(inp, outp, the_call, cddir, timeout=TIMEOUT):
     """
     Return true if the timeout file exists, false otherwise.
     """
     with cd(cddir):
-        timeout_filename = "{}.timeout-{}".format(outp, TIMEOUT)
+        timeout_filename = "{}.timeout-{}".format(outp, timeout)
         return os.path.isfile(timeout_filename)
 
 
-def ext_files(directory, dotext, randomize=True):
+def timed_out(inp, outp, the_call, cddir):
+    """
+    Return the largest timeout (of the ladder) with which the call timed out, or 0.
+    """
+    return max([t for t in TIMEOUTS if timeout_exists(inp, outp, the_call, cddir, t)], default=0)
+
+
+###
+# Telemetry and cost prediction
+###
+
+def record(cddir, outp, res):
+    with open(TELEMETRY, 'a') as f:
+        f.write(json.dumps(dict(res, outp="{}/{}".format(cddir, outp))) + "\n")
+
+
+def load_telemetry():
+    """
+    Return the last record of every output file.
+    """
+    res = {}
+    if os.path.isfile(TELEMETRY):
+        with open(TELEMETRY) as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue
+                res[r['outp']] = r
+    return res
+
+
+def siblings(c):
+    """
+    Outputs that probably cost about the same as <c>: the other variable order
+    of a PNML model, or the other conversion of an LDD file.
+    """
+    outp = c['outp']
+    for a, b in (("-rf.ldd", "-rbs.ldd"), ("-rbs.ldd", "-rf.ldd"), (".bdd", ".mdd"), (".mdd", ".bdd")):
+        if outp.endswith(a):
+            return ["{}/{}{}".format(c['cddir'], outp[:-len(a)], b)]
+    return []
+
+
+def input_size(c):
+    path = "{}/{}".format(c['cddir'], c['inp'])
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def seconds_per_byte(telemetry, tool):
+    """
+    Median time per byte of input of the finished calls of <tool>, or None.
+    """
+    rates = sorted(r['wall'] / r['inp_size'] for r in telemetry.values()
+                   if r['tool'] == tool and r['status'] == 'done' and r.get('inp_size', 0) > 0)
+    return rates[len(rates)//2] if len(rates) > 0 else None
+
+
+def predict(c, telemetry):
+    """
+    Predict the time to generate <c> (in seconds).
+    Returns (time, source) with source one of "measured", "sibling" (the other
+    order or conversion), "size" (the time per byte of input of the same tool)
+    or "default" (0, i.e. unknown).
+    The prediction is at least the largest timeout with which <c> timed out.
+    """
+    lower = timed_out(**c)
+    r = telemetry.get("{}/{}".format(c['cddir'], c['outp']))
+    if r is not None and r['status'] == 'done':
+        return max(lower, r['wall']), "measured"
+    for s in siblings(c):
+        r = telemetry.get(s)
+        if r is not None and r['status'] in ('done', 'timeout'):
+            return max(lower, r['wall']), "sibling"
+    rate = seconds_per_byte(telemetry, os.path.basename(c['the_call'][0]))
+    if rate is not None and input_size(c) > 0:
+        return max(lower, rate * input_size(c)), "size"
+    return lower, "default"
+
+
+def schedule(calls):
+    """
+    Generate all files, cheapest first, with the timeout ladder.
+    At every timeout of the ladder, the files that are predicted to finish within
+    the timeout are generated, cheapest first (files without a prediction by the
+    size of the input); the predictions are updated after every call.
+    A call that fails is not repeated.
+    """
+    failed = set()
+    for timeout in TIMEOUTS:
+        while True:
+            telemetry = load_telemetry()
+            pending = [c for c in calls if c['outp'] not in failed and not outp_exists(**c) and timed_out(**c) < timeout]
+            costs = [(predict(c, telemetry)[0], input_size(c), c['outp'], c) for c in pending]
+            costs = [x for x in costs if x[0] < timeout or timeout == TIMEOUT]
+            if len(costs) == 0:
+                break
+            cost, size, outp, c = min(costs, key=lambda x: x[:3])
+            res = call3(timeout=timeout, **c)
+            if res is None or res['status'] == 'error':
+                failed.add(c['outp'])
+
+
+def ext_files(directory, dotext):
     """
     Return stripped filenames in directory ending with <dotext>.
     Example: ext_files("models", ".pnml")
     """
     files = list(filter(lambda f: os.path.isfile(directory+"/"+f), os.listdir(directory)))
     files = [f[:-len(dotext)] for f in filter(lambda f: f.endswith(dotext), files)]
-    if randomize:
-        random.shuffle(files)
-    return files
+    return sorted(files)
 
 
 def prepare_dve2C(directory, name):
@@ -259,6 +379,21 @@ def prepare_rf_ldd(directory, name):
             'the_call': [PNML2LTSSYM, "-rf", inp, outp, "--saturation=sat", "--vset=lddmc", "--lace-workers=4", "--when"]}
 
 
+def prepare_order_ldd(directory, name, order):
+    """
+    The LDD of <name> with an order kept by the order exploration (see orders.py).
+    """
+    outp = "{}-{}.ldd".format(name, order)
+    if order in orders.REGROUP:
+        inp = "{}.pnml".format(name)
+        regroup = ["-r" + orders.REGROUP[order]]
+    else:
+        inp = orders.permuted(name, order)
+        regroup = []
+    return {'inp': inp, 'outp': outp, 'cddir': directory,
+            'the_call': [PNML2LTSSYM] + regroup + [inp, outp, "--saturation=sat", "--vset=lddmc", "--lace-workers=4", "--when"]}
+
+
 def prepare_ldd2bdd(directory, name):
     inp = "{}.ldd".format(name)
     outp = "{}.bdd".format(name)
@@ -295,20 +430,22 @@ if __name__ == "__main__":
     for name in ext_files("mcc", ".pnml"):
         calls += [prepare_rf_ldd("mcc", name)]
         calls += [prepare_rbs_ldd("mcc", name)]
+        # and the orders kept by "generate.py orders"
+        calls += [prepare_order_ldd("mcc", name, order) for order in orders.kept_orders("mcc", name)]
 
     for name in ext_files("mcc", ".ldd"):
         calls += [prepare_ldd2bdd("mcc", name)]
         calls += [prepare_ldd2meddly("mcc", name)]
 
-    # get dve models from dve directory
-    # for name in ext_files("dve", ".dve"):
-    #     calls += [prepare_dve2C("dve", name)]
-    #     calls += [prepare_dve2C_rf_ldd("dve", name)] .....
+    # dve models (from dve/models.tar.xz, see "generate.py dve") are compiled
+    # and cached by the "compile" subcommand of experiments.py (see compiled.py)
 
     sanity(calls)
 
     # ./generate.py list (return all files this script generates)
     # ./generate.py todo (return all files this script would generate)
+    # ./generate.py plan (return the files to generate, cheapest first, with the predicted time)
+    # ./generate.py orders [<regexp>] (probe candidate variable orders of the (matching) models, see orders.py)
     # ./generate.py <regexp> (generate all files matching regular expression)
     if len(sys.argv) > 1:
         if sys.argv[1] == 'download':
@@ -335,6 +472,15 @@ if __name__ == "__main__":
                         with open("mcc/"+pnmlfile, "wb") as out:
                             f = tar.extractfile(n)
                             out.write(f.read())
+        elif sys.argv[1] == 'dve':
+            # extract the dve models
+            with tarfile.open('dve/models.tar.xz', "r:xz") as tar:
+                for n in filter(lambda n: n.endswith('.dve'), tar.getnames()):
+                    dvefile = os.path.basename(n)
+                    if not os.path.isfile('dve/'+dvefile):
+                        print("Extracting {}...".format(dvefile))
+                        with open("dve/"+dvefile, "wb") as out:
+                            out.write(tar.extractfile(n).read())
         elif sys.argv[1] == 'list':
             for c in calls:
                 print(c['outp'])
@@ -342,13 +488,21 @@ if __name__ == "__main__":
             for c in calls:
                 if not outp_exists(**c) and not timeout_exists(**c):
                     print(c['outp'])
+        elif sys.argv[1] == 'plan':
+            # the files to generate, cheapest first, with the predicted time
+            telemetry = load_telemetry()
+            pending = [c for c in calls if not outp_exists(**c) and not timeout_exists(**c)]
+            for t, source, c in sorted((predict(c, telemetry) + (c,) for c in pending), key=lambda x: (x[0], x[2]['outp'])):
+                print("{} {:.1f} ({})".format(c['outp'], t, source))
+        elif sys.argv[1] == 'orders':
+            # explore the variable orders, the kept orders are generated by the next run
+            for name in ext_files("mcc", ".pnml"):
+                if len(sys.argv) < 3 or re.match(sys.argv[2], name):
+                    orders.explore(PNML2LTSSYM, "mcc", name)
         else:
-            for c in calls:
-                if re.match(sys.argv[1], c['outp']):
-                    call3(**c)
+            schedule([c for c in calls if re.match(sys.argv[1], c['outp'])])
     else:
         todo_count = sum([1 for c in calls if not outp_exists(**c)])
         to_count = sum([1 for c in calls if timeout_exists(**c)])
         print("We have to generate {}/{} files! ({} timed out with {} seconds)".format(todo_count-to_count, len(calls), to_count, TIMEOUT))
-        for c in calls:
-            call3(**c)
+        schedule(calls)
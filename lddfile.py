@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+
+###
+# Reader of the .ldd model files written by pnml2lts-sym (and read by lddmc),
+# without Sylvan. The file is memory-mapped and only the headers are read, so
+# the vector size, the number of transition groups, the read/write projections
+# and the number of nodes of a model cost milliseconds, also for huge files.
+#
+# The format (native byte order, see set_load and rel_load in lddmc.c):
+#   int vector_size
+#   the initial states: int k (-1), a chunk of nodes, size_t root
+#   int next_count
+#   next_count times: int r_k, int w_k, int r_proj[r_k], int w_proj[w_k]
+#   next_count times: a chunk of nodes, size_t root
+#   (the reachable states and the action labels, ignored by lddmc)
+# A chunk is size_t count followed by count nodes of 16 bytes (lddmc_serialize_tofile).
+# Only the nodes that are not in an earlier chunk are written; nodes are numbered
+# from 2 over all chunks (0 is false, 1 is true), and a node only refers to
+# earlier nodes.
+###
+
+INT = struct.Struct("<i")
+SIZE = struct.Struct("<Q")
+NODE = struct.Struct("<QQ")
+NODE_SIZE = NODE.size
+
+
+class LDDFormatError(ValueError):
+    pass
+
+
+class Chunk(object):
+    """Nodes <first> .. <first>+<count>-1 (serialized numbers) at <offset> in the file, and the root.
+    """
+    def __init__(self, offset, first, count, root):
+        self.offset = offset
+        self.first = first
+        self.count = count
+        self.root = root
+
+
+class Relation(object):
+    def __init__(self, r_proj, w_proj):
+        self.r_proj = r_proj
+        self.w_proj = w_proj
+        self.chunk = None
+
+
+class LDDFile(object):
+    def __init__(self, filename):
+        """Read the headers of the .ldd file <filename>. Raises LDDFormatError if the file is invalid.
+        """
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size == 0:
+            self.file.close()
+            raise LDDFormatError("{}: empty file".format(filename))
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.pos = 0
+        self.chunks = []
+        self.firsts = []
+        self.nodes = 0  # the number of nodes in the file
+        try:
+            self.read()
+        except LDDFormatError:
+            self.close()
+            raise
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def unpack(self, fmt):
+        if self.pos + fmt.size > self.size:
+            raise LDDFormatError("{}: truncated at offset {}".format(self.filename, self.pos))
+        res = fmt.unpack_from(self.map, self.pos)
+        self.pos += fmt.size
+        return res[0] if len(res) == 1 else res
+
+    def ints(self, n):
+        if n < 0 or self.pos + 4 * n > self.size:
+            raise LDDFormatError("{}: invalid projection at offset {}".format(self.filename, self.pos))
+        res = list(struct.unpack_from("<{}i".format(n), self.map, self.pos))
+        self.pos += 4 * n
+        return res
+
+    def chunk(self):
+        count = self.unpack(SIZE)
+        offset = self.pos
+        if offset + count * NODE_SIZE > self.size:
+            raise LDDFormatError("{}: chunk of {} nodes at offset {} is truncated".format(self.filename, count, offset))
+        first = self.nodes + 2
+        self.pos += count * NODE_SIZE
+        root = self.unpack(SIZE)
+        if root > first + count - 1:
+            raise LDDFormatError("{}: root {} refers to a node that is not written yet".format(self.filename, root))
+        c = Chunk(offset, first, count, root)
+        self.chunks.append(c)
+        self.firsts.append(first)
+        self.nodes += count
+        return c
+
+    def read(self):
+        self.vector_size = self.unpack(INT)
+        if self.vector_size <= 0:
+            raise LDDFormatError("{}: invalid vector size {}".format(self.filename, self.vector_size))
+        k = self.unpack(INT)
+        if k != -1:
+            raise LDDFormatError("{}: the initial states are not a full vector".format(self.filename))
+        self.initial = self.chunk()
+        self.next_count = self.unpack(INT)
+        if self.next_count < 0:
+            raise LDDFormatError("{}: invalid number of transition groups {}".format(self.filename, self.next_count))
+        self.relations = []
+        for i in range(self.next_count):
+            r_k = self.unpack(INT)
+            w_k = self.unpack(INT)
+            rel = Relation(self.ints(r_k), self.ints(w_k))
+            for proj in (rel.r_proj, rel.w_proj):
+                if any(v < 0 or v >= self.vector_size for v in proj) or proj != sorted(set(proj)):
+                    raise LDDFormatError("{}: invalid projection of group {}".format(self.filename, i))
+            self.relations.append(rel)
+        for rel in self.relations:
+            rel.chunk = self.chunk()
+        # the rest of the file (reachable states, action labels)
+        self.trailing = self.size - self.pos
+
+    def node(self, n):
+        """Return (value, right, down, copy) of the node with serialized number <n> (at least 2).
+        """
+        i = bisect.bisect_right(self.firsts, n) - 1
+        if i >= 0:
+            c = self.chunks[i]
+            if n < c.first + c.count:
+                a, b = NODE.unpack_from(self.map, c.offset + (n - c.first) * NODE_SIZE)
+                value = ((a >> 48) | (b << 16)) & 0xffffffff
+                return value, (a & 0x0000ffffffffffff) >> 1, b >> 17, (b & 0x10000) != 0
+        raise LDDFormatError("{}: no node {}".format(self.filename, n))
+
+    def count(self, root):
+        """The number of nodes of the LDD <root> (this reads the nodes).
+        """
+        seen = set()
+        stack = [root]
+        while len(stack) > 0:
+            n = stack.pop()
+            if n < 2 or n in seen:
+                continue
+            seen.add(n)
+            value, right, down, copy = self.node(n)
+            stack.append(right)
+            stack.append(down)
+        return len(seen)
+
+    def summary(self):
+        return {
+            'file': self.filename,
+            'bytes': self.size,
+            'vector_size': self.vector_size,
+            'groups': self.next_count,
+            'nodes': self.nodes,
+            'initial_nodes': self.initial.count,
+            'relation_nodes': sum(rel.chunk.count for rel in self.relations),
+            'read_vars': sum(len(rel.r_proj) for rel in self.relations),
+            'write_vars': sum(len(rel.w_proj) for rel in self.relations),
+            'trailing': self.trailing,
+        }
+
+
+def read_ldd(filename):
+    """Return the summary of the .ldd file <filename>, or a dict with 'error' if it is invalid.
+    """
+    try:
+        with LDDFile(filename) as f:
+            return f.summary()
+    except (OSError, LDDFormatError) as e:
+        return {'file': filename, 'error': str(e)}
+
+
+FIELDS = ['file', 'bytes', 'vector_size', 'groups', 'nodes', 'initial_nodes', 'relation_nodes',
+          'read_vars', 'write_vars', 'trailing', 'error']
+
+
+def ldd_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for f in sorted(os.listdir(path)):
+                if f.endswith(".ldd"):
+                    yield os.path.join(path, f)
+        else:
+            yield path
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) == 0:
+        print("Usage: lddfile.py <FILE|DIR>...  Write the CSV of the sizes of the .ldd files", file=sys.stderr)
+        sys.exit(2)
+    print("; ".join(FIELDS))
+    for filename in ldd_files(args):
+        res = read_ldd(filename)
+        print("; ".join(str(res.get(f, "")) for f in FIELDS))
+
+
+if __name__ == "__main__":
+    main()
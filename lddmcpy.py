@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import ctypes
+import os
+import sys
+
+from lddfile import read_ldd
+
+
+###
+# In-process reachability with Sylvan, through ctypes.
+# Every run of lddmc starts a process, which starts the Lace workers, allocates
+# the Sylvan tables and reads the model again. For a sweep over worker counts
+# and strategies of one model, this is repeated for every run and adds noise to
+# sub-second runs. The shared library liblddmcpy.so (sylvan/examples/lddmcpy.c,
+# built position independent in sylvan/build-pic, in tools/) contains the strategies of lddmc:
+# the model file is read once, and every run starts from the initial states
+# with an empty operation cache. For another number of workers, Lace and Sylvan
+# are stopped and started again in the process, and the model is read again
+# from memory (this is not part of the time of a run).
+# Lace and Sylvan are global, so there is one LDDMC per process, and it is only
+# used from the thread that created it.
+###
+
+LIBRARY = os.environ.get("LDDMCPY", "tools/liblddmcpy.so")
+
+# strategy -> number in lddmc (-s)
+STRATEGIES = {"bfs": 0, "par": 1, "sat": 2, "chaining": 3}
+
+_lib = None
+
+
+def load_library(filename=LIBRARY):
+    global _lib
+    if _lib is None:
+        lib = ctypes.CDLL(os.path.abspath(filename))
+        lib.lddmcpy_init.argtypes = [ctypes.c_int, ctypes.c_size_t]
+        lib.lddmcpy_init.restype = ctypes.c_int
+        lib.lddmcpy_load.argtypes = [ctypes.c_char_p]
+        lib.lddmcpy_load.restype = ctypes.c_int
+        lib.lddmcpy_vector_size.argtypes = []
+        lib.lddmcpy_vector_size.restype = ctypes.c_int
+        lib.lddmcpy_restart.argtypes = [ctypes.c_int]
+        lib.lddmcpy_restart.restype = ctypes.c_int
+        lib.lddmcpy_run.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_double), ctypes.POINTER(ctypes.c_size_t)]
+        lib.lddmcpy_run.restype = ctypes.c_double
+        _lib = lib
+    return _lib
+
+
+class LDDMC(object):
+    started = False
+
+    def __init__(self, model, workers=None, memory=0, library=LIBRARY):
+        """Start Lace with <workers> workers (default all cores) and Sylvan with <memory> bytes
+        (default as lddmc), and read the .ldd file <model>.
+        """
+        if LDDMC.started:
+            raise RuntimeError("Lace and Sylvan are already started in this process")
+        # lddmc aborts (and would stop Python) on an invalid file, so check it first
+        summary = read_ldd(model)
+        if 'error' in summary:
+            raise ValueError(summary['error'])
+        self.lib = load_library(library)
+        LDDMC.started = True
+        self.model = model
+        self.workers = self.lib.lddmcpy_init(workers or 0, memory)
+        self.groups = self.lib.lddmcpy_load(model.encode())
+        if self.groups < 0:
+            raise OSError("cannot read {}".format(model))
+        self.vector_size = self.lib.lddmcpy_vector_size()
+
+    def set_workers(self, workers):
+        """Restart Lace and Sylvan with <workers> workers, unless that is the current number.
+        """
+        if workers < 1:
+            raise ValueError("{} workers".format(workers))
+        if workers != self.workers:
+            self.workers = self.lib.lddmcpy_restart(workers)
+        return self.workers
+
+    def run(self, strategy, nodes=False):
+        """Run <strategy> (bfs, par, sat or chaining) from the initial states.
+        Returns {'strategy', 'workers', 'time', 'states'} and 'nodes' (the LDD nodes of the states) if <nodes>.
+        """
+        states = ctypes.c_double()
+        count = ctypes.c_size_t()
+        t = self.lib.lddmcpy_run(STRATEGIES[strategy], ctypes.byref(states),
+                                 ctypes.byref(count) if nodes else None)
+        res = {'strategy': strategy, 'workers': self.workers, 'time': t, 'states': int(states.value)}
+        if nodes:
+            res['nodes'] = count.value
+        return res
+
+    def sweep(self, workers, strategies, iterations=1):
+        """Run every strategy <iterations> times with every number of workers.
+        Yields the results, with 'iteration'.
+        """
+        for w in workers:
+            self.set_workers(w)
+            for i in range(iterations):
+                for s in strategies:
+                    res = self.run(s)
+                    res['iteration'] = i
+                    yield res
+
+
+FIELDS = ['model', 'strategy', 'workers', 'iteration', 'time', 'states']
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 1 or any(a not in STRATEGIES for a in args[2:]):
+        print("Valid calls:", file=sys.stderr)
+        print("lddmcpy.py <MODEL.ldd>                                               Run sat with all cores", file=sys.stderr)
+        print("lddmcpy.py <MODEL.ldd> <W1,W2,...[xITERATIONS]> [STRATEGY...]  Write the CSV of the runs "
+              "(strategies: {})".format(", ".join(sorted(STRATEGIES))), file=sys.stderr)
+        sys.exit(2)
+    workers, _, iterations = (args[1] if len(args) > 1 else "").partition("x")
+    workers = [int(w) for w in workers.split(",")] if workers else []
+    # the CSV to stdout, the progress that the strategies print (to fd 1) to stderr
+    out = os.fdopen(os.dup(1), 'w')
+    sys.stdout.flush()
+    os.dup2(2, 1)
+    ldd = LDDMC(args[0], workers[0] if workers else None)
+    print("; ".join(FIELDS), file=out, flush=True)
+    for res in ldd.sweep(workers or [ldd.workers], args[2:] or ["sat"], int(iterations or 1)):
+        res['model'] = args[0]
+        print("; ".join(str(res[f]) for f in FIELDS), file=out, flush=True)
+
+
+if __name__ == "__main__":
+    main()
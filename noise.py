@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+import glob
+import threading
+import time
+
+
+###
+# Detecting noise and interference on the machine.
+# The NoiseMonitor records the load, the number of runnable processes,
+# the CPU frequency and the thermal throttle counters before, during and
+# after every run, and runs a short calibration benchmark at intervals.
+# Runs under abnormal conditions are marked tainted: the engine moves their
+# log file aside and runs them again (see ExperimentEngine.run_one).
+###
+
+PROC = "/proc"
+SYS_CPU = "/sys/devices/system/cpu"
+
+
+def read_file(filename):
+    try:
+        with open(filename) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def read_loadavg():
+    """Return the 1-minute load average, or None.
+    """
+    contents = read_file(PROC + "/loadavg")
+    if contents is None:
+        return None
+    return float(contents.split()[0])
+
+
+def read_procs_running():
+    """Return the number of runnable processes (threads), or None.
+    This includes the thread reading it.
+    """
+    contents = read_file(PROC + "/stat")
+    if contents is None:
+        return None
+    for line in contents.splitlines():
+        if line.startswith("procs_running "):
+            return int(line.split()[1])
+    return None
+
+
+def read_cpu_values(pattern):
+    """Return the integer values of the sysfs files matching <pattern> (for all CPUs).
+    """
+    res = []
+    for filename in glob.glob(SYS_CPU + "/cpu[0-9]*/" + pattern):
+        contents = read_file(filename)
+        if contents is not None and contents.strip().isdigit():
+            res.append(int(contents))
+    return res
+
+
+def read_freqs():
+    """Return the current frequency of every CPU in MHz (empty without cpufreq).
+    """
+    return [f / 1000 for f in read_cpu_values("cpufreq/scaling_cur_freq")]
+
+
+def read_max_freq():
+    freqs = read_cpu_values("cpufreq/cpuinfo_max_freq")
+    return max(freqs) / 1000 if len(freqs) > 0 else None
+
+
+def read_throttle():
+    """Return the sum of the thermal throttle counters, or None if there are none.
+    """
+    counts = read_cpu_values("thermal_throttle/core_throttle_count")
+    counts += read_cpu_values("thermal_throttle/package_throttle_count")
+    return sum(counts) if len(counts) > 0 else None
+
+
+def calibration_benchmark(repeat=3):
+    """A short CPU-bound benchmark; returns the best time of <repeat> runs.
+    """
+    best = None
+    for _ in range(repeat):
+        t1 = time.perf_counter()
+        sum(i * i for i in range(200000))
+        t = time.perf_counter() - t1
+        best = t if best is None else min(best, t)
+    return best
+
+
+class NoiseMonitor(object):
+    def __init__(self, max_others=1, freq_ratio=0.7, calib_tolerance=0.1, calibrate_every=600, interval=1.0):
+        """Monitor for the conditions of a run.
+        - max_others: number of other runnable processes allowed before and during the run
+        - freq_ratio: a run is tainted if the frequency of the busy CPUs drops below this ratio of the maximum
+        - calib_tolerance: a run is tainted if the calibration benchmark is this much slower than the best
+        - calibrate_every: seconds between calibrations (or before the next run, if the last calibration was too slow)
+        - interval: seconds between samples during the run
+        """
+        self.max_others = max_others
+        self.freq_ratio = freq_ratio
+        self.calib_tolerance = calib_tolerance
+        self.calibrate_every = calibrate_every
+        self.interval = interval
+        self.max_freq = read_max_freq()
+        self.calib_best = None
+        self.calib_last = None
+        self.calib_ratio = None
+        self.thread = None
+
+    def calibrate(self):
+        t = calibration_benchmark()
+        self.calib_best = t if self.calib_best is None else min(self.calib_best, t)
+        self.calib_last = time.monotonic()
+        self.calib_ratio = t / self.calib_best
+        return self.calib_ratio
+
+    def sample(self):
+        """Sample the runnable processes and frequencies during the run.
+        """
+        running = read_procs_running()
+        if running is not None:
+            # not counting the monitor itself and the workers of the experiment
+            others = running - 1 - self.workers
+            self.others_max = others if self.others_max is None else max(self.others_max, others)
+        freqs = sorted(read_freqs(), reverse=True)
+        if len(freqs) > 0:
+            # the frequency of the CPUs that are (probably) running the experiment
+            busy = freqs[:self.workers]
+            freq = sum(busy) / len(busy)
+            self.freq_min = freq if self.freq_min is None else min(self.freq_min, freq)
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self, experiment):
+        """Called before the experiment is run.
+        """
+        # calibrate again after an abnormal calibration, so it does not taint every run
+        # (including the retries) until the next calibration
+        if (self.calib_last is None or time.monotonic() - self.calib_last >= self.calibrate_every or
+                self.calib_ratio > 1 + self.calib_tolerance):
+            self.calibrate()
+        self.workers = getattr(experiment, 'workers', 1)
+        self.load_before = read_loadavg()
+        running = read_procs_running()
+        self.others_before = running - 1 if running is not None else None
+        self.throttle_before = read_throttle()
+        self.others_max = None
+        self.freq_min = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Called after the experiment is run.
+        Returns a dict with the recorded values, including 'tainted' (0 or 1)
+        and 'taint' (the reasons) if the run is tainted.
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        running = read_procs_running()
+        throttle = read_throttle()
+        res = {}
+        reasons = []
+        if self.load_before is not None:
+            res['noise_load'] = self.load_before
+        if self.others_before is not None:
+            res['noise_others_before'] = self.others_before
+            if self.others_before > self.max_others:
+                reasons.append("busy-before")
+        if self.others_max is not None:
+            res['noise_others'] = self.others_max
+            if self.others_max > self.max_others:
+                reasons.append("busy")
+        if running is not None:
+            res['noise_others_after'] = running - 1
+        if self.freq_min is not None:
+            res['noise_freq'] = round(self.freq_min)
+            if self.max_freq is not None and self.freq_min < self.freq_ratio * self.max_freq:
+                reasons.append("freq")
+        if throttle is not None and self.throttle_before is not None:
+            res['noise_throttle'] = throttle - self.throttle_before
+            if throttle > self.throttle_before:
+                reasons.append("throttle")
+        if self.calib_ratio is not None:
+            res['noise_calib'] = round(self.calib_ratio, 3)
+            if self.calib_ratio > 1 + self.calib_tolerance:
+                reasons.append("calib")
+        res['tainted'] = 1 if len(reasons) > 0 else 0
+        if len(reasons) > 0:
+            res['taint'] = ",".join(reasons)
+        return res
+
+
+def is_tainted(value):
+    """True if the result (a dict) of an experiment was measured under abnormal conditions.
+    """
+    return isinstance(value, dict) and value.get('tainted', 0) == 1
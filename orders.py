@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+import collections
+import json
+import os
+import re
+from subprocess import TimeoutExpired
+import xml.etree.ElementTree as ET
+
+from expfw import call_rusage
+from exp import ORDERS
+
+
+###
+# Variable-order exploration.
+# The times differ by orders of magnitude between the FORCE (-rf) and Sloan (-rbs)
+# orders of LTSmin, and these used to be the only orders. This stage tries more
+# candidate orders for every PNML model:
+# - other regroup strategies of LTSmin (REGROUP)
+# - orders computed from the structure of the net (HEURISTICS); the places are
+#   written in that order to orders/<model>-<order>.pnml, which pnml2lts-sym
+#   reads without regrouping (the variables follow the places in the file)
+# Every candidate is scored by a short probe with pnml2lts-sym (with a timeout of
+# BUDGET seconds). Probes that finish are ranked by the number of nodes of the
+# state space and of the transition relation, then by time, and before the probes
+# that did not finish, which are ranked by the last node count they reported.
+# The probes are in <directory>/orders.json, and the best KEEP candidates (other
+# than rf and rbs) are generated as <model>-<order>.ldd by generate.py, which
+# makes them extra order variants of the LDD, BDD and MDD experiments (see
+# exp.model_orders).
+###
+
+# order -> regroup specification of LTSmin (-r<spec>)
+REGROUP = {
+    "rf": "f",        # FORCE
+    "rbs": "bs",      # Sloan (Boost)
+    "rbk": "bk",      # King (Boost)
+    "rbcm": "bcm",    # Cuthill-McKee (Boost)
+    "rtgbs": "tg,bs", # Sloan on the total graph
+    "rgsa": "gsa",    # group, then simulated annealing of the columns
+}
+# orders computed from the PNML file
+HEURISTICS = ["pdfs", "prcm", "pforce"]
+assert list(REGROUP) + HEURISTICS == ORDERS
+
+BUDGET = 30
+KEEP = 2
+ORDERSFILE = "orders.json"
+FORCE_ITERATIONS = 100
+
+
+###
+# Orders from the structure of the net
+###
+
+def local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def read_net(filename):
+    """Read the PNML file <filename>.
+    Returns (places, marked, transitions): the ids of the places in file order,
+    the set of initially marked places, and for every transition the set of places
+    that it reads or writes.
+    """
+    tree = ET.parse(filename)
+    places = []
+    marked = set()
+    transitions = {}
+    arcs = []
+    for el in tree.iter():
+        kind = local(el.tag)
+        if kind == "place":
+            places.append(el.get("id"))
+            for m in el.iter():
+                if local(m.tag) == "initialMarking":
+                    text = "".join(t.text or "" for t in m.iter() if local(t.tag) == "text").strip()
+                    if text.isdigit() and int(text) > 0:
+                        marked.add(el.get("id"))
+        elif kind == "transition":
+            transitions[el.get("id")] = set()
+        elif kind == "arc":
+            arcs.append((el.get("source"), el.get("target")))
+    for source, target in arcs:
+        if source in transitions:
+            transitions[source].add(target)
+        elif target in transitions:
+            transitions[target].add(source)
+    return places, marked, [ps for ps in transitions.values() if len(ps) > 0]
+
+
+def write_permuted(source, order, filename):
+    """Write the PNML file <source> with the places in <order> to <filename>.
+    """
+    tree = ET.parse(source)
+    root = tree.getroot()
+    m = re.match(r'\{(.*)\}', root.tag)
+    if m:
+        ET.register_namespace('', m.group(1))
+    parents = {c: p for p in root.iter() for c in p}
+    elements = {el.get("id"): el for el in root.iter() if local(el.tag) == "place"}
+    first = next(el for el in root.iter() if local(el.tag) == "place")
+    parent = parents[first]
+    index = list(parent).index(first)
+    for el in elements.values():
+        parents[el].remove(el)
+    for k, p in enumerate(order):
+        parent.insert(index + k, elements[p])
+    tree.write(filename, xml_declaration=True, encoding="utf-8")
+
+
+def neighbours(places, transitions):
+    """Places are neighbours if a transition reads or writes both.
+    """
+    adj = {p: set() for p in places}
+    for ps in transitions:
+        for p in ps:
+            adj[p] |= ps
+    for p in places:
+        adj[p].discard(p)
+    return adj
+
+
+def span(order, transitions):
+    """The sum over all transitions of the number of variables from the first to the last place it touches.
+    """
+    pos = {p: i for i, p in enumerate(order)}
+    return sum(max(pos[p] for p in ps) - min(pos[p] for p in ps) + 1 for ps in transitions)
+
+
+def dfs_order(places, marked, transitions):
+    """Depth-first from the initially marked places, so places that interact are close.
+    """
+    adj = neighbours(places, transitions)
+    index = {p: i for i, p in enumerate(places)}
+    seen = set()
+    order = []
+    for root in [p for p in places if p in marked] + places:
+        stack = [root]
+        while len(stack) > 0:
+            p = stack.pop()
+            if p in seen:
+                continue
+            seen.add(p)
+            order.append(p)
+            stack.extend(sorted(adj[p] - seen, key=index.get, reverse=True))
+    return order
+
+
+def rcm_order(places, marked, transitions):
+    """Reverse Cuthill-McKee on the places: breadth-first from a place of minimal degree,
+    the neighbours by increasing degree, reversed.
+    """
+    adj = neighbours(places, transitions)
+    key = {p: (len(adj[p]), i) for i, p in enumerate(places)}
+    seen = set()
+    order = []
+    for root in sorted(places, key=key.get):
+        if root in seen:
+            continue
+        seen.add(root)
+        queue = collections.deque([root])
+        while len(queue) > 0:
+            p = queue.popleft()
+            order.append(p)
+            for q in sorted(adj[p] - seen, key=key.get):
+                seen.add(q)
+                queue.append(q)
+    return order[::-1]
+
+
+def force_order(places, marked, transitions, iterations=FORCE_ITERATIONS):
+    """FORCE on the places (Aloul et al.): move every place to the mean center of gravity
+    of its transitions, until the span does not improve.
+    """
+    pos = {p: i for i, p in enumerate(places)}
+    best, best_span = list(places), span(places, transitions)
+    for _ in range(iterations):
+        forces = {p: [] for p in places}
+        for ps in transitions:
+            cog = sum(pos[p] for p in ps) / len(ps)
+            for p in ps:
+                forces[p].append(cog)
+        new = {p: sum(f) / len(f) if len(f) > 0 else pos[p] for p, f in forces.items()}
+        order = sorted(places, key=lambda p: (new[p], pos[p]))
+        pos = {p: i for i, p in enumerate(order)}
+        s = span(order, transitions)
+        if s >= best_span:
+            break
+        best, best_span = order, s
+    return best
+
+
+HEURISTIC_FUNCTIONS = {"pdfs": dfs_order, "prcm": rcm_order, "pforce": force_order}
+
+
+###
+# Probes
+###
+
+def permuted(name, order):
+    """The PNML file of <name> with the places in the heuristic <order> (relative to the models).
+    """
+    return "orders/{}-{}.pnml".format(name, order)
+
+
+def probe_call(exe, directory, name, order):
+    base = ["--when", "--precise", "--vset=lddmc", "--saturation=sat", "--lace-workers=1"]
+    if order in REGROUP:
+        return [exe, "-r" + REGROUP[order]] + base + ["{}/{}.pnml".format(directory, name)]
+    return [exe] + base + ["{}/{}".format(directory, permuted(name, order))]
+
+
+def parse_probe(contents):
+    res = {}
+    s = re.findall(r'reachability took ([\d\.]+)', contents)
+    res['finished'] = len(s) == 1
+    s = re.findall(r'state space has precisely (\d+) states, (\d+) nodes', contents)
+    if len(s) == 1:
+        res['states'] = int(s[0][0])
+        res['nodes'] = int(s[0][1])
+    s = re.findall(r'group_next: (\d+) nodes total', contents)
+    if len(s) == 1:
+        res['nextnodes'] = int(s[0])
+    # the last node count of a probe that did not finish
+    s = re.findall(r'(\d+) nodes', contents)
+    if len(s) > 0:
+        res['last_nodes'] = int(s[-1])
+    return res
+
+
+def probe(call, logfile, budget=BUDGET):
+    """Run the probe <call> with a timeout of <budget> seconds, the output in <logfile>.
+    """
+    with open(logfile, 'w') as out:
+        try:
+            res = call_rusage(call, stdout=out, stderr=out, timeout=budget)
+            exitcode = res['exitcode']
+            wall = res['wall']
+        except TimeoutExpired:
+            exitcode = None
+            wall = budget
+        except OSError:
+            return {'error': 'missing executable', 'finished': False}
+    with open(logfile) as f:
+        res = parse_probe(f.read())
+    res['time'] = wall
+    if exitcode not in (0, None) or (res['finished'] and 'nodes' not in res):
+        res['error'] = "exit code {}".format(exitcode)
+        res['finished'] = False
+    return res
+
+
+def score(res):
+    """The key to sort probe results by (lower is better), or None for a failed probe.
+    """
+    if 'error' in res:
+        return None
+    if res['finished']:
+        return 0, res['nodes'] + res.get('nextnodes', 0), res['time']
+    return 1, res.get('last_nodes', float('inf')), res['time']
+
+
+def rank(candidates):
+    """The orders of the probes in <candidates> (order -> result), best first.
+    A probe with another number of states than most finished probes is an error.
+    """
+    states = [r['states'] for r in candidates.values() if r.get('finished') and 'states' in r]
+    if len(states) > 0:
+        common = max(set(states), key=states.count)
+        for r in candidates.values():
+            if r.get('finished') and r.get('states', common) != common:
+                r['error'] = "wrong number of states {} (expected {})".format(r['states'], common)
+    return sorted((o for o, r in candidates.items() if score(r) is not None), key=lambda o: (score(candidates[o]), o))
+
+
+def load_orders(directory):
+    filename = os.path.join(directory, ORDERSFILE)
+    if os.path.isfile(filename):
+        with open(filename) as f:
+            return json.load(f)
+    return {}
+
+
+def save_orders(directory, data):
+    filename = os.path.join(directory, ORDERSFILE)
+    with open(filename + ".tmp", 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(filename + ".tmp", filename)
+
+
+def kept_orders(directory, name):
+    return load_orders(directory).get(name, {}).get('keep', [])
+
+
+def explore(exe, directory, name, budget=BUDGET, keep=KEEP):
+    """Probe all candidate orders of the model <directory>/<name>.pnml and keep the best <keep>.
+    Returns the ranked orders.
+    """
+    work = os.path.join(directory, "orders")
+    if not os.path.exists(work):
+        os.makedirs(work)
+    pnml = "{}/{}.pnml".format(directory, name)
+    places, marked, transitions = read_net(pnml)
+    candidates = {}
+    for order in ORDERS:
+        if order in HEURISTIC_FUNCTIONS:
+            permutation = HEURISTIC_FUNCTIONS[order](places, marked, transitions)
+            write_permuted(pnml, permutation, os.path.join(directory, permuted(name, order)))
+        print("Probing {} with order {}...".format(name, order), end=" ", flush=True)
+        res = probe(probe_call(exe, directory, name, order), "{}/{}-{}.log".format(work, name, order), budget)
+        if order in HEURISTIC_FUNCTIONS:
+            res['span'] = span(permutation, transitions)
+        candidates[order] = res
+        if 'error' in res:
+            print(res['error'])
+        elif res['finished']:
+            print("{} nodes, {} next nodes, {:.2f} seconds".format(res['nodes'], res.get('nextnodes', 0), res['time']))
+        else:
+            print("not finished within {} seconds".format(budget))
+    ranked = rank(candidates)
+    data = load_orders(directory)
+    data[name] = {'candidates': candidates, 'ranked': ranked,
+                  'keep': [o for o in ranked if o not in ORDERS[:2]][:keep]}
+    save_orders(directory, data)
+    print("{}: {} (keeping {})".format(name, ", ".join(ranked), ", ".join(data[name]['keep']) or "none"))
+    return ranked
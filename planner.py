@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import time
+
+from adaptive import fit_amdahl
+from expfw import Experiment
+from exp import split_order
+from noise import is_tainted
+
+
+###
+# Planning experiments within a budget of core-hours.
+# The R scripts only use a model/order when every method and worker count
+# has a time or a timeout (a complete row), so a partially run row is wasted.
+# We predict the cost of every pending experiment and choose the rows that
+# can be completed within the budget, cheapest first. With unit value per row,
+# cheapest first maximizes the number of complete rows.
+###
+
+# Timeout of probe runs (seconds)
+PROBE_TIMEOUT = 30
+
+
+def median(xs):
+    xs = sorted(xs)
+    n = len(xs)
+    return xs[n//2] if n % 2 == 1 else (xs[n//2-1] + xs[n//2]) / 2
+
+
+class Row(object):
+    """All experiments of one (model, order).
+    """
+    def __init__(self, key):
+        self.key = key
+        self.experiments = []
+        self.pending = []  # (experiment, iteration, predicted time, source)
+        self.failed = False
+
+    def cost(self):
+        """Predicted cost of the pending experiments, in core-seconds.
+        """
+        return sum(t * e.workers for e, i, t, source in self.pending)
+
+    def complete(self):
+        return len(self.pending) == 0 and not self.failed
+
+
+class Planner(object):
+    def __init__(self, engine, iterations=1):
+        self.engine = engine
+        self.iterations = iterations
+
+    def results(self, e):
+        """Return (times, timed out, lower bound, error) over the iterations of <e>.
+        """
+        times = []
+        timedout = False
+        lower = 0
+        error = False
+        for i in range(self.iterations):
+            self.engine.extend_for_iteration(i)
+            status, value = self.engine.get_status(e, i)
+            if status == Experiment.DONE and not is_tainted(value):
+                times.append(value['time'])
+            elif status == Experiment.TIMEOUT and value >= self.engine.timeout:
+                timedout = True
+            elif status == Experiment.TIMEOUT:
+                # e.g. a probe with a lower timeout
+                lower = max(lower, value)
+            elif status == Experiment.ERROR:
+                error = True
+        return times, timedout, lower, error
+
+    def is_pending(self, e, i):
+        status, value = self.engine.get_status(e, i)
+        return (status == Experiment.NOTDONE or
+                (status == Experiment.TIMEOUT and value < self.engine.timeout))
+
+    def predict(self, e, row):
+        """Predict the time of <e> (in seconds) from the results so far.
+        Returns (time, source) with source one of "measured", "fit" (from other
+        worker counts of the same method), "row" (from other methods of the same
+        model/order) or "default" (the timeout).
+        """
+        timeout = self.engine.timeout
+        times, timedout, lower, error = self.results(e)
+        if len(times) > 0:
+            return median(times), "measured"
+        if timedout:
+            return timeout, "measured"
+        # other worker counts of the same group and method
+        points = []
+        for x in row.experiments:
+            if x.group == e.group and x.method == e.method and x is not e:
+                t, _, _, _ = self.results(x)
+                if len(t) > 0:
+                    points.append((x.workers, median(t)))
+        if len(points) > 0:
+            a, b = fit_amdahl(points)
+            return min(timeout, max(lower, a + b / e.workers)), "fit"
+        # other methods of the same model/order with the same workers
+        others = []
+        for x in row.experiments:
+            if x.workers == e.workers and x is not e:
+                t, _, _, _ = self.results(x)
+                others.extend(t)
+        if len(others) > 0:
+            return min(timeout, max(lower, median(others))), "row"
+        return timeout, "default"
+
+    def rows(self):
+        rows = {}
+        for e in self.engine:
+            key = split_order(e.group, e.method)[:2]
+            rows.setdefault(key, Row(key)).experiments.append(e)
+        for row in rows.values():
+            for e in row.experiments:
+                times, timedout, lower, error = self.results(e)
+                if error:
+                    # the R scripts never get a time for this experiment
+                    row.failed = True
+                    continue
+                pending = [i for i in range(self.iterations) if self.is_pending(e, i)]
+                if len(pending) > 0:
+                    t, source = self.predict(e, row)
+                    row.pending.extend((e, i, t, source) for i in pending)
+        return rows
+
+    def plan(self, budget, rows=None):
+        """Choose the rows to complete within <budget> core-hours.
+        Returns (selected rows in order, other incomplete rows).
+        """
+        if rows is None:
+            rows = self.rows()
+        rows = [r for r in rows.values() if not r.complete() and not r.failed]
+        rows.sort(key=lambda r: (r.cost(), r.key))
+        selected = []
+        spent = 0.0
+        for r in rows:
+            if spent + r.cost() / 3600 > budget:
+                break
+            spent += r.cost() / 3600
+            selected.append(r)
+        return selected, rows[len(selected):]
+
+    def report(self, budget):
+        rows = self.rows()
+        complete = [r for r in rows.values() if r.complete()]
+        failed = [r for r in rows.values() if r.failed]
+        todo = [r for r in rows.values() if not r.complete() and not r.failed]
+        pending = [p for r in todo for p in r.pending]
+        sources = {}
+        for e, i, t, source in pending:
+            sources[source] = sources.get(source, 0) + 1
+        print("{} rows complete, {} rows with errors, {} rows to do with {} pending runs.".format(
+            len(complete), len(failed), len(todo), len(pending)))
+        print("Expected cost of all pending runs: {:.2f} core-hours (predictions: {}).".format(
+            sum(r.cost() for r in todo) / 3600,
+            ", ".join("{} {}".format(n, s) for s, n in sorted(sources.items()))))
+        selected, rest = self.plan(budget, rows)
+        total = 0.0
+        for r in selected:
+            total += r.cost() / 3600
+            print("{} {}: {} runs, {:.2f} core-hours (total {:.2f}).".format(
+                r.key[0], r.key[1], len(r.pending), r.cost() / 3600, total))
+        print("With {} core-hours: {} more complete rows, {} rows left.".format(budget, len(selected), len(rest)))
+
+    def run(self, budget):
+        """Run the planned rows, cheapest first, until <budget> core-hours are spent.
+        """
+        selected, rest = self.plan(budget)
+        spent = 0.0
+        for r in selected:
+            print("Completing {} {}.".format(r.key[0], r.key[1]))
+            for e, i, t, source in sorted(r.pending, key=lambda p: p[2] * p[0].workers):
+                if self.engine.run_one(e, i):
+                    status, value = self.engine.get_status(e, i)
+                    if status == Experiment.DONE or status == Experiment.ERROR:
+                        spent += value.get('wall', value.get('time', 0)) * e.workers / 3600
+                    elif status == Experiment.TIMEOUT:
+                        spent += value * e.workers / 3600
+                    time.sleep(1)
+                if spent >= budget:
+                    print("Budget of {} core-hours spent.".format(budget))
+                    return
+        print("Spent {:.2f} of {} core-hours.".format(spent, budget))
+
+    def probe(self, timeout=PROBE_TIMEOUT):
+        """Run the pending experiments without any prediction for a short time,
+        one per group and method (with the most workers). A probe that finishes
+        is a normal result; a probe that times out gives a lower bound.
+        """
+        saved = self.engine.timeout
+        probes = {}
+        for row in self.rows().values():
+            for e, i, t, source in row.pending:
+                if source == "default" and i == 0:
+                    key = (e.group, e.method)
+                    if key not in probes or probes[key].workers < e.workers:
+                        probes[key] = e
+        try:
+            self.engine.timeout = timeout
+            for e in probes.values():
+                if self.engine.run_one(e, 0):
+                    time.sleep(1)
+        finally:
+            self.engine.timeout = saved
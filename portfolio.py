@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+import itertools
+import json
+import os
+import re
+import time
+from subprocess import Popen
+
+from adaptive import fit_amdahl
+from expfw import Experiment, harness_line
+from exp import (ExpLDD, ExpLDDChaining, ExpLDDPar, ExpBDD, ExpLDDSatF, ExpLDDSatBS,
+                 PNML2LTSSYM, split_order)
+from noise import is_tainted
+
+
+###
+# Portfolio race: run several strategies for the same model at the same time,
+# each on its own share of the cores, and take the first valid answer.
+# The other runs are killed. Which split of the cores over the strategies
+# minimizes the expected time-to-answer is learned per model class from the
+# results of the normal experiments.
+###
+
+# The strategies are the methods as returned by split_order (without the order)
+STRATEGIES = ["ldd-sat", "ldd-chaining", "ldd-par", "bdd-sat", "otf-ldd-sat"]
+PORTFOLIOFILE = "portfolio.json"
+
+
+def make_experiment(strategy, directory, model, order, workers):
+    """Create the experiment of <strategy> for <model> (the name of the PNML file)
+    with the variable <order> ("rf" or "rbs").
+    """
+    base = "{}/{}".format(directory, model)
+    group = "{}-{}".format(model, order)
+    if strategy == "ldd-sat":
+        return ExpLDD(group, workers, "{}-{}.ldd".format(base, order))
+    elif strategy == "ldd-chaining":
+        return ExpLDDChaining(group, workers, "{}-{}.ldd".format(base, order))
+    elif strategy == "ldd-par":
+        return ExpLDDPar(group, workers, "{}-{}.ldd".format(base, order))
+    elif strategy == "bdd-sat":
+        return ExpBDD(group, workers, "{}-{}.bdd".format(base, order))
+    elif strategy == "otf-ldd-sat" and order == "rf":
+        return ExpLDDSatF(PNML2LTSSYM, model, workers, base + ".pnml")
+    elif strategy == "otf-ldd-sat" and order == "rbs":
+        return ExpLDDSatBS(PNML2LTSSYM, model, workers, base + ".pnml")
+    raise ValueError("unknown strategy {}".format(strategy))
+
+
+def model_class(model):
+    """The class of a model is its family, e.g. "Kanban" for "Kanban-PT-0050".
+    """
+    return re.split(r'-(?:PT|COL)-|-', model, maxsplit=1)[0]
+
+
+###
+# Learning from history
+###
+
+class History(object):
+    """Times of the normal experiments: (model, order, method) -> {workers: time}.
+    A timeout is recorded as the timeout.
+    """
+    def __init__(self, engine, iterations=1):
+        self.timeout = engine.timeout
+        self.times = {}
+        done = {}
+        for e in engine:
+            model, order, method = split_order(e.group, e.method)
+            for i in range(min(iterations, len(engine.results))):
+                status, value = engine.get_status(e, i)
+                if status == Experiment.DONE and not is_tainted(value):
+                    done.setdefault((model, order, method, e.workers), []).append(value['time'])
+                elif status == Experiment.TIMEOUT and value >= engine.timeout:
+                    done.setdefault((model, order, method, e.workers), []).append(value)
+        for (model, order, method, workers), times in done.items():
+            times.sort()
+            self.times.setdefault((model, order, method), {})[workers] = times[len(times)//2]
+
+    def models(self):
+        return sorted({(model, order) for model, order, method in self.times})
+
+    def predict(self, model, order, method, workers):
+        """Predicted time of <method> with <workers> workers, the timeout if unknown.
+        """
+        points = self.times.get((model, order, method), {})
+        if workers in points:
+            return points[workers]
+        done = [(w, t) for w, t in points.items() if t < self.timeout]
+        if len(done) == 0:
+            return self.timeout
+        a, b = fit_amdahl(done)
+        return min(self.timeout, a + b / workers)
+
+
+def splits(strategies, cores, grid):
+    """All ways to give each strategy a number of workers from <grid> (or none),
+    using at most <cores> cores in total.
+    """
+    for counts in itertools.product([0] + sorted(grid), repeat=len(strategies)):
+        if 0 < sum(counts) <= cores:
+            yield {s: w for s, w in zip(strategies, counts) if w > 0}
+
+
+def expected_time(history, models, split):
+    """Mean over <models> of the time-to-answer of the race with <split>.
+    """
+    total = 0.0
+    for model, order in models:
+        total += min(history.predict(model, order, s, w) for s, w in split.items())
+    return total / len(models)
+
+
+def learn(history, strategies, cores, grid):
+    """Return {class: (split, expected time)} with the best split for every model class.
+    """
+    classes = {}
+    for model, order in history.models():
+        classes.setdefault(model_class(model), []).append((model, order))
+    res = {}
+    for c, models in sorted(classes.items()):
+        best = min(splits(strategies, cores, grid), key=lambda split: (expected_time(history, models, split), sum(split.values())))
+        res[c] = (best, expected_time(history, models, best))
+    return res
+
+
+def load_portfolio(filename=PORTFOLIOFILE):
+    if os.path.isfile(filename):
+        with open(filename) as f:
+            return json.load(f)
+    return {}
+
+
+def save_portfolio(learned, cores, filename=PORTFOLIOFILE):
+    portfolio = load_portfolio(filename)
+    portfolio[str(cores)] = {c: {'split': split, 'expected': t} for c, (split, t) in learned.items()}
+    with open(filename, 'w') as f:
+        json.dump(portfolio, f, indent=1, sort_keys=True)
+
+
+def default_split(strategies, cores):
+    """Divide the cores evenly over the strategies.
+    """
+    share = max(1, cores // len(strategies))
+    return {s: share for s in strategies[:cores]}
+
+
+###
+# The race
+###
+
+def assign_cores(split):
+    """Assign disjoint sets of cores to the strategies, or None if there are too few cores.
+    """
+    available = sorted(os.sched_getaffinity(0))
+    if sum(split.values()) > len(available):
+        return None
+    res = {}
+    for s, w in split.items():
+        res[s] = set(available[:w])
+        available = available[w:]
+    return res
+
+
+def race(experiments, logdir, timeout, states=None, cores=None):
+    """Run <experiments> (strategy -> Experiment) at the same time and return
+    (strategy, result) of the first valid result, or (None, None).
+    A result is valid if it is done and has the expected number of <states> (if known).
+    <cores> optionally pins each strategy to a set of cores.
+    """
+    if not os.path.exists(logdir):
+        os.makedirs(logdir)
+    running = {}
+    start = time.time()
+    for s, e in experiments.items():
+        logfile = "{}/race-{}".format(logdir, e.name)
+        out = open(logfile, 'w')
+        preexec = None
+        if cores is not None:
+            preexec = (lambda c: lambda: os.sched_setaffinity(0, c))(cores[s])
+        try:
+            p = Popen(e.call, stdout=out, stderr=out, preexec_fn=preexec)
+        except OSError:
+            out.close()
+            print("{}: OS Error, typically caused by a missing executable.".format(s))
+            continue
+        running[s] = (e, p, out, logfile)
+    winner = None, None
+    try:
+        while len(running) > 0 and winner[0] is None:
+            if time.time() - start > timeout:
+                print("Race timeout.")
+                break
+            for s in list(running):
+                e, p, out, logfile = running[s]
+                if p.poll() is None:
+                    continue
+                del running[s]
+                out.write(harness_line({'exitcode': p.returncode, 'wall': time.time() - start}))
+                out.close()
+                status, value = e.get_status(logfile)
+                if status != Experiment.DONE:
+                    print("{}: no result after {:.2f} seconds.".format(s, time.time() - start))
+                elif states is not None and value.get('states') is not None and value['states'] != states:
+                    print("{}: \033[1;31mwrong number of states {} (expected {})\033[m.".format(s, value['states'], states))
+                else:
+                    winner = s, value
+                    break
+            time.sleep(0.01)
+    finally:
+        # kill the others
+        for s, (e, p, out, logfile) in running.items():
+            p.terminate()
+            p.wait()
+            out.close()
+    return winner
+
+
+class Portfolio(object):
+    def __init__(self, engine, directory, workers, iterations=1, strategies=STRATEGIES, filename=PORTFOLIOFILE):
+        """Portfolio races for the models in <directory>, with the worker counts in <workers>,
+        learning from the results in <engine>.
+        """
+        self.engine = engine
+        self.directory = directory
+        self.workers = workers
+        self.iterations = iterations
+        self.strategies = strategies
+        self.filename = filename
+        self.history = None
+
+    def get_history(self):
+        if self.history is None:
+            self.history = History(self.engine, self.iterations)
+        return self.history
+
+    def learn(self, cores):
+        learned = learn(self.get_history(), self.strategies, cores, [w for w in self.workers if w <= cores])
+        save_portfolio(learned, cores, self.filename)
+        for c, (split, t) in learned.items():
+            print("{}: {} (expected {:.2f} seconds)".format(
+                c, ", ".join("{} {}".format(s, w) for s, w in sorted(split.items())), t))
+
+    def split(self, model, cores):
+        learned = load_portfolio(self.filename).get(str(cores), {})
+        c = model_class(model)
+        if c in learned:
+            return learned[c]['split']
+        return default_split(self.strategies, cores)
+
+    def known_states(self, model, order):
+        """The number of states of <model> according to the normal experiments, or None.
+        """
+        for e in self.engine:
+            m, o, method = split_order(e.group, e.method)
+            if m != model:
+                continue
+            for i in range(min(self.iterations, len(self.engine.results))):
+                status, value = self.engine.get_status(e, i)
+                if status == Experiment.DONE and value.get('states') is not None:
+                    return value['states']
+        return None
+
+    def race(self, model, cores, order="rf", pin=True):
+        split = self.split(model, cores)
+        experiments = {s: make_experiment(s, self.directory, model, order, w) for s, w in split.items()}
+        experiments = {s: e for s, e in experiments.items() if all(os.path.isfile(f) for f in e.get_inputs())}
+        if len(experiments) == 0:
+            print("No input files for {}.".format(model))
+            return None, None
+        print("Race for {}: {}.".format(model, ", ".join("{} {}".format(s, e.workers) for s, e in sorted(experiments.items()))))
+        cpus = assign_cores({s: e.workers for s, e in experiments.items()}) if pin else None
+        start = time.time()
+        s, value = race(experiments, os.path.join(self.engine.logdir, "race"), self.engine.timeout,
+                        self.known_states(model, order), cpus)
+        if s is not None:
+            print("Winner {} after {:.2f} seconds: {}.".format(s, time.time() - start, experiments[s].get_text(value)))
+        return s, value
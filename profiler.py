@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+import os
+import re
+import shutil
+import subprocess
+
+from counters import PERF
+
+
+###
+# Sampling profiles of selected experiments.
+# The tool is sampled with "perf record" (call graphs of all threads), or, for
+# lddmc/bddmc built with gperftools (HAVE_PROFILER), with its --profiler option,
+# which only profiles the reachability. The samples are stored as folded stacks
+# ("root;...;leaf count" per line, as used by flamegraph.pl) in <log>.folded.
+# A differential profile of two runs (e.g. 1 and 48 workers of the same model)
+# gives per function the share of the samples in both runs, so we can see which
+# Sylvan/Lace functions take a larger share when they stop scaling.
+# The profilers are collectors (see counters.py). Profiled runs are slower, so
+# they are not used as results (see run_profiles).
+###
+
+PPROF = "pprof"
+FREQUENCY = 999
+
+
+def fold_perf_script(contents):
+    """Fold the output of "perf script" into {stack: count}.
+    """
+    res = {}
+    for block in re.split(r'\n\s*\n', contents):
+        lines = block.strip("\n").splitlines()
+        if len(lines) < 2 or lines[0].startswith("#"):
+            continue
+        frames = []
+        for line in lines[1:]:
+            parts = line.strip().split(None, 1)
+            if len(parts) < 2:
+                continue
+            sym = parts[1]
+            # "sym+0x12 (/path/dso)" -> sym, or the dso if the symbol is unknown
+            m = re.match(r'(.*?) \((.*)\)$', sym)
+            if m:
+                sym, dso = m.group(1), m.group(2)
+                if sym == "[unknown]":
+                    sym = "[{}]".format(os.path.basename(dso))
+            sym = re.sub(r'\+0x[0-9a-f]+$', '', sym)
+            frames.append(sym)
+        if len(frames) > 0:
+            # perf script prints the leaf first
+            stack = ";".join(reversed(frames))
+            res[stack] = res.get(stack, 0) + 1
+    return res
+
+
+def read_folded(filename):
+    res = {}
+    with open(filename) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack != "":
+                res[stack] = res.get(stack, 0) + int(count)
+    return res
+
+
+def write_folded(folded, filename):
+    with open(filename, 'w') as f:
+        for stack, count in sorted(folded.items()):
+            f.write("{} {}\n".format(stack, count))
+
+
+def shares(folded):
+    """Return ({function: inclusive share}, {function: self share}) of the samples.
+    """
+    total = sum(folded.values())
+    inclusive = {}
+    own = {}
+    if total == 0:
+        return inclusive, own
+    for stack, count in folded.items():
+        frames = stack.split(";")
+        for fn in set(frames):
+            inclusive[fn] = inclusive.get(fn, 0) + count / total
+        own[frames[-1]] = own.get(frames[-1], 0) + count / total
+    return inclusive, own
+
+
+def diff_profiles(a, b):
+    """Compare the folded profiles <a> and <b>.
+    Returns a list of (function, self share in a, self share in b, inclusive share in a,
+    inclusive share in b), the largest change of the self share first.
+    """
+    inc_a, own_a = shares(a)
+    inc_b, own_b = shares(b)
+    functions = set(inc_a) | set(inc_b)
+    res = [(fn, own_a.get(fn, 0.0), own_b.get(fn, 0.0), inc_a.get(fn, 0.0), inc_b.get(fn, 0.0)) for fn in functions]
+    res.sort(key=lambda x: (-abs(x[2] - x[1]), x[0]))
+    return res
+
+
+def write_diff_folded(a, b, filename):
+    """Write the stacks with the counts in <a> and <b> (the input of difffolded/flamegraph.pl),
+    with the counts of <b> scaled to the total of <a>.
+    """
+    total_a = sum(a.values())
+    total_b = sum(b.values())
+    scale = total_a / total_b if total_b > 0 else 1.0
+    with open(filename, 'w') as f:
+        for stack in sorted(set(a) | set(b)):
+            f.write("{} {} {}\n".format(stack, a.get(stack, 0), round(b.get(stack, 0) * scale)))
+
+
+class PerfRecord(object):
+    def __init__(self, frequency=FREQUENCY, perf=PERF, keep=False):
+        """Sample the tool with perf record at <frequency> Hz.
+        With <keep>, the perf.data file is kept next to the log.
+        """
+        self.frequency = frequency
+        self.perf = perf
+        self.keep = keep
+        self.available = None
+
+    def probe(self):
+        if self.available is None:
+            self.available = False
+            if shutil.which(self.perf) is None:
+                print("Sampling profiler unavailable: {} not found.".format(self.perf))
+                return False
+            try:
+                p = subprocess.run([self.perf, "record", "-q", "-o", os.devnull, "--", "true"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+                self.available = p.returncode == 0
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            if not self.available:
+                print("Sampling profiler unavailable (see /proc/sys/kernel/perf_event_paranoid).")
+        return self.available
+
+    def wrap(self, call, filename):
+        if not self.probe():
+            return call
+        return [self.perf, "record", "-q", "-F", str(self.frequency), "-g",
+                "-o", "{}.perf.data".format(filename), "--"] + list(call)
+
+    def collect(self, filename):
+        data = "{}.perf.data".format(filename)
+        if not self.probe() or not os.path.isfile(data):
+            return {}
+        try:
+            p = subprocess.run([self.perf, "script", "-i", data], stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+        except OSError:
+            return {}
+        folded = fold_perf_script(p.stdout.decode(errors='replace'))
+        write_folded(folded, "{}.folded".format(filename))
+        if not self.keep:
+            os.unlink(data)
+        return {'profile_samples': sum(folded.values())}
+
+
+class GperfProfile(object):
+    def __init__(self, pprof=PPROF):
+        """Use the --profiler option of lddmc/bddmc (gperftools, only if built with HAVE_PROFILER).
+        The profile is folded with "pprof --collapsed".
+        """
+        self.pprof = pprof
+        self.supported = {}
+
+    def probe(self, exe):
+        """The tool <exe> has the --profiler option.
+        """
+        if exe not in self.supported:
+            try:
+                p = subprocess.run([exe, "--help"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60)
+                self.supported[exe] = b"--profiler" in p.stdout
+            except (OSError, subprocess.TimeoutExpired):
+                self.supported[exe] = False
+            if not self.supported[exe]:
+                print("{} is not built with the profiler (HAVE_PROFILER).".format(exe))
+        return self.supported[exe]
+
+    def wrap(self, call, filename):
+        self.exe = call[0]
+        if not self.probe(call[0]):
+            return call
+        return [call[0], "--profiler", "{}.prof".format(filename)] + list(call[1:])
+
+    def collect(self, filename):
+        prof = "{}.prof".format(filename)
+        if not os.path.isfile(prof) or shutil.which(self.pprof) is None:
+            return {}
+        try:
+            p = subprocess.run([self.pprof, "--collapsed", self.exe, prof], stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+        except OSError:
+            return {}
+        folded = {}
+        for line in p.stdout.decode(errors='replace').splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack != "" and count.isdigit():
+                folded[stack] = folded.get(stack, 0) + int(count)
+        write_folded(folded, "{}.folded".format(filename))
+        return {'profile_samples': sum(folded.values())}
+
+
+def profile_dir(engine):
+    return os.path.join(engine.logdir, "profile")
+
+
+def run_profiles(engine, experiments, profiler):
+    """Run <experiments> with the <profiler>, with the logs in <logdir>/profile
+    (so the slower profiled runs are not used as results).
+    """
+    directory = profile_dir(engine)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    for e in experiments:
+        e.run_experiment(engine.timeout, os.path.join(directory, e.name), stager=engine.stager,
+                         collectors=[profiler])
+
+
+def report_diff(engine, experiments, w1, w2, top=20):
+    """Compare the profiles of the experiments with <w1> and <w2> workers of every group and method.
+    Writes <group>-<method>-<w1>-vs-<w2>.diff next to the profiles and prints the functions
+    whose share of the samples changed most.
+    """
+    directory = profile_dir(engine)
+    runs = {(e.group, e.method, e.workers): os.path.join(directory, e.name + ".folded") for e in experiments}
+    for (group, method, workers), folded in sorted(runs.items()):
+        if workers != w1 or (group, method, w2) not in runs:
+            continue
+        other = runs[(group, method, w2)]
+        if not os.path.isfile(folded) or not os.path.isfile(other):
+            print("{} {}: no profiles for {} and {} workers.".format(group, method, w1, w2))
+            continue
+        a = read_folded(folded)
+        b = read_folded(other)
+        write_diff_folded(a, b, os.path.join(directory, "{}-{}-{}-vs-{}.diff".format(group, method, w1, w2)))
+        print("{} {}: {} vs {} workers ({} and {} samples)".format(group, method, w1, w2, sum(a.values()), sum(b.values())))
+        print("  self {0:>6} self {1:>6}  total {0:>6} total {1:>6}  function".format(w1, w2))
+        for fn, own_a, own_b, inc_a, inc_b in diff_profiles(a, b)[:top]:
+            print("  {:10.1%} {:10.1%}  {:11.1%} {:11.1%}  {}".format(own_a, own_b, inc_a, inc_b, fn))
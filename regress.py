@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+import itertools
+import json
+import math
+import re
+import sys
+
+from expfw import Experiment
+from exp import split_order
+from noise import is_tainted
+
+
+# Default relative change of the median time that counts as a regression/improvement
+THRESHOLD = 0.10
+# Significance level of the test
+ALPHA = 0.05
+# Times are at least this many seconds in the ratio (the tools report times of 0.0 seconds)
+RESOLUTION = 0.01
+# The stores in the repository, each CSV file with the cache file of the same experiments (see check)
+STORES = [("results.csv", "cache-cluster.json"), ("results48.csv", "cache-48.json")]
+# Up to this many permutations the exact p-value is computed, otherwise the normal approximation
+MAX_PERMUTATIONS = 100000
+
+
+###
+# Loading result stores.
+# A result store is either a CSV file as written by the 'csv' subcommand
+# ("group; method; workers; time; states", with states -1 for a timeout)
+# or a cache file as written by the 'cache' subcommand.
+# Every sample is a triple (status, time, states).
+###
+
+EXP_NAME = re.compile(r'^(.*?)-((?:rf-|rbs-)?(?:otf-)?(?:ldd|bdd|mdd)-(?:sat|par|chaining|bfs)(?:-stats)?)(?:-(\d+))?$')
+
+
+def normalize(group, method, workers):
+    """Return the key (model, order, method, workers).
+    """
+    return split_order(group, method) + (int(workers),)
+
+
+def load_csv(filename):
+    res = {}
+    with open(filename) as f:
+        for line in f:
+            fields = [x.strip() for x in line.split(";")]
+            if len(fields) < 5:
+                continue
+            group, method, workers, t, states = fields[:5]
+            key = normalize(group, method, workers)
+            if states == "-1":
+                res.setdefault(key, []).append((Experiment.TIMEOUT, float(t), None))
+            else:
+                # the CSV has states 0 if the number of states is unknown
+                res.setdefault(key, []).append((Experiment.DONE, float(t), int(states) or None))
+    return res
+
+
+def load_cache(filename):
+    res = {}
+    with open(filename) as f:
+        results = json.load(f)
+    for it in results:
+        for name, (status, value) in it.items():
+            m = EXP_NAME.match(name)
+            if m is None:
+                continue
+            key = normalize(m.group(1), m.group(2), m.group(3) or 1)
+            if status == Experiment.DONE and not is_tainted(value):
+                res.setdefault(key, []).append((status, value['time'], value.get('states') or None))
+            elif status == Experiment.TIMEOUT:
+                res.setdefault(key, []).append((status, float(value), None))
+            elif status == Experiment.ERROR:
+                res.setdefault(key, []).append((status, None, None))
+    return res
+
+
+def load_store(filename):
+    if filename.endswith(".json"):
+        return load_cache(filename)
+    else:
+        return load_csv(filename)
+
+
+###
+# Gehan's generalized Wilcoxon test for right-censored samples.
+# A timeout is a censored observation: we only know the time exceeds the timeout.
+###
+
+def definitely_less(x, y):
+    """Compare two observations (time, censored). True if x is surely smaller than y.
+    """
+    tx, cx = x
+    ty, cy = y
+    if cx:
+        return False
+    return tx < ty or (tx == ty and cy)
+
+
+def gehan_scores(pooled):
+    scores = []
+    for x in pooled:
+        less = sum(1 for y in pooled if definitely_less(y, x))
+        more = sum(1 for y in pooled if definitely_less(x, y))
+        scores.append(less - more)
+    return scores
+
+
+def gehan_test(old, new):
+    """Two-sided test whether <new> tends to be larger or smaller than <old>.
+    Returns (p-value, minimal attainable p-value).
+    """
+    pooled = old + new
+    n = len(pooled)
+    k = len(new)
+    scores = gehan_scores(pooled)
+    observed = sum(scores[len(old):])
+    if math.comb(n, k) <= MAX_PERMUTATIONS:
+        # exact permutation distribution
+        stats = [sum(scores[i] for i in c) for c in itertools.combinations(range(n), k)]
+        p = sum(1 for s in stats if abs(s) >= abs(observed)) / len(stats)
+        extreme = max(abs(s) for s in stats)
+        p_min = sum(1 for s in stats if abs(s) >= extreme) / len(stats)
+        return p, p_min
+    # normal approximation with the permutational variance (Mantel)
+    var = len(old) * k / (n * (n - 1)) * sum(s * s for s in scores)
+    if var == 0:
+        return 1.0, 0.0
+    z = abs(observed) / math.sqrt(var)
+    return math.erfc(z / math.sqrt(2)), 0.0
+
+
+def median(xs):
+    xs = sorted(xs)
+    n = len(xs)
+    return xs[n//2] if n % 2 == 1 else (xs[n//2-1] + xs[n//2]) / 2
+
+
+###
+# Comparing two result stores
+###
+
+class Change(object):
+    REGRESSION = "regression"
+    IMPROVEMENT = "improvement"
+    UNCHANGED = "unchanged"
+
+    def __init__(self, key, kind, old, new, ratio=None, p=None, tested=True, note=""):
+        self.key = key
+        self.kind = kind
+        self.old = old
+        self.new = new
+        self.ratio = ratio
+        self.p = p
+        self.tested = tested
+        self.note = note
+
+    def effect(self):
+        """Effect size: absolute log of the ratio of the median times.
+        Status changes (errors) are ranked first.
+        """
+        if self.ratio is None:
+            return float('inf')
+        return abs(math.log(self.ratio))
+
+    def describe(self, samples):
+        times = [t for s, t, _ in samples if s != Experiment.ERROR]
+        errors = sum(1 for s, _, _ in samples if s == Experiment.ERROR)
+        timeouts = sum(1 for s, _, _ in samples if s == Experiment.TIMEOUT)
+        if len(times) == 0:
+            return "error"
+        res = "{:.2f}".format(median(times))
+        if timeouts > 0:
+            res += " ({}/{} TO)".format(timeouts, len(samples))
+        if errors > 0:
+            res += " ({}/{} ERR)".format(errors, len(samples))
+        return res
+
+    def __str__(self):
+        model, order, method, workers = self.key
+        res = "{:<12} {} {} {} {}: {} -> {}".format(self.kind.upper(), model, order, method, workers,
+                                                   self.describe(self.old), self.describe(self.new))
+        if self.ratio is not None:
+            res += ", x{:.2f}".format(self.ratio)
+        if self.p is not None:
+            res += ", p={:.3f}".format(self.p)
+        if not self.tested:
+            res += " (too few repetitions for the test)"
+        if self.note:
+            res += " ({})".format(self.note)
+        return res
+
+
+def censor(samples, limit):
+    """Censor the observations (time, censored) of at least <limit> seconds at <limit>.
+    """
+    if limit is None:
+        return samples
+    return [(limit, True) if t >= limit else (t, c) for t, c in samples]
+
+
+def compare_samples(key, old, new, threshold=THRESHOLD, alpha=ALPHA):
+    old_ok = [(t, s == Experiment.TIMEOUT) for s, t, _ in old if s != Experiment.ERROR]
+    new_ok = [(t, s == Experiment.TIMEOUT) for s, t, _ in new if s != Experiment.ERROR]
+    # the stores may have different timeouts: compare both up to the lowest timeout
+    timeouts = [t for t, c in old_ok + new_ok if c]
+    limit = min(timeouts) if len(timeouts) > 0 else None
+    old_ok = censor(old_ok, limit)
+    new_ok = censor(new_ok, limit)
+    # errors only appearing on one side are status changes
+    if len(new_ok) == 0 and len(old_ok) > 0:
+        return Change(key, Change.REGRESSION, old, new, note="now fails")
+    if len(old_ok) == 0:
+        if len(new_ok) > 0:
+            return Change(key, Change.IMPROVEMENT, old, new, note="no longer fails")
+        return Change(key, Change.UNCHANGED, old, new)
+    # different state space sizes are always reported (0 or None is unknown)
+    old_states = {st for s, _, st in old if st}
+    new_states = {st for s, _, st in new if st}
+    if len(old_states) > 0 and len(new_states) > 0 and old_states != new_states:
+        return Change(key, Change.REGRESSION, old, new, note="different number of states")
+    # all timeouts on both sides: nothing to compare
+    if all(c for _, c in old_ok) and all(c for _, c in new_ok):
+        return Change(key, Change.UNCHANGED, old, new)
+    # median times, timeouts count as their timeout (a lower bound)
+    ratio = max(median([t for t, _ in new_ok]), RESOLUTION) / max(median([t for t, _ in old_ok]), RESOLUTION)
+    p, p_min = gehan_test(old_ok, new_ok)
+    # with too few repetitions the test can never be significant, then use the threshold alone
+    tested = p_min <= alpha
+    significant = p <= alpha or not tested
+    if ratio > 1 + threshold and significant:
+        return Change(key, Change.REGRESSION, old, new, ratio, p, tested)
+    if ratio < 1 / (1 + threshold) and significant:
+        return Change(key, Change.IMPROVEMENT, old, new, ratio, p, tested)
+    return Change(key, Change.UNCHANGED, old, new, ratio, p, tested)
+
+
+def compare(old, new, threshold=THRESHOLD, alpha=ALPHA):
+    """Compare two result stores (dicts from load_store) on matching configurations.
+    Returns the list of changes, ranked by effect size.
+    """
+    changes = [compare_samples(key, old[key], new[key], threshold, alpha)
+               for key in old.keys() & new.keys()]
+    changes.sort(key=lambda c: (-c.effect(), c.key))
+    return changes
+
+
+def check(stores=STORES):
+    """Compare the stores in the repository: every store with itself (no changes)
+    and the CSV file with the cache file. Returns True if all comparisons succeed.
+    """
+    ok = True
+    for csv_file, cache_file in stores:
+        loaded = {f: load_store(f) for f in (csv_file, cache_file)}
+        for f, store in loaded.items():
+            changes = [c for c in compare(store, store) if c.kind != Change.UNCHANGED]
+            print("{} with itself: {} configurations, {} changes.".format(f, len(store), len(changes)))
+            ok = ok and len(changes) == 0
+        changes = compare(loaded[csv_file], loaded[cache_file])
+        print("{} with {}: {} configurations, {} regressions, {} improvements.".format(
+            csv_file, cache_file, len(changes), sum(1 for c in changes if c.kind == Change.REGRESSION),
+            sum(1 for c in changes if c.kind == Change.IMPROVEMENT)))
+    return ok
+
+
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def usage():
+    eprint("Valid calls:")
+    eprint("regress.py <OLD> <NEW>             Compare two result stores (CSV or cache JSON)")
+    eprint("regress.py <OLD> <NEW> <THRESHOLD> Idem, with a relative threshold (default {})".format(THRESHOLD))
+    eprint("regress.py check                   Compare the result stores of the repository (a self-test)")
+    eprint("Exits with status 1 if there are regressions.")
+
+
+def main():
+    if sys.argv[1:] == ["check"]:
+        sys.exit(0 if check() else 1)
+    if len(sys.argv) not in (3, 4):
+        usage()
+        sys.exit(2)
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else THRESHOLD
+    old = load_store(sys.argv[1])
+    new = load_store(sys.argv[2])
+    changes = compare(old, new, threshold)
+    regressions = [c for c in changes if c.kind == Change.REGRESSION]
+    improvements = [c for c in changes if c.kind == Change.IMPROVEMENT]
+    for c in changes:
+        if c.kind != Change.UNCHANGED:
+            print(c)
+    print("Matched {} configurations ({} only in old, {} only in new): {} regressions, {} improvements."
+          .format(len(changes), len(old.keys() - new.keys()), len(new.keys() - old.keys()),
+                  len(regressions), len(improvements)))
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
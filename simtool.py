@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+import os
+import re
+import signal
+import sys
+import time
+
+
+###
+# A stand-in for lddmc, bddmc, medmc, pnml2lts-sym and dve2lts-sym.
+# It prints the same output as the real tools (as far as exp.py parses it),
+# so the harness can be tested without spending hours of real runs.
+#
+# Called as "simtool.py <TOOL> <ARGS>", or via a symlink named after the tool
+# (see make_tools). The behaviour is read from the name of the model file,
+# which consists of '-'-separated tokens, for example "Sim-t2.5-p0.9-s1000-0001.pnml":
+# - t<SECONDS>  runtime with 1 worker (default 0.01)
+# - p<FRACTION> parallel fraction, runtime with w workers is t*(1-p+p/w) (default 0.9)
+# - s<STATES>   number of states (default 1000)
+# - n<NODES>    number of nodes of the state space (default 100)
+# - m<MB>       memory to allocate and touch (default 0)
+# - x<CODE>     exit code after a normal run (default 0)
+# - hang        never finish (until the harness kills us)
+# - busy        spin instead of sleeping, so the runtime is user time
+# - segv        crash with a segmentation fault halfway
+# - oom         run out of memory halfway (table full)
+# - invalid     the input file is invalid
+# Other tokens (like the model name or a number) are ignored.
+###
+
+TOOLS = ["lddmc", "bddmc", "medmc", "pnml2lts-sym", "dve2lts-sym",
+         "lddmc-stats", "bddmc-stats"]
+
+DEFAULTS = {'t': 0.01, 'p': 0.9, 's': 1000, 'n': 100, 'm': 0, 'x': 0}
+FLAGS = ["hang", "busy", "segv", "oom", "invalid"]
+
+TOKEN = re.compile(r'^([tpsnmx])(\d+(?:\.\d+)?)$')
+
+
+def parse_spec(model):
+    """Return the behaviour (a dict) encoded in the name of the model file.
+    """
+    spec = dict(DEFAULTS)
+    base = os.path.splitext(os.path.basename(model))[0]
+    for token in base.split("-"):
+        m = TOKEN.match(token)
+        if m is not None:
+            v = float(m.group(2))
+            spec[m.group(1)] = int(v) if m.group(1) in "snmx" else v
+        elif token in FLAGS:
+            spec[token] = True
+    return spec
+
+
+def parse_args(tool, args):
+    """Return (model, workers, strategy) from the arguments of the tool.
+    """
+    workers = 1
+    strategy = "sat"
+    model = args[-1] if len(args) > 0 else ""
+    for i, arg in enumerate(args):
+        if arg == "-w" and i + 1 < len(args):
+            workers = int(args[i+1])
+        elif arg.startswith("--lace-workers="):
+            workers = int(arg.split("=", 1)[1])
+        elif arg == "-s" and i + 1 < len(args):
+            strategy = args[i+1]
+    if tool == "medmc":
+        workers = 1
+    return model, workers, strategy
+
+
+def runtime(spec, workers):
+    return spec['t'] * (1 - spec['p'] + spec['p'] / max(workers, 1))
+
+
+def compute(seconds, busy=False):
+    if busy:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            pass
+    else:
+        time.sleep(seconds)
+
+
+def allocate(mb):
+    if mb <= 0:
+        return None
+    data = bytearray(mb << 20)
+    # touch every page so it counts in the resident set
+    for i in range(0, len(data), 4096):
+        data[i] = 1
+    return data
+
+
+def crash(out):
+    out.flush()
+    os.kill(os.getpid(), signal.SIGSEGV)
+
+
+class Sylvan(object):
+    """Output of the Sylvan examples lddmc and bddmc.
+    """
+    def __init__(self, tool, out):
+        self.tool = tool
+        self.out = out
+        self.start = time.time()
+
+    def info(self, line):
+        self.out.write("[{:8.2f}] {}\n".format(time.time() - self.start, line))
+        self.out.flush()
+
+    def run(self, spec, model, workers, strategy):
+        self.out.write("Setting Sylvan main tables memory to 16.000 GB max.\n")
+        if spec.get('invalid'):
+            self.out.write("Invalid input file!\n")
+            return 255
+        self.info("Read file '{}'".format(model))
+        if self.tool.startswith("bddmc"):
+            self.info("39 integers per state, 117 bits per state, 64 transition groups")
+        else:
+            self.info("39 integers per state, 64 transition groups")
+        if spec.get('hang'):
+            while True:
+                time.sleep(3600)
+        data = allocate(spec['m'])
+        t1 = time.time()
+        if spec.get('segv') or spec.get('oom'):
+            compute(runtime(spec, workers) / 2, spec.get('busy'))
+            if spec.get('oom'):
+                self.out.write("Unique table full, {} of {} buckets filled!\n".format(1 << 26, 1 << 26))
+                return 1
+            crash(self.out)
+        compute(runtime(spec, workers), spec.get('busy'))
+        t2 = time.time()
+        self.info("{} Time: {:f}".format(strategy.upper(), t2 - t1))
+        self.info("Final states: {:,} states".format(spec['s']))
+        self.info("Memory usage: {:.2f} MB".format(spec['m'] + 3.0))
+        del data
+        return spec['x']
+
+
+class Meddly(object):
+    """Output of medmc.
+    """
+    def __init__(self, tool, out):
+        self.tool = tool
+        self.out = out
+
+    def run(self, spec, model, workers, strategy):
+        if spec.get('invalid'):
+            self.out.write("Caught MEDDLY error: Invalid file in mdd.cc:42\n")
+            return 255
+        self.out.write("Making a domain of 39 levels; there are 64 transition relations (events)\n")
+        self.out.flush()
+        if spec.get('hang'):
+            while True:
+                time.sleep(3600)
+        data = allocate(spec['m'])
+        t1 = time.time()
+        if spec.get('segv') or spec.get('oom'):
+            compute(runtime(spec, workers) / 2, spec.get('busy'))
+            if spec.get('oom'):
+                self.out.write("Caught MEDDLY error: Insufficient memory in node_storage.cc:127\n")
+                return 255
+            crash(self.out)
+        compute(runtime(spec, workers), spec.get('busy'))
+        t2 = time.time()
+        self.out.write("MEDDLY Time: {:f}\n".format(t2 - t1))
+        self.out.write("States: {}\n".format(spec['s']))
+        del data
+        return spec['x']
+
+
+class LTSmin(object):
+    """Output of pnml2lts-sym and dve2lts-sym.
+    """
+    def __init__(self, tool, out):
+        self.tool = tool
+        self.out = out
+        self.start = time.time()
+
+    def info(self, line):
+        self.out.write("{}, {:.3f}: {}\n".format(self.tool, time.time() - self.start, line))
+        self.out.flush()
+
+    def took(self, what, real, user):
+        self.info("{} took {:.3f} real {:.3f} user {:.3f} sys".format(what, real, user, 0.0))
+
+    def run(self, spec, model, workers, strategy):
+        self.info("opening {}".format(model))
+        if spec.get('invalid'):
+            self.info("Make sure the initial marking fits in a signed 32-bit integer")
+            return 255
+        self.info("state vector length is 39; there are 64 groups")
+        self.info("Creating a multi-core ListDD domain.")
+        self.info("got initial state")
+        if spec.get('hang'):
+            while True:
+                time.sleep(3600)
+        data = allocate(spec['m'])
+        t1 = time.time()
+        if spec.get('segv'):
+            compute(runtime(spec, workers) / 2, spec.get('busy'))
+            self.info("segmentation fault")
+            crash(self.out)
+        if spec.get('oom'):
+            compute(runtime(spec, workers) / 2, spec.get('busy'))
+            self.info("MDD Unique table full, 67108864 of 67108864 buckets filled!")
+            return 1
+        compute(runtime(spec, workers), spec.get('busy'))
+        t2 = time.time()
+        user = t2 - t1 if spec.get('busy') else 0.0
+        self.took("reachability", t2 - t1, user)
+        self.info("counting visited states...")
+        self.took("counting", 0.0, 0.0)
+        self.info("state space has precisely {} states, {} nodes".format(spec['s'], spec['n']))
+        self.info("group_next: {} nodes total".format(spec['n'] * 10))
+        del data
+        return spec['x']
+
+
+def simulate(tool, args, out=sys.stdout):
+    """Behave like <tool> called with <args>, writing to <out>.
+    Returns the exit code.
+    """
+    model, workers, strategy = parse_args(tool, args)
+    spec = parse_spec(model)
+    if tool.endswith("lts-sym"):
+        return LTSmin(tool, out).run(spec, model, workers, strategy)
+    elif tool == "medmc":
+        return Meddly(tool, out).run(spec, model, workers, strategy)
+    else:
+        return Sylvan(tool, out).run(spec, model, workers, strategy)
+
+
+def make_tools(directory):
+    """Create <directory> with a symlink to this script for every tool.
+    Returns a dict tool -> path.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    me = os.path.abspath(__file__)
+    res = {}
+    for tool in TOOLS:
+        path = os.path.join(directory, tool)
+        if not os.path.lexists(path):
+            os.symlink(me, path)
+        res[tool] = path
+    return res
+
+
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def usage():
+    eprint("Valid calls:")
+    eprint("simtool.py <TOOL> <ARGS> Behave like <TOOL> ({})".format(", ".join(TOOLS)))
+    eprint("simtool.py tools <DIR>   Create <DIR> with a symlink to simtool.py for every tool")
+    eprint("<TOOL> <ARGS>            Via a symlink named after the tool")
+
+
+def main():
+    tool = os.path.basename(sys.argv[0])
+    args = sys.argv[1:]
+    if tool not in TOOLS:
+        if len(args) == 2 and args[0] == "tools":
+            make_tools(args[1])
+            return
+        if len(args) == 0 or args[0] not in TOOLS:
+            usage()
+            sys.exit(2)
+        tool = args[0]
+        args = args[1:]
+    sys.exit(simulate(tool, args))
+
+
+if __name__ == "__main__":
+    main()
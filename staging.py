@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import shutil
+import time
+
+
+###
+# Staging the input files of experiments on node-local storage.
+# The models in mcc/ are usually on a shared filesystem. Before the timed run,
+# the input files are copied (or hard-linked) to a local directory, e.g. on
+# a local disk or a tmpfs, and optionally dropped from or loaded into the
+# page cache, so that every run starts with the same I/O conditions.
+# The local directory is a store of bounded size; the least recently used
+# files are removed when it is full.
+###
+
+# What to do with the page cache before the run
+KEEP = "keep"
+DROP = "drop"
+WARM = "warm"
+
+READ_CHUNK = 1 << 20
+
+
+def parse_size(size):
+    """Parse a size like 1024, "512M" or "20G" into bytes.
+    """
+    if isinstance(size, int):
+        return size
+    size = size.strip().upper()
+    for i, unit in enumerate("KMGT"):
+        if size.endswith(unit):
+            return int(float(size[:-1]) * (1024 ** (i + 1)))
+    return int(size)
+
+
+def drop_cache(filename):
+    """Remove the (clean) pages of <filename> from the page cache.
+    """
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def warm_cache(filename):
+    """Load <filename> into the page cache.
+    """
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        while len(os.read(fd, READ_CHUNK)) > 0:
+            pass
+    finally:
+        os.close(fd)
+
+
+class LocalStore(object):
+    def __init__(self, directory, size="10G", link=False, cache=KEEP):
+        """A store of input files in the local <directory>.
+        - size: the maximum total size of the store (bytes, or e.g. "20G")
+        - link: hard-link instead of copy when possible (same filesystem)
+        - cache: "keep", "drop" or "warm" the page cache before every run
+        """
+        self.directory = directory
+        self.size = parse_size(size)
+        self.link = link
+        self.cache = cache
+        if cache not in (KEEP, DROP, WARM):
+            raise ValueError("unknown page cache mode {}".format(cache))
+
+    def local_name(self, source):
+        source = os.path.abspath(source)
+        digest = hashlib.sha1(source.encode()).hexdigest()[:16]
+        return os.path.join(self.directory, "{}-{}".format(digest, os.path.basename(source)))
+
+    def is_current(self, source, local):
+        """The local file is a copy (or link) of the current source file.
+        """
+        if not os.path.isfile(local):
+            return False
+        s = os.stat(source)
+        l = os.stat(local)
+        return s.st_size == l.st_size and int(s.st_mtime) == int(l.st_mtime)
+
+    def files(self):
+        """Return the list of (last use, size, path) of the files in the store.
+        """
+        res = []
+        for f in os.listdir(self.directory):
+            path = os.path.join(self.directory, f)
+            if f.startswith(".") or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            res.append((st.st_atime, st.st_size, path))
+        return res
+
+    def evict(self, needed, keep):
+        """Remove least recently used files until <needed> bytes fit.
+        Files in <keep> are not removed.
+        """
+        files = sorted(self.files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total + needed <= self.size:
+                break
+            if path in keep:
+                continue
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+    def copy(self, source, local):
+        # write to a temporary name first, other runs on this node may use the store
+        tmp = os.path.join(self.directory, ".{}.{}".format(os.path.basename(local), os.getpid()))
+        if self.link:
+            try:
+                os.link(source, tmp)
+                os.rename(tmp, local)
+                return
+            except OSError:
+                # different filesystem, copy instead
+                pass
+        shutil.copy2(source, tmp)
+        if self.cache == DROP:
+            # dirty pages cannot be dropped from the cache, write them first
+            fd = os.open(tmp, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        os.rename(tmp, local)
+
+    def stage(self, source, keep=()):
+        """Stage the file <source> and return the local path.
+        Returns <source> itself if it does not fit in the store.
+        """
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        local = self.local_name(source)
+        if not self.is_current(source, local):
+            size = os.path.getsize(source)
+            if size > self.size:
+                print("Not staging {}: larger than the store.".format(source))
+                return source
+            self.evict(size, keep)
+            self.copy(source, local)
+        # mark as used (access time), for the LRU eviction; the modification time stays
+        os.utime(local, (time.time(), os.stat(local).st_mtime))
+        if self.cache == DROP:
+            drop_cache(local)
+        elif self.cache == WARM:
+            warm_cache(local)
+        return local
+
+    def stage_call(self, call, inputs):
+        """Return <call> with the input files in <inputs> replaced by staged copies.
+        """
+        staged = {}
+        for source in inputs:
+            if os.path.isfile(source):
+                staged[source] = self.stage(source, keep=set(staged.values()))
+        return [staged.get(arg, arg) for arg in call]
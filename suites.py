@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import json
+import math
+import os
+import time
+
+from expfw import Experiment
+from exp import split_order
+from lddfile import read_ldd
+from noise import is_tainted
+from planner import median
+
+
+###
+# Benchmark suites, curated from the results.
+# The models of the "48" profile were chosen by hand, for runs that take
+# "interesting" times, and the list goes stale when the tools change. Here
+# suites are built from the results of a profile and saved as named filters in
+# suites.json (next to profiles.json), which a profile loads with "suite":
+# - quick: models whose runs take at most QUICK_BUDGET seconds in total (all
+#   methods and worker counts, one iteration), chosen so that the geometric mean
+#   speedups per method and worker count are close to those of all models; the
+#   largest relative error of these speedups is saved with the suite
+# - scaling: models with a time at the fewest workers in a window, as different
+#   as possible in the size of the state space, the number of variables and of
+#   transition groups (of <model>-rf.ldd, see lddfile.py) and the family
+# Only models without timeouts and errors are candidates; runs that are not done
+# (e.g. of an order without a model file) are left out.
+###
+
+QUICK_BUDGET = 600
+QUICK_ERROR = 0.1
+SCALING_WINDOW = (10, 600)
+SCALING_COUNT = 12
+
+
+def load_suites(filename):
+    if os.path.isfile(filename):
+        with open(filename) as f:
+            return json.load(f)
+    return {}
+
+
+def save_suites(filename, suites):
+    with open(filename + ".tmp", 'w') as f:
+        json.dump(suites, f, indent=1, sort_keys=True)
+    os.replace(filename + ".tmp", filename)
+
+
+class Candidate(object):
+    """The results of one model: the median time per (order, method, workers) and the cost of all its runs.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.times = {}
+        self.cost = 0.0
+        self.states = None
+        self.failed = False
+
+    def speedups(self, base):
+        """Speedup of every (order, method, workers) relative to <base> workers.
+        """
+        res = {}
+        for (order, method, workers), t in self.times.items():
+            t1 = self.times.get((order, method, base))
+            # times of 0.0 seconds (below the timer resolution) have no speedup
+            if t1 is not None and t1 > 0 and t > 0 and workers != base:
+                res[(order, method, workers)] = t1 / t
+        return res
+
+
+def candidates(engine, iterations=1):
+    """The models of <engine> with done runs and without timeouts or errors, by name.
+    """
+    values = {}
+    for e in engine:
+        model, order, method = split_order(e.group, e.method)
+        c = values.setdefault(model, Candidate(model))
+        times = []
+        walls = []
+        for i in range(min(iterations, len(engine.results))):
+            status, value = engine.get_status(e, i)
+            if status == Experiment.DONE and not is_tainted(value):
+                times.append(value['time'])
+                walls.append(value.get('wall', value['time']))
+                if value.get('states') is not None:
+                    c.states = value['states']
+            elif status == Experiment.TIMEOUT or status == Experiment.ERROR:
+                c.failed = True
+        if len(times) > 0:
+            c.times[(order, method, e.workers)] = median(times)
+            c.cost += median(walls)
+    return {m: c for m, c in values.items() if not c.failed and len(c.times) > 0}
+
+
+def mean_speedups(chosen, base):
+    """The geometric mean speedup per (order, method, workers) over the <chosen> candidates.
+    """
+    logs = {}
+    for c in chosen:
+        for key, s in c.speedups(base).items():
+            logs.setdefault(key, []).append(math.log(s))
+    return {key: math.exp(sum(xs) / len(xs)) for key, xs in logs.items()}
+
+
+def error(predicted, full):
+    """The largest relative error of the <predicted> speedups against the <full> speedups.
+    """
+    if len(full) == 0:
+        return 0.0
+    return max(abs(predicted[key] / s - 1) if key in predicted else float('inf') for key, s in full.items())
+
+
+def quick_suite(cands, base, budget=QUICK_BUDGET, target=QUICK_ERROR):
+    """Choose models of <cands> within <budget> seconds: every step adds the model that
+    reduces the error most, until the error is at most <target> or nothing fits.
+    Returns (models, seconds, error) of the prefix with the lowest error.
+    """
+    full = mean_speedups(cands.values(), base)
+    chosen = []
+    spent = 0.0
+    best = ([], 0.0, float('inf'))
+    while True:
+        options = [c for c in cands.values() if c not in chosen and spent + c.cost <= budget]
+        if len(options) == 0:
+            break
+        scored = [(error(mean_speedups(chosen + [c], base), full), c.cost, c.model, c) for c in options]
+        err, cost, model, c = min(scored, key=lambda x: x[:3])
+        chosen.append(c)
+        spent += cost
+        if err < best[2]:
+            best = ([x.model for x in chosen], spent, err)
+        if err <= target:
+            break
+    return best
+
+
+def features(c, directory):
+    """The log of the number of states, variables and transition groups of <c>.
+    """
+    res = read_ldd("{}/{}-rf.ldd".format(directory, c.model))
+    return [math.log10(max(1, x or 1)) for x in (c.states, res.get('vector_size'), res.get('groups'))]
+
+
+def family(model):
+    return model.split("-PT-")[0]
+
+
+def scaling_suite(cands, base, directory, window=SCALING_WINDOW, count=SCALING_COUNT):
+    """Choose at most <count> models of <cands> with a median time at <base> workers in <window>:
+    first the model with the median time, then every step the model farthest from the chosen ones,
+    where models of another family are one further apart.
+    Returns the models.
+    """
+    def base_time(c):
+        ts = [t for (order, method, workers), t in c.times.items() if workers == base]
+        return median(ts) if len(ts) > 0 else None
+    inside = sorted((c for c in cands.values() if base_time(c) is not None and window[0] <= base_time(c) <= window[1]),
+                    key=lambda c: (base_time(c), c.model))
+    if len(inside) == 0:
+        return []
+    points = {c.model: features(c, directory) for c in inside}
+    distance = lambda a, b: (math.sqrt(sum((x - y) ** 2 for x, y in zip(points[a], points[b]))) +
+                             (1 if family(a) != family(b) else 0))
+    chosen = [inside[len(inside) // 2].model]
+    while len(chosen) < count and len(chosen) < len(inside):
+        rest = [c.model for c in inside if c.model not in chosen]
+        chosen.append(max(rest, key=lambda m: (min(distance(m, x) for x in chosen), m)))
+    return sorted(chosen)
+
+
+def curate(engine, profile, kind, args, filename):
+    """Build the suite <kind> (quick or scaling) from the results of <profile> and save it
+    as "<profile>-<kind>" in <filename>. Returns the suite.
+    """
+    cands = candidates(engine, profile.iterations)
+    base = min(profile.workers)
+    suite = {'kind': kind, 'profile': profile.name, 'created': time.time(), 'candidates': len(cands)}
+    if kind == "quick":
+        budget = float(args[0]) if len(args) > 0 else QUICK_BUDGET
+        target = float(args[1]) if len(args) > 1 else QUICK_ERROR
+        models, seconds, err = quick_suite(cands, base, budget, target)
+        suite.update({'models': models, 'budget': budget, 'seconds': round(seconds, 1),
+                      'error': None if math.isinf(err) else round(err, 4)})
+    else:
+        window = (float(args[0]), float(args[1])) if len(args) > 1 else SCALING_WINDOW
+        count = int(args[2]) if len(args) > 2 else SCALING_COUNT
+        models = scaling_suite(cands, base, profile.directory, window, count)
+        suite.update({'models': models, 'window': list(window),
+                      'seconds': round(sum(cands[m].cost for m in models), 1)})
+    suites = load_suites(filename)
+    suites["{}-{}".format(profile.name, kind)] = suite
+    save_suites(filename, suites)
+    return suite
+
+
+def report(suites):
+    for name, s in sorted(suites.items()):
+        extra = ""
+        if s.get('error') is not None:
+            extra = ", speedups within {:.1f}%".format(100 * s['error'])
+        print("{}: {} models of {} candidates, {} seconds per iteration{}.".format(
+            name, len(s['models']), s['candidates'], s['seconds'], extra))
+        for m in s['models']:
+            print("  {}".format(m))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import bisect
+import heapq
+
+from expfw import Experiment
+from exp import split_order
+from noise import is_tainted
+
+
+###
+# Summary views over the results.
+# Usually we want aggregates per model, method, workers or order (the number of
+# done runs, timeouts and errors, the median time per worker count and the best
+# method per model) and the groups that still have runs to do, not a line per
+# experiment. A Summary keeps these aggregates for every cell
+# (model, order, method, workers) and a bitmap of the runs to do for every group.
+# It listens to the engine and is updated with every result that is recorded,
+# so only the first summary walks all experiments and iterations.
+###
+
+FIELDS = ("model", "order", "method", "workers")
+
+DONE = "done"
+TIMEOUT = "timeout"
+ERROR = "error"
+TODO = "todo"
+KINDS = (DONE, TIMEOUT, ERROR, TODO)
+
+
+class Cell(object):
+    """The runs of one (model, order, method, workers).
+    """
+    def __init__(self):
+        self.counts = {k: 0 for k in KINDS}
+        self.times = []  # sorted
+
+    def add(self, kind, t):
+        self.counts[kind] += 1
+        if t is not None:
+            bisect.insort(self.times, t)
+
+    def remove(self, kind, t):
+        self.counts[kind] -= 1
+        if t is not None:
+            del self.times[bisect.bisect_left(self.times, t)]
+
+
+def median(times):
+    n = len(times)
+    return times[n//2] if n % 2 == 1 else (times[n//2-1] + times[n//2]) / 2
+
+
+class Summary(object):
+    def __init__(self, engine, iterations=1):
+        """Summary views of the results of <engine> (initialized) for <iterations> iterations.
+        """
+        self.engine = engine
+        self.iterations = iterations
+        self.rebuild()
+        engine.listeners.append(self)
+
+    def rebuild(self):
+        """Compute all views from the results, e.g. after the cache is loaded again.
+        """
+        self.index = {}  # name -> (cell key, group, bit index)
+        self.cells = {}
+        self.todo = {}  # group -> bitmap of the runs to do
+        self.state = {}  # (name, iteration) -> (kind, time)
+        members = {}
+        for e in self.engine:
+            members.setdefault(e.group, []).append(e)
+        for group, exps in members.items():
+            self.todo[group] = 0
+            for n, e in enumerate(sorted(exps, key=lambda e: e.name)):
+                model, order, method = split_order(e.group, e.method)
+                key = (model, order, method, e.workers)
+                self.cells.setdefault(key, Cell())
+                self.index[e.name] = (key, group, n * self.iterations)
+                for i in range(self.iterations):
+                    self.engine.extend_for_iteration(i)
+                    status, value = self.engine.get_status(e, i)
+                    self.update(e, i, status, value)
+
+    def classify(self, status, value):
+        """Return (kind, time) of a result.
+        """
+        if status == Experiment.DONE:
+            return DONE, None if is_tainted(value) else value['time']
+        elif status == Experiment.TIMEOUT and value >= self.engine.timeout:
+            return TIMEOUT, None
+        elif status == Experiment.ERROR:
+            return ERROR, None
+        return TODO, None
+
+    def update(self, experiment, iteration, status, value):
+        """Called by the engine when a result is recorded.
+        """
+        if iteration >= self.iterations or experiment.name not in self.index:
+            return
+        key, group, bit = self.index[experiment.name]
+        cell = self.cells[key]
+        old = self.state.get((experiment.name, iteration))
+        if old is not None:
+            cell.remove(*old)
+        new = self.classify(status, value)
+        cell.add(*new)
+        self.state[(experiment.name, iteration)] = new
+        if new[0] == TODO:
+            self.todo[group] |= 1 << (bit + iteration)
+        else:
+            self.todo[group] &= ~(1 << (bit + iteration))
+
+    def todo_groups(self):
+        return sorted(g for g, bitmap in self.todo.items() if bitmap != 0)
+
+    def grouped(self, fields=("model", "method")):
+        """Aggregate the cells by <fields> (a subset of FIELDS).
+        Returns a sorted list of (key, counts, {workers: median time}).
+        """
+        pos = [FIELDS.index(f) for f in fields]
+        groups = {}
+        for key, cell in self.cells.items():
+            k = tuple(key[p] for p in pos)
+            counts, times = groups.setdefault(k, ({x: 0 for x in KINDS}, {}))
+            for x in KINDS:
+                counts[x] += cell.counts[x]
+            if len(cell.times) > 0:
+                times.setdefault(key[3], []).append(cell.times)
+        res = []
+        for k, (counts, times) in sorted(groups.items()):
+            medians = {w: median(list(heapq.merge(*ts))) for w, ts in sorted(times.items())}
+            res.append((k, counts, medians))
+        return res
+
+    def best(self):
+        """The best method per (model, order): the lowest median time of any worker count.
+        Returns a sorted list of ((model, order), method, workers, time).
+        """
+        best = {}
+        for (model, order, method, workers), cell in self.cells.items():
+            if len(cell.times) == 0:
+                continue
+            t = median(cell.times)
+            if (model, order) not in best or t < best[(model, order)][2]:
+                best[(model, order)] = (method, workers, t)
+        return [(k,) + v for k, v in sorted(best.items())]
+
+    def report_lines(self, fields=("model", "method")):
+        for k, counts, medians in self.grouped(fields):
+            yield "{}: {} done, {} timeouts, {} errors, {} to do{}".format(
+                " ".join(str(x) for x in k), counts[DONE], counts[TIMEOUT], counts[ERROR], counts[TODO],
+                "".join("; {}: {:.2f}".format(w, t) for w, t in medians.items()))
+
+    def best_lines(self):
+        for (model, order), method, workers, t in self.best():
+            yield "{} {}: {} with {} workers, {:.2f} seconds".format(model, order, method, workers, t)
@@ -943,6 +943,9 @@ main(int argc, char **argv)
     print_memory_usage();
 
     sylvan_stats_report(stdout);
+#if LACE_COUNT_EVENTS
+    lace_count_report_file(stdout);
+#endif
 
     return 0;
 }
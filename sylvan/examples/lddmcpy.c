@@ -0,0 +1,237 @@
+/**
+ * Shared library with the reachability strategies of lddmc, for lddmcpy.py (ctypes).
+ *
+ * The strategies and the model reader of lddmc.c are static, so lddmc.c is included here
+ * (its main becomes lddmc_main) and a few entry points are exported:
+ * - lddmcpy_init starts Lace and initializes Sylvan
+ * - lddmcpy_load reads a model file once
+ * - lddmcpy_restart starts Lace and Sylvan again with another number of workers, with the same model
+ * - lddmcpy_run runs a strategy from the initial states and returns the time
+ * All functions must be called from the thread that called lddmcpy_init (Lace worker 0).
+ * Between calls, the Lace workers are suspended, so they do not spin while Python runs.
+ */
+
+#define main lddmc_main
+#include "lddmc.c"
+#undef main
+
+static set_t initial_states = NULL;
+static rel_t *next_sorted = NULL; // the relations sorted on the first variable, for SAT and CHAINING
+static rel_t *next_file = NULL; // the relations in file order, for BFS and PAR
+static char *model_data = NULL; // the contents of the model file
+static size_t model_size = 0;
+static size_t table_memory = 0;
+static size_t loaded_nodes_size = 0; // the size of the nodes table after reading the model
+static size_t loaded_cache_size = 0; // the size of the operation cache after reading the model
+
+/**
+ * Start Lace with <n_workers> workers and initialize Sylvan.
+ */
+static void
+start(int n_workers)
+{
+    lace_init(n_workers, 1000000);
+    lace_startup(0, NULL, NULL);
+    sylvan_set_limits(table_memory, 1, 6);
+    sylvan_init_package();
+    sylvan_init_ldd();
+}
+
+/**
+ * Read the model from memory (see main in lddmc.c).
+ */
+static void
+parse_model(void)
+{
+    LACE_ME;
+    FILE *f = fmemopen(model_data, model_size, "r");
+
+    if (fread(&vector_size, sizeof(int), 1, f) != 1) Abort("Invalid input file!\n");
+    initial_states = set_load(f);
+    if (fread(&next_count, sizeof(int), 1, f) != 1) Abort("Invalid input file!\n");
+    next_file = (rel_t*)malloc(sizeof(rel_t) * next_count);
+    for (int i=0; i<next_count; i++) next_file[i] = rel_load_proj(f);
+    for (int i=0; i<next_count; i++) rel_load(f, next_file[i]);
+    fclose(f);
+    lddmc_serialize_reset(); // the LDDs of the model are protected; the next load must not find these nodes
+
+    // for SAT and CHAINING, sort the transition relations (stable, like the gnome sort of lddmc)
+    next_sorted = (rel_t*)malloc(sizeof(rel_t) * next_count);
+    memcpy(next_sorted, next_file, sizeof(rel_t) * next_count);
+    for (int i=1; i<next_count; i++) {
+        rel_t t = next_sorted[i];
+        int j = i;
+        for (; j>0 && next_sorted[j-1]->firstvar > t->firstvar; j--) next_sorted[j] = next_sorted[j-1];
+        next_sorted[j] = t;
+    }
+
+    loaded_nodes_size = llmsset_get_size(nodes);
+    loaded_cache_size = cache_getsize();
+}
+
+/**
+ * Garbage collection hook that restores the table sizes of after reading the model.
+ */
+VOID_TASK_0(restore_sizes)
+{
+    llmsset_set_size(nodes, loaded_nodes_size);
+    if (cache_getsize() != loaded_cache_size) cache_setsize(loaded_cache_size);
+}
+
+/**
+ * Collect the garbage, clear the operation cache and shrink the tables to their sizes after
+ * reading the model, so every run starts like a fresh lddmc run (the model has the lowest nodes).
+ */
+static void
+reset_tables(void)
+{
+    LACE_ME;
+    sylvan_gc_hook_main(TASK(restore_sizes));
+    sylvan_gc();
+#if SYLVAN_AGGRESSIVE_RESIZE
+    sylvan_gc_hook_main(TASK(sylvan_gc_aggressive_resize));
+#else
+    sylvan_gc_hook_main(TASK(sylvan_gc_normal_resize));
+#endif
+}
+
+/**
+ * Release the LDDs of the model, before Sylvan quits.
+ */
+static void
+free_model(void)
+{
+    if (initial_states == NULL) return;
+    lddmc_unprotect(&initial_states->dd);
+    free(initial_states);
+    initial_states = NULL;
+    for (int i=0; i<next_count; i++) {
+        rel_t rel = next_file[i];
+        lddmc_unprotect(&rel->dd);
+        lddmc_unprotect(&rel->meta);
+        if (rel->firstvar != -1) lddmc_unprotect(&rel->topmeta);
+        free(rel->r_proj);
+        free(rel->w_proj);
+        free(rel);
+    }
+    free(next_file);
+    free(next_sorted);
+    next = next_file = next_sorted = NULL;
+}
+
+/**
+ * Start Lace with <n_workers> workers (0 for autodetect) and initialize Sylvan with at most
+ * <memory> bytes for the tables (0 for the default of lddmc). Returns the number of workers.
+ */
+int
+lddmcpy_init(int n_workers, size_t memory)
+{
+    setlocale(LC_NUMERIC, "en_US.utf-8");
+    t_start = wctime();
+
+    if (memory == 0) {
+        memory = 16LL<<30;
+        if (memory > getMaxMemory()) memory = getMaxMemory()/10*9;
+    }
+    table_memory = memory;
+    start(n_workers);
+
+    int res = lace_workers();
+    lace_suspend();
+    return res;
+}
+
+/**
+ * Read the model <filename>; the contents are kept, see lddmcpy_restart. Returns the number of
+ * transition groups, or -1 if the file cannot be read. An invalid file aborts, like lddmc does.
+ */
+int
+lddmcpy_load(const char *filename)
+{
+    FILE *f = fopen(filename, "r");
+    if (f == NULL) return -1;
+    fseek(f, 0, SEEK_END);
+    long size = ftell(f);
+    fseek(f, 0, SEEK_SET);
+    char *data = (char*)malloc(size);
+    if (size <= 0 || fread(data, 1, size, f) != (size_t)size) {
+        fclose(f);
+        free(data);
+        return -1;
+    }
+    fclose(f);
+
+    lace_resume();
+    free_model();
+    free(model_data);
+    model_data = data;
+    model_size = size;
+    parse_model();
+    lace_suspend();
+    return next_count;
+}
+
+/**
+ * Quit Sylvan and Lace, start them again with <n_workers> workers and read the model again
+ * from memory. Returns the number of workers.
+ * (lace_set_workers cannot be used instead: the garbage collection of Sylvan needs all workers.)
+ */
+int
+lddmcpy_restart(int n_workers)
+{
+    lace_resume();
+    free_model();
+    sylvan_quit();
+    lace_exit();
+
+    start(n_workers);
+    if (model_data != NULL) parse_model();
+    int res = lace_workers();
+    lace_suspend();
+    return res;
+}
+
+/**
+ * Return the number of integers per state of the loaded model.
+ */
+int
+lddmcpy_vector_size(void)
+{
+    return vector_size;
+}
+
+/**
+ * Run <strategy> (0 = BFS, 1 = PAR, 2 = SAT, 3 = CHAINING, as in lddmc) from the initial states.
+ * Stores the number of states in <states> and, if <nodes> is not NULL, the number of LDD nodes of
+ * the state space in <nodes>. Returns the time of the strategy in seconds, or -1 for an invalid strategy.
+ * The tables are reset before and after the run (see reset_tables).
+ */
+double
+lddmcpy_run(int strategy, double *states, size_t *nodes)
+{
+    if (strategy < 0 || strategy > 3 || initial_states == NULL) return -1;
+
+    lace_resume();
+    LACE_ME;
+
+    next = (strategy == 2 || strategy == 3) ? next_sorted : next_file;
+    set_t set = set_clone(initial_states);
+    reset_tables();
+
+    double t1 = wctime();
+    if (strategy == 0) CALL(bfs, set);
+    else if (strategy == 1) CALL(par, set);
+    else if (strategy == 2) CALL(sat, set);
+    else CALL(chaining, set);
+    double t2 = wctime();
+
+    *states = lddmc_satcount_cached(set->dd);
+    if (nodes != NULL) *nodes = lddmc_nodecount(set->dd);
+
+    lddmc_unprotect(&set->dd);
+    free(set);
+    reset_tables();
+
+    lace_suspend();
+    return t2-t1;
+}